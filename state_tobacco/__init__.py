@@ -0,0 +1,8 @@
+"""
+Medicaid tobacco cessation coverage analysis.
+
+Pipeline stages live in submodules (`ingest`, `prepare`, `plots`, `maps`,
+`coverage`) and can be imported without side effects; `python -m
+state_tobacco` runs them from the command line. Heavy dependencies are only
+imported by the submodules that need them.
+"""
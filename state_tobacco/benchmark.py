@@ -0,0 +1,264 @@
+import json
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+try:
+    import resource
+except ImportError:
+    # POSIX only; without it (and /proc) the RSS measurements are None
+    resource = None
+
+# Times and memory-profiles each pipeline stage on synthetic inputs at several
+# scales, and compares the results against stored baselines. Every stage runs
+# exactly `repeat` times (stages such as export and share have side effects),
+# and its memory is the growth of the process RSS over the stage: on Linux the
+# kernel's high-water mark is reset before each run, elsewhere the growth of
+# the process-lifetime peak is a lower bound.
+
+DEFAULT_BASELINE = os.path.join('benchmarks', 'baseline.json')
+DEFAULT_SCALES = [10_000, 100_000, 1_000_000]
+
+
+def peak_rss_mb():
+    """Process high-water RSS in MB (ru_maxrss is KB on Linux, bytes on macOS), or None without `resource`."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _proc_status_mb(field):
+    """A memory field of /proc/self/status (VmRSS, VmHWM) in MB, or None off Linux."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def _reset_peak_rss():
+    """Reset the kernel's RSS high-water mark to the current RSS; False where unsupported."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def measure(func, *args, repeat=1):
+    """
+    Run `func(*args)` `repeat` times, returning the last result and a dict of
+    measurements: the best wall and CPU time, and the largest growth of the
+    peak RSS over the RSS at the start of a run (MB).
+    """
+    wall, cpu, rss = [], [], []
+    for _ in range(repeat):
+        exact = _reset_peak_rss()
+        start = _proc_status_mb('VmRSS') if exact else peak_rss_mb()
+        w0, c0 = time.perf_counter(), time.process_time()
+        result = func(*args)
+        wall.append(time.perf_counter() - w0)
+        cpu.append(time.process_time() - c0)
+        peak = _proc_status_mb('VmHWM') if exact else peak_rss_mb()
+        if start is not None and peak is not None:
+            rss.append(max(peak - start, 0.0))
+
+    return result, {
+        'wall_s': min(wall),
+        'cpu_s': min(cpu),
+        'peak_rss_delta_mb': max(rss) if rss else None
+    }
+
+
+# Worker counts for the shared-memory stages
+SHARE_WORKERS = [1, 2, 4]
+SHARED_COLUMNS = ['_llcpwt', 'current_smoker', 'state_year']
+
+
+def _worker_sums(start, stop):
+    """
+    In a `shared.SharedFrame.pool` worker: exact weighted current-smoker sums
+    per state-year over rows [start, stop), and this worker's memory in MB.
+    """
+    from . import reductions, shared, statekeys
+    columns = shared.columns()
+    keys = columns['state_year'][start:stop]
+    values = columns['_llcpwt'][start:stop] * columns['current_smoker'][start:stop]
+    sums = reductions.ExactSum(statekeys.N_KEYS).add(values[keys >= 0], keys[keys >= 0])
+    return sums, shared.worker_memory_mb()[0]
+
+
+def share_workers(df, workers, tasks=16):
+    """
+    Publish the collapse inputs once, sum them in `workers` processes that
+    attach to the shared columns, and merge the partial sums. Returns the
+    sums and the largest worker's private memory (MB, None off Linux).
+    """
+    from . import reductions, shared, statekeys
+    bounds = np.linspace(0, len(df), tasks + 1).astype(np.int64)
+    with shared.SharedFrame(df, SHARED_COLUMNS) as frame, frame.pool(workers) as pool:
+        parts = list(pool.map(_worker_sums, bounds[:-1], bounds[1:]))
+    total = reductions.ExactSum(statekeys.N_KEYS)
+    for sums, _ in parts:
+        total.merge(sums)
+    memory = [uss for _, uss in parts if uss is not None]
+    return total.result(), max(memory) if memory else None
+
+
+def run_scale(total_rows, workdir, repeat=1, seed=0, shapefile_path=None):
+    """Generate inputs for one scale and benchmark every stage on them."""
+    os.environ.setdefault('MPLBACKEND', 'Agg')
+    from . import ingest, prepare, plots, coverage, synthetic, export, shared, bitpack, reductions, statekeys
+
+    data_dir = os.path.join(workdir, 'BRFSS Data')
+    synthetic.write_synthetic_inputs(data_dir, total_rows, seed=seed)
+
+    output_dir = os.path.join(workdir, 'Visualizations')
+    os.makedirs(output_dir, exist_ok=True)
+
+    results = {}
+
+    def stage(name, func, *args):
+        result, stats = measure(func, *args, repeat=repeat)
+        rows_in = len(args[0]) if args and hasattr(args[0], '__len__') else None
+        stats['rows_in'] = rows_in
+        stats['rows_out'] = len(result) if hasattr(result, '__len__') else None
+        results[name] = stats
+        memory = stats['peak_rss_delta_mb']
+        print(f"  {name:<24} {stats['wall_s']:8.3f}s  " + (f"{memory:9.1f} MB" if memory is not None else ""))
+        return result
+
+    def derive(df):
+        df = ingest.derive_eligibility(df.copy())
+        df = ingest.apply_sample_filters(df)
+        df = df.rename(columns={'Medicaidelig': 'medicaidelig'})
+        df = prepare.clean_individual_data(df)
+        df = prepare.create_individual_variables(df)
+        return prepare.create_treatment_categories(df)
+
+    def share(df):
+        # Publishing cost of the shared-memory columns workers attach to. The
+        # attached columns map files removed on exit, so only the index leaves
+        with shared.SharedFrame(df) as frame:
+            return shared.attach_frame(frame.spec).index
+
+    def collapse(df):
+        return prepare.assign_treatment_groups(prepare.aggregate_state_level(df.copy()))
+
+    def weighted_indicators(df):
+        # Indicator x weight rows in state-year order, as summed by the collapse
+        order, bounds, _ = bitpack.key_order(df[statekeys.COLUMN].to_numpy(), statekeys.N_KEYS)
+        weights = df['_llcpwt'].to_numpy(dtype=float)[order]
+        values = np.stack([df[col].to_numpy(dtype=float)[order] * weights
+                           for col in bitpack.SMOKING_INDICATORS])
+        return values, bounds
+
+    def sum_naive(values, bounds):
+        # Order-dependent: the digits change with the chunking of the rows
+        sums = np.zeros((len(values), len(bounds) - 1))
+        present = np.flatnonzero(np.diff(bounds))
+        sums[:, present] = np.add.reduceat(values, bounds[present], axis=1)
+        return sums
+
+    combined = stage('ingest', ingest.load_brfss_years, data_dir)
+    merged = stage('merge', ingest.merge_policy_data, combined, data_dir)
+    individual = stage('derive', derive, merged)
+    state_df = stage('collapse', collapse, individual)
+    stage('share', share, individual)
+    # Worker memory should stay flat as workers are added, and the merged exact
+    # sums must not depend on how the rows were split between them
+    keys = individual['state_year'].to_numpy()
+    expected = reductions.grouped_sum((individual['_llcpwt'] * individual['current_smoker']).to_numpy()[keys >= 0],
+                                      keys[keys >= 0], statekeys.N_KEYS)
+    for workers in SHARE_WORKERS:
+        name = f'share_workers_{workers}'
+        sums, uss = stage(name, share_workers, individual, workers)
+        results[name]['rows_out'] = len(sums)
+        results[name]['worker_uss_mb'] = uss
+        if not np.array_equal(sums, expected):
+            raise RuntimeError(f"{name}: sums differ from the single-process result")
+        if uss is not None:
+            print(f"  {'':<24} worker private memory {uss:9.1f} MB")
+    values, bounds = weighted_indicators(individual)
+    stage('sum_naive', sum_naive, values, bounds)
+    stage('sum_exact', reductions.segment_sum, values, bounds)
+    stage('export', export.export_frame, individual, os.path.join(workdir, 'individual'), ('csv', 'dta'), 'gzip')
+
+    # The visuals read the saved outputs, so round-trip them through CSV
+    state_csv = os.path.join(workdir, 'state_level_descriptive_data.csv')
+    state_df.to_csv(state_csv, index=False)
+    plot_df = plots.load_data(state_csv)
+    stage('plot_smoking_trends', plots.plot_smoking_prevalence_trends, plot_df, output_dir)
+    stage('plot_quit_success', plots.plot_quit_success_rate, plot_df, output_dir)
+    stage('plot_average_outcomes', plots.plot_average_outcomes, plot_df, output_dir)
+
+    state_year = stage('coverage_collapse', coverage.collapse_state_year, individual)
+    stage('plot_coverage', coverage.plot_coverage_by_year, state_year, output_dir)
+
+    if shapefile_path and os.path.exists(shapefile_path):
+        from . import maps
+        map_df = maps.load_data(state_csv)
+        stage('map_smoking', maps.create_filled_color_map, map_df, shapefile_path, 2020,
+              'current_smoker_prev', 'Smoking Prevalence', 'Smoking Prevalence by State (2020)',
+              'map_smoking.png', output_dir)
+    else:
+        print(f"  Skipping maps: shapefile not found at {shapefile_path}")
+
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Return (key, metric, baseline, current) for every regression beyond `tolerance`."""
+    regressions = []
+    for key, stats in results.items():
+        if key not in baseline:
+            continue
+        for metric in ['wall_s', 'peak_rss_delta_mb']:
+            before, after = baseline[key].get(metric), stats.get(metric)
+            if before and after is not None and after > before * (1 + tolerance):
+                regressions.append((key, metric, before, after))
+    return regressions
+
+
+def main(scales=DEFAULT_SCALES, repeat=1, baseline_path=DEFAULT_BASELINE, save_baseline=False,
+         tolerance=0.25, output=None, shapefile_path=None):
+    """Benchmark every scale; returns 1 if any stage regressed against the baseline."""
+    results = {}
+    for rows in scales:
+        print(f"\nBenchmarking {rows:,} rows...")
+        with tempfile.TemporaryDirectory() as workdir:
+            for name, stats in run_scale(rows, workdir, repeat, shapefile_path=shapefile_path).items():
+                results[f"{name}@{rows}"] = stats
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if save_baseline:
+        os.makedirs(os.path.dirname(baseline_path) or '.', exist_ok=True)
+        with open(baseline_path, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nBaseline saved to {baseline_path}")
+        return 0
+
+    if not os.path.exists(baseline_path):
+        print(f"\nNo baseline at {baseline_path}; run with --save-baseline to create one.")
+        return 0
+
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, tolerance)
+    if regressions:
+        print("\nRegressions against baseline:")
+        for key, metric, before, after in regressions:
+            print(f"  {key:<32} {metric:<14} {before:10.3f} -> {after:10.3f}")
+        return 1
+    print("\nNo regressions against baseline.")
+    return 0
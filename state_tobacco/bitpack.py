@@ -0,0 +1,129 @@
+import numpy as np
+from . import reductions
+
+# 0/1 indicator columns stored as bitsets: one bit per respondent, 64 rows per
+# uint64 word, instead of one int64 per respondent. Rows are first put in group
+# order (e.g. by state-year) so every group is a contiguous range of bits; group
+# counts are then popcounts of whole words plus two masked edge words, and
+# weighted sums unpack one block of rows at a time and sum the weights split
+# into exact fixed-point limbs (reductions.py), so they do not depend on the
+# block size.
+#
+# Bit i of a column is row i, stored little-endian (bit i % 64 of word i // 64)
+# regardless of the platform's byte order.
+
+# Indicators built by prepare.create_individual_variables / create_treatment_categories
+SMOKING_INDICATORS = ['current_smoker', 'former_smoker', 'never_smoker', 'quit_attempt',
+                      'recent_quitter', 'past_year_quit_attempt']
+DEMOGRAPHIC_INDICATORS = ['low_education', 'unemployed', 'low_income', 'male', 'white', 'black', 'hispanic',
+                          'age_18_24', 'age_25_34', 'age_35_44', 'age_45_54', 'age_55_64']
+COVERAGE_INDICATORS = ['nicotine_patch_covered', 'nicotine_gum_covered', 'nicotine_lozenge_covered',
+                       'nicotine_nasal_spray_covered', 'nicotine_inhaler_covered', 'bupropion_covered',
+                       'varenicline_covered', 'individual_counseling_covered', 'group_counseling_covered',
+                       'any_nrt', 'any_medication', 'any_counseling']
+INDICATOR_COLUMNS = SMOKING_INDICATORS + DEMOGRAPHIC_INDICATORS + COVERAGE_INDICATORS
+
+# Rows unpacked at a time by the weighted kernels (a multiple of 64)
+BLOCK_ROWS = 1 << 16
+
+
+def key_order(codes, n_keys=None):
+    """
+    Row order that makes each group of integer keys `codes` (e.g. `statekeys`
+    state-year keys) contiguous, groups in key order and rows in their
+    original order within a group; the group offsets into that order; and
+    the keys present. Rows with a negative key are left out.
+    """
+    codes = np.asarray(codes, dtype=np.int64)
+    present = np.flatnonzero(codes >= 0)
+    order = present[np.argsort(codes[present], kind='stable')]
+    sizes = np.bincount(codes[present], minlength=n_keys or 0)
+    keys = np.flatnonzero(sizes)
+    bounds = np.concatenate([[0], np.cumsum(sizes[keys])])
+    return order, bounds, keys
+
+
+class PackedIndicators:
+    """Indicator columns as an array of uint64 words, one row of words per column."""
+
+    def __init__(self, words, n_rows, columns):
+        self.words = words
+        self.n_rows = n_rows
+        self.columns = list(columns)
+
+    @classmethod
+    def from_frame(cls, df, columns=INDICATOR_COLUMNS, order=None):
+        """Pack `columns` of `df` (taking rows in `order` if given); values must be 0 or 1."""
+        n_rows = len(df) if order is None else len(order)
+        n_words = (n_rows + 63) // 64
+        words = np.zeros((len(columns), n_words), dtype='<u8')
+        for i, col in enumerate(columns):
+            values = df[col].to_numpy()
+            if order is not None:
+                values = values[order]
+            bits = values == 1
+            if not (bits | (values == 0)).all():
+                raise ValueError(f"Column {col} is not a 0/1 indicator")
+            packed = np.packbits(bits, bitorder='little')
+            words[i].view(np.uint8)[:len(packed)] = packed
+        return cls(words, n_rows, columns)
+
+    @property
+    def nbytes(self):
+        return self.words.nbytes
+
+    def column(self, name):
+        """Unpack one column to a boolean array."""
+        row = self.words[self.columns.index(name)]
+        return np.unpackbits(row.view(np.uint8), count=self.n_rows, bitorder='little').astype(bool)
+
+    def _rows(self, names):
+        return slice(None) if names is None else [self.columns.index(name) for name in names]
+
+    def counts(self, bounds, names=None):
+        """Set bits per column and group, for groups given as row offsets `bounds` (G + 1)."""
+        words = self.words[self._rows(names)]
+        # One zero word past the end so the offset n_rows has a word to index
+        words = np.concatenate([words, np.zeros((len(words), 1), dtype=words.dtype)], axis=1)
+        prefix = np.zeros(words.shape, dtype=np.int64)
+        np.cumsum(np.bitwise_count(words[:, :-1]), axis=1, out=prefix[:, 1:])
+
+        bounds = np.asarray(bounds, dtype=np.int64)
+        word, bit = bounds // 64, (bounds % 64).astype(np.uint64)
+        below = (np.uint64(1) << bit) - np.uint64(1)
+        before = prefix[:, word] + np.bitwise_count(words[:, word] & below)
+        return before[:, 1:] - before[:, :-1]
+
+    def weighted_sums(self, weights, bounds, names=None, block_rows=BLOCK_ROWS):
+        """
+        Sum of `weights` over the set bits of each column, per group. The sums
+        are exact and correctly rounded, so they are the same for any
+        `block_rows` (or any split of the rows into parts). Blocks start on
+        word boundaries, so `block_rows` is rounded up to a multiple of 64.
+        """
+        block_rows = max(-(-int(block_rows) // 64) * 64, 64)
+        words = self.words[self._rows(names)]
+        bounds = np.asarray(bounds, dtype=np.int64)
+        weights = np.asarray(weights, dtype=float)
+        finite = np.isfinite(weights)
+        e_low, n_limbs = reductions.fixed_layout(weights)
+        limb_sums = np.zeros((n_limbs, len(words), len(bounds) - 1))
+        special = np.zeros((len(words), len(bounds) - 1))
+        for start in range(0, self.n_rows, block_rows):
+            stop = min(start + block_rows, self.n_rows)
+            bits = np.unpackbits(words[:, start // 64:(stop + 63) // 64].view(np.uint8), axis=1,
+                                 count=stop - start, bitorder='little')
+            block = weights[start:stop]
+            limbs = reductions.split_fixed(np.where(finite[start:stop], block, 0.0), e_low, n_limbs)
+
+            # Segments of the block that belong to one group; limb sums are exact in any order
+            cuts = np.unique(np.concatenate([[start], bounds[(bounds > start) & (bounds < stop)]]))
+            group = np.searchsorted(bounds, cuts, side='right') - 1
+            for j in range(n_limbs):
+                limb_sums[j][:, group] += np.add.reduceat(bits * limbs[j], cuts - start, axis=1)
+            if not finite[start:stop].all():
+                # NaN/inf weights propagate as in a plain sum
+                column, row = np.nonzero(bits & ~finite[start:stop])
+                np.add.at(special, (column, np.searchsorted(bounds, start + row, side='right') - 1),
+                          block[row])
+        return reductions.combine_fixed(limb_sums, e_low) + special
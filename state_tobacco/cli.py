@@ -0,0 +1,291 @@
+import argparse
+import os
+import sys
+
+# Command-line entry point. Each subcommand imports its stage module inside the
+# handler, so pandas/matplotlib/geopandas are only loaded when they are used
+# and `--help` returns immediately.
+
+
+def run_ingest(args):
+    from . import ingest
+    ingest.merge_brfss_data(args.data_dir, args.output_dir, args.compression,
+                            states=args.states, parquet_dir=args.parquet_dir)
+
+
+def run_prepare(args):
+    if args.backend == 'duckdb':
+        from . import sql
+        sql.run_prepare(args.parquet_dir, args.output_dir, compression=args.compression,
+                        threads=args.threads, memory_limit=args.memory_limit)
+        return
+    from . import prepare
+    prepare.main(args.input, args.output_dir, args.compression)
+
+
+def run_extract(args):
+    from . import sql
+    from .ingest import KEEP_VARS
+    from .quality import IngestProfile
+    profile = IngestProfile(KEEP_VARS)
+    sql.write_extracts(args.data_dir, args.parquet_dir, profile=profile)
+    profile.print_summary()
+    profile.write(args.parquet_dir)
+
+
+def run_query(args):
+    from . import sql
+    con = sql.connect(args.parquet_dir, threads=args.threads, memory_limit=args.memory_limit)
+    result = con.sql(args.query).df()
+    if args.output:
+        result.to_csv(args.output, index=False)
+        print(f"{len(result)} rows written to {args.output}")
+    else:
+        print(result.to_string(index=False))
+
+
+def run_verify(args):
+    from . import sql
+    sql.verify(args.data_dir, args.parquet_dir, rtol=args.rtol, threads=args.threads,
+               memory_limit=args.memory_limit)
+
+
+def run_plots(args):
+    from . import plots
+    plots.main(args.input, args.output_dir)
+
+
+def run_maps(args):
+    from . import maps
+    maps.main(args.input, args.shapefile, args.output_dir, args.clusters, args.contiguity)
+
+
+def run_tiles(args):
+    from . import tilemap
+    return tilemap.main(args.input, args.output_dir, args.columns, args.shape, args.format, args.each, args.dpi)
+
+
+def run_spatial(args):
+    from . import spatial
+    return spatial.main(args.input, args.shapefile, args.output_dir, args.contiguity,
+                        args.permutations, args.seed)
+
+
+def run_serve(args):
+    from . import service
+    service.main(args.input, args.host, args.port, args.cache_size)
+
+
+def run_coverage(args):
+    from . import coverage
+    coverage.main(args.input, args.output_dir, args.table_dir)
+
+
+def run_regress(args):
+    from . import regression
+    regression.main(args.input, args.outcomes, args.output_dir, args.chunksize, args.workers, args.max_iter)
+
+
+def run_synth(args):
+    from . import synthetic
+    synthetic.write_synthetic_inputs(args.output_dir, args.rows, seed=args.seed)
+
+
+def run_benchmark(args):
+    from . import benchmark
+    return benchmark.main(args.scales, args.repeat, args.baseline, args.save_baseline,
+                          args.tolerance, args.output, args.shapefile)
+
+
+# Subcommands that support --preview: the first two draw the subsample, the
+# others read the preview outputs of an earlier stage
+PREVIEW_COMMANDS = ['ingest', 'prepare', 'plots', 'maps', 'tiles', 'coverage', 'spatial', 'regress', 'serve']
+FIGURE_COMMANDS = ['plots', 'maps', 'tiles', 'coverage']
+
+
+def apply_preview(args):
+    """Point a downstream stage at the preview inputs and outputs; returns an error message or None."""
+    from . import preview
+    preview.enable(args.preview, args.preview_seed)
+    if args.command in ('ingest', 'prepare'):
+        return None
+    args.input = preview.output_path(args.input)
+    if not os.path.exists(args.input):
+        return f"Preview input {args.input} not found; run `prepare` with --preview first."
+    if args.command in FIGURE_COMMANDS:
+        args.output_dir = preview.figure_dir(args.output_dir)
+    return None
+
+
+def add_duckdb_arguments(parser):
+    parser.add_argument('--parquet-dir', default="extracts", help="Directory of Parquet extracts")
+    parser.add_argument('--threads', type=int, help="DuckDB worker threads (default: all cores)")
+    parser.add_argument('--memory-limit', help="DuckDB memory limit, e.g. 4GB; larger work spills to disk")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='state_tobacco',
+        description="Medicaid tobacco cessation coverage analysis pipeline.")
+    parser.add_argument('--trace', metavar='PATH',
+                        help="Record timing spans and write a Chrome trace to PATH")
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="Also record tracemalloc peaks in the trace (slower)")
+    parser.add_argument('--preview', type=float, metavar='FRACTION',
+                        help="Run on a design-preserving subsample of about FRACTION of the PSUs; "
+                             "outputs are written to separate *_preview files")
+    parser.add_argument('--preview-seed', type=int, default=0, help="Seed for the preview subsample")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    p = subparsers.add_parser('ingest', help="Merge raw BRFSS and policy files (Final_2011_2020_Medicaidelig)")
+    p.add_argument('--data-dir', default="BRFSS Data", help="Directory with the raw .dta files")
+    p.add_argument('--output-dir', default=".", help="Directory for the merged CSV/.dta")
+    p.add_argument('--compression', choices=['gzip', 'zstd'],
+                   help="Compress the merged CSV (.csv.gz/.csv.zst); zstd needs the zstandard package")
+    p.add_argument('--states', type=int, nargs='+', metavar='FIPS',
+                   help="Only these _state codes, read from the indexed Parquet extracts (run `extract` first); "
+                        "outputs are named Final_2011_2020_Medicaidelig_states-<codes>")
+    p.add_argument('--parquet-dir', default="extracts", help="Directory of Parquet extracts for --states")
+    p.set_defaults(func=run_ingest)
+
+    p = subparsers.add_parser('prepare', help="Build individual- and state-level analysis datasets")
+    p.add_argument('--input', default="Final_2011_2020_Medicaidelig.csv")
+    p.add_argument('--output-dir', default=".")
+    p.add_argument('--backend', choices=['pandas', 'duckdb'], default='pandas',
+                   help="duckdb runs ingest through collapse as SQL over the Parquet extracts")
+    p.add_argument('--compression', choices=['gzip', 'zstd'],
+                   help="Compress the individual-level CSV")
+    add_duckdb_arguments(p)
+    p.set_defaults(func=run_prepare)
+
+    p = subparsers.add_parser('extract', help="Convert raw .dta inputs to Parquet extracts for the duckdb backend")
+    p.add_argument('--data-dir', default="BRFSS Data")
+    p.add_argument('--parquet-dir', default="extracts")
+    p.set_defaults(func=run_extract)
+
+    p = subparsers.add_parser('query', help="Run ad-hoc SQL against the pipeline views")
+    p.add_argument('query', help="e.g. \"SELECT year, avg(current_smoker) FROM individual GROUP BY 1\"")
+    p.add_argument('--output', help="Write the result to this CSV instead of printing it")
+    add_duckdb_arguments(p)
+    p.set_defaults(func=run_query)
+
+    p = subparsers.add_parser('verify', help="Check the duckdb backend against the pandas pipeline")
+    p.add_argument('--data-dir', default="BRFSS Data")
+    p.add_argument('--rtol', type=float, default=1e-9)
+    add_duckdb_arguments(p)
+    p.set_defaults(func=run_verify)
+
+    p = subparsers.add_parser('plots', help="Trend and average outcome charts")
+    p.add_argument('--input', default="state_level_descriptive_data.csv")
+    p.add_argument('--output-dir', default="Visualizations")
+    p.set_defaults(func=run_plots)
+
+    p = subparsers.add_parser('maps', help="Choropleth maps by treatment group")
+    p.add_argument('--input', default="state_level_descriptive_data.csv")
+    p.add_argument('--shapefile', default=os.path.join("shapefiles", "cb_2018_us_state_500k.shp"))
+    p.add_argument('--output-dir', default="Visualizations")
+    p.add_argument('--clusters', action='store_true', help="Hatch significant LISA clusters on the maps")
+    p.add_argument('--contiguity', choices=['queen', 'rook'], default='queen')
+    p.set_defaults(func=run_maps)
+
+    p = subparsers.add_parser('tiles', help="Tile-grid cartograms of every state, small multiples by year")
+    p.add_argument('--input', default="state_level_descriptive_data.csv")
+    p.add_argument('--output-dir', default="Visualizations")
+    p.add_argument('--columns', nargs='+', help="State-level columns to map (default: outcomes and demographics)")
+    p.add_argument('--shape', choices=['square', 'hex'], default='square')
+    p.add_argument('--format', choices=['png', 'svg', 'pdf'], default='png',
+                   help="png, or svg/pdf for vector output")
+    p.add_argument('--each', action='store_true', help="Also write one map per year and column")
+    p.add_argument('--dpi', type=int, default=150)
+    p.set_defaults(func=run_tiles)
+
+    p = subparsers.add_parser('spatial', help="Global and local Moran's I of outcomes and coverage")
+    p.add_argument('--input', default="state_level_descriptive_data.csv")
+    p.add_argument('--shapefile', default=os.path.join("shapefiles", "cb_2018_us_state_500k.shp"))
+    p.add_argument('--output-dir', default=".", help="Directory for the Moran's I and LISA tables")
+    p.add_argument('--contiguity', choices=['queen', 'rook'], default='queen',
+                   help="queen: any shared boundary point; rook: a shared edge")
+    p.add_argument('--permutations', type=int, default=999)
+    p.add_argument('--seed', type=int, default=0)
+    p.set_defaults(func=run_spatial)
+
+    p = subparsers.add_parser('serve', help="Local HTTP/JSON query service over the state-level results")
+    p.add_argument('--input', default="state_level_descriptive_data.csv")
+    p.add_argument('--host', default='127.0.0.1')
+    p.add_argument('--port', type=int, default=8765)
+    p.add_argument('--cache-size', type=int, default=4096, help="Responses kept in the LRU cache")
+    p.set_defaults(func=run_serve)
+
+    p = subparsers.add_parser('coverage', help="Coverage combinations by year and transitions")
+    p.add_argument('--input', default="individual_level_with_category_indicators.csv")
+    p.add_argument('--output-dir', default="Visualizations")
+    p.add_argument('--table-dir', default=".", help="Directory for the transition CSVs")
+    p.set_defaults(func=run_coverage)
+
+    p = subparsers.add_parser('regress', help="Individual-level weighted logit with state and year fixed effects")
+    p.add_argument('--input', default="individual_level_with_category_indicators.csv")
+    p.add_argument('--outcomes', nargs='+', choices=['current_smoker', 'recent_quitter'],
+                   default=['current_smoker', 'recent_quitter'])
+    p.add_argument('--output-dir', default=".")
+    p.add_argument('--chunksize', type=int, default=500_000,
+                   help="Rows per chunk; memory grows with chunksize x workers")
+    p.add_argument('--workers', type=int, help="Threads accumulating the Gram matrices (default: cores, max 8)")
+    p.add_argument('--max-iter', type=int, default=25)
+    p.set_defaults(func=run_regress)
+
+    p = subparsers.add_parser('synth', help="Generate synthetic raw BRFSS inputs")
+    p.add_argument('--rows', type=int, default=100_000,
+                   help="Total respondents across all years (default: 100,000)")
+    p.add_argument('--output-dir', default="BRFSS Data")
+    p.add_argument('--seed', type=int, default=0)
+    p.set_defaults(func=run_synth)
+
+    p = subparsers.add_parser('benchmark', help="Time each stage on synthetic data")
+    p.add_argument('--scales', type=int, nargs='+', default=[10_000, 100_000, 1_000_000],
+                   help="Total synthetic rows per run (default: 10k 100k 1M)")
+    p.add_argument('--repeat', type=int, default=1,
+                   help="Timed runs per stage; the fastest is reported")
+    p.add_argument('--baseline', default=os.path.join('benchmarks', 'baseline.json'),
+                   help="Baseline JSON file to compare against or update")
+    p.add_argument('--save-baseline', action='store_true',
+                   help="Store these results as the new baseline")
+    p.add_argument('--tolerance', type=float, default=0.25,
+                   help="Allowed slowdown/growth before flagging (default: 0.25 = 25%%)")
+    p.add_argument('--output', help="Also write the results to this JSON file")
+    p.add_argument('--shapefile', default=os.path.join("shapefiles", "cb_2018_us_state_500k.shp"))
+    p.set_defaults(func=run_benchmark)
+
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if args.preview is not None:
+        if args.command not in PREVIEW_COMMANDS:
+            parser.error(f"--preview is not supported by {args.command}")
+        if getattr(args, 'backend', None) == 'duckdb':
+            # The SQL views read the full extracts and write the full output names
+            parser.error("--preview is not supported with --backend duckdb")
+        if not 0 < args.preview <= 1:
+            parser.error("--preview FRACTION must be in (0, 1]")
+        error = apply_preview(args)
+        if error:
+            print(error)
+            return 1
+
+    if args.trace:
+        from . import tracing
+        tracing.enable(memory=args.trace_memory)
+
+    try:
+        status = args.func(args)
+    finally:
+        if args.trace:
+            tracing.write_trace(args.trace)
+    return status or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
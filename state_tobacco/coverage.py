@@ -0,0 +1,311 @@
+import pandas as pd
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.path import Path
+import matplotlib.patches as mpatches
+import os
+from . import bitpack, preview, statekeys, tracing
+
+# Coverage categories in bit order: NRT -> bit 0, Medication -> bit 1, Counseling -> bit 2
+CATEGORY_COLUMNS = ['any_nrt', 'any_medication', 'any_counseling']
+
+# Individual products in bit order, for product-level (9-bit, 512 code) combos
+PRODUCT_COLUMNS = [
+    'nicotine_patch_covered', 'nicotine_gum_covered', 'nicotine_lozenge_covered',
+    'nicotine_nasal_spray_covered', 'nicotine_inhaler_covered',
+    'bupropion_covered', 'varenicline_covered',
+    'individual_counseling_covered', 'group_counseling_covered'
+]
+
+PRODUCT_ABBREVIATIONS = {
+    'nicotine_patch_covered': 'Patch',
+    'nicotine_gum_covered': 'Gum',
+    'nicotine_lozenge_covered': 'Lozenge',
+    'nicotine_nasal_spray_covered': 'Spray',
+    'nicotine_inhaler_covered': 'Inhaler',
+    'bupropion_covered': 'Bupropion',
+    'varenicline_covered': 'Varenicline',
+    'individual_counseling_covered': 'Ind. Counseling',
+    'group_counseling_covered': 'Grp. Counseling'
+}
+
+# Labels for all eight category-level combo codes
+COMBO_LABELS = {
+    0: 'No coverage',
+    1: 'NRT only',
+    2: 'Medication only',
+    3: 'NRT + Medication',
+    4: 'Counseling only',
+    5: 'NRT + Counseling',
+    6: 'Medication + Counseling',
+    7: 'All categories'
+}
+
+# Define colors
+COLORS = {
+    'No coverage':             '#006400',
+    'NRT only':                '#FF4500',
+    'Medication only':         '#1f77b4',
+    'NRT + Medication':        '#8B0000',
+    'Counseling only':         '#9467bd',
+    'NRT + Counseling':        '#2E8B57',
+    'Medication + Counseling': '#DAA520',
+    'All categories':          '#A0522D'
+}
+
+
+def encode_combos(df, columns):
+    """
+    Encode 0/1 indicator columns as one integer bitmask per row.
+
+    Column i contributes bit i, so three category columns give codes 0-7 and
+    the nine product columns give codes 0-511.
+    """
+    bits = df[columns].to_numpy() != 0
+    weights = np.left_shift(1, np.arange(len(columns), dtype=np.int64))
+    return bits.astype(np.int64) @ weights
+
+
+def combo_label(code, columns=CATEGORY_COLUMNS):
+    """Human-readable label for a combo code built from `columns`."""
+    if columns == CATEGORY_COLUMNS:
+        return COMBO_LABELS[int(code)]
+    names = [PRODUCT_ABBREVIATIONS.get(col, col)
+             for i, col in enumerate(columns) if (int(code) >> i) & 1]
+    return ' + '.join(names) if names else 'No coverage'
+
+
+def collapse_state_year(df, columns=CATEGORY_COLUMNS):
+    """Collapse to state-year: did the state ever cover each category/product?"""
+    keys = statekeys.encode(df['_state'].to_numpy(dtype=float), df['year'].to_numpy(dtype=float))
+    order, bounds, present = bitpack.key_order(keys, statekeys.N_KEYS)
+    state, year = statekeys.decode(present)
+    state_year = pd.DataFrame({'_state': state, 'year': year})
+    values = df[columns].to_numpy()[order]
+    state_year[columns] = np.fmax.reduceat(values, bounds[:-1], axis=0) if len(present) else values[:0]
+    state_year['combo_code'] = encode_combos(state_year, columns)
+    return state_year
+
+
+def transition_counts(state_year, n_codes):
+    """
+    Count state moves between combo codes for each pair of consecutive years.
+
+    Returns an array of shape (n_year_pairs, n_codes, n_codes) where entry
+    [p, i, j] is the number of states with code i in the first year of pair p
+    and code j in the following year, together with the list of year pairs
+    (empty when `state_year` covers fewer than two years).
+    """
+    if state_year.empty:
+        return np.zeros((0, n_codes, n_codes), dtype=np.int64), []
+    ordered = state_year.sort_values(['_state', 'year'])
+    states = ordered['_state'].to_numpy()
+    years = ordered['year'].to_numpy().astype(int)
+    codes = ordered['combo_code'].to_numpy()
+
+    # A transition is a row followed by the same state in the next year
+    linked = (states[1:] == states[:-1]) & (years[1:] == years[:-1] + 1)
+    from_codes = codes[:-1][linked]
+    to_codes = codes[1:][linked]
+    from_years = years[:-1][linked]
+
+    first_year = years.min()
+    year_pairs = [(y, y + 1) for y in range(first_year, years.max())]
+    pair_index = from_years - first_year
+
+    # One bincount over a flattened (pair, from, to) index
+    flat = (pair_index * n_codes + from_codes) * n_codes + to_codes
+    counts = np.bincount(flat, minlength=len(year_pairs) * n_codes * n_codes)
+    return counts.reshape(len(year_pairs), n_codes, n_codes), year_pairs
+
+
+def transitions_to_frame(counts, year_pairs, columns=CATEGORY_COLUMNS):
+    """Long-format table of the non-zero transitions."""
+    pair_idx, from_codes, to_codes = np.nonzero(counts)
+    return pd.DataFrame({
+        'year_from': [year_pairs[p][0] for p in pair_idx],
+        'year_to': [year_pairs[p][1] for p in pair_idx],
+        'combo_from': [combo_label(c, columns) for c in from_codes],
+        'combo_to': [combo_label(c, columns) for c in to_codes],
+        'code_from': from_codes,
+        'code_to': to_codes,
+        'n_states': counts[pair_idx, from_codes, to_codes]
+    })
+
+
+def plot_coverage_by_year(state_year, output_dir):
+    """Stacked bar chart of the number of states in each combo by year."""
+    if state_year.empty:
+        print("No state-years to plot; skipping the coverage-by-year chart")
+        return
+
+    # Count number of unique states per year x combo
+    counts = (
+        state_year
+        .assign(combo=state_year['combo_code'].map(COMBO_LABELS))
+        .groupby(['year', 'combo'])['_state']
+        .nunique()
+        .unstack(fill_value=0)
+    )
+
+    # Re-order columns, keeping only combos that occur
+    order = [label for label in COMBO_LABELS.values() if label in counts.columns]
+    counts = counts[order]
+
+    # Convert year index to strings so ticks read "2011", "2012", etc.
+    counts.index = counts.index.astype(int).astype(str)
+
+    fig, ax = plt.subplots(figsize=(12, 6))
+    counts.plot(
+        kind='bar',
+        stacked=True,
+        color=[COLORS[c] for c in counts.columns],
+        ax=ax
+    )
+    ax.set_title('Treatment Coverage Combinations by Year', fontsize=16)
+    ax.set_xlabel('Year', fontsize=14)
+    ax.set_ylabel('Number of States', fontsize=14)
+    ax.legend(
+        title='',
+        bbox_to_anchor=(0.5, -0.15),
+        loc='upper center',
+        ncol=4
+    )
+    plt.xticks(rotation=0)
+    plt.tight_layout()
+
+    save_path = os.path.join(output_dir, 'treatment_coverage_combinations_by_year.png')
+    preview.mark_figure(fig)
+    fig.savefig(save_path, dpi=300, bbox_inches='tight')
+    plt.close(fig)
+
+    print(f'Plot saved to {save_path}')
+
+
+def plot_coverage_transitions(state_year, counts, year_pairs, output_dir):
+    """
+    Sankey-style (alluvial) chart of states moving between combos year to year.
+
+    Each year is a column of stacked nodes sized by the number of states in
+    each combo; ribbons between columns are sized by the transition counts.
+    """
+    if not year_pairs:
+        # e.g. a --states or --preview run that leaves a single year
+        print("Fewer than two years; skipping the transitions chart")
+        return
+
+    n_codes = counts.shape[1]
+    years = [year_pairs[0][0]] + [pair[1] for pair in year_pairs]
+    node_counts = np.zeros((len(years), n_codes), dtype=int)
+    year_pos = {year: i for i, year in enumerate(years)}
+    np.add.at(node_counts,
+              (state_year['year'].astype(int).map(year_pos).to_numpy(),
+               state_year['combo_code'].to_numpy()), 1)
+
+    gap = 1.0
+    node_width = 0.12
+    codes = [code for code in COMBO_LABELS if node_counts[:, code].any()]
+
+    # Bottom edge of each node, stacking combos in code order with gaps
+    node_bottom = np.zeros_like(node_counts, dtype=float)
+    for i in range(len(years)):
+        y = 0.0
+        for code in codes:
+            node_bottom[i, code] = y
+            y += node_counts[i, code] + (gap if node_counts[i, code] else 0)
+
+    fig, ax = plt.subplots(figsize=(14, 7))
+
+    for i in range(len(years)):
+        for code in codes:
+            if node_counts[i, code]:
+                ax.add_patch(mpatches.Rectangle(
+                    (i - node_width / 2, node_bottom[i, code]), node_width,
+                    node_counts[i, code], color=COLORS[COMBO_LABELS[code]], lw=0))
+
+    # Ribbons: fill outgoing/incoming offsets within each node in code order
+    for p in range(len(year_pairs)):
+        out_offset = node_bottom[p].copy()
+        in_offset = node_bottom[p + 1].copy()
+        for src in codes:
+            for dst in codes:
+                n = counts[p, src, dst]
+                if not n:
+                    continue
+                x0, x1 = p + node_width / 2, p + 1 - node_width / 2
+                xm = (x0 + x1) / 2
+                y0, y1 = out_offset[src], in_offset[dst]
+                verts = [
+                    (x0, y0), (xm, y0), (xm, y1), (x1, y1),
+                    (x1, y1 + n), (xm, y1 + n), (xm, y0 + n), (x0, y0 + n),
+                    (x0, y0)
+                ]
+                path_codes = ([Path.MOVETO] + [Path.CURVE4] * 3 + [Path.LINETO]
+                              + [Path.CURVE4] * 3 + [Path.CLOSEPOLY])
+                ax.add_patch(mpatches.PathPatch(
+                    Path(verts, path_codes),
+                    facecolor=COLORS[COMBO_LABELS[src]], alpha=0.35, lw=0))
+                out_offset[src] += n
+                in_offset[dst] += n
+
+    ax.set_xlim(-0.5, len(years) - 0.5)
+    ax.set_ylim(0, (node_bottom + node_counts).max() + gap)
+    ax.set_xticks(range(len(years)))
+    ax.set_xticklabels([str(year) for year in years])
+    ax.set_yticks([])
+    for side in ['top', 'right', 'left']:
+        ax.spines[side].set_visible(False)
+    ax.set_title('State Transitions Between Coverage Combinations', fontsize=16)
+    ax.set_xlabel('Year', fontsize=14)
+    ax.legend(
+        handles=[mpatches.Patch(color=COLORS[COMBO_LABELS[code]], label=COMBO_LABELS[code])
+                 for code in codes],
+        bbox_to_anchor=(0.5, -0.12),
+        loc='upper center',
+        ncol=4
+    )
+    plt.tight_layout()
+
+    save_path = os.path.join(output_dir, 'treatment_coverage_transitions.png')
+    preview.mark_figure(fig)
+    fig.savefig(save_path, dpi=300, bbox_inches='tight')
+    plt.close(fig)
+
+    print(f'Plot saved to {save_path}')
+
+
+def main(csv_path='individual_level_with_category_indicators.csv',
+         output_dir='Visualizations', table_dir='.'):
+    # Load the individual-level category indicators
+    with tracing.span('ingest.individual_csv') as s:
+        df = pd.read_csv(csv_path, usecols=['_state', 'year'] + CATEGORY_COLUMNS + PRODUCT_COLUMNS)
+        s.rows_out = len(df)
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Category-level combos (codes 0-7)
+    with tracing.span('collapse.state_year', rows_in=len(df)) as s:
+        state_year = collapse_state_year(df, CATEGORY_COLUMNS)
+        s.rows_out = len(state_year)
+    with tracing.span('render.coverage_by_year'):
+        plot_coverage_by_year(state_year, output_dir)
+
+    with tracing.span('derive.transitions', rows_in=len(state_year)):
+        counts, year_pairs = transition_counts(state_year, 1 << len(CATEGORY_COLUMNS))
+    with tracing.span('render.coverage_transitions'):
+        plot_coverage_transitions(state_year, counts, year_pairs, output_dir)
+    transitions = transitions_to_frame(counts, year_pairs)
+    transitions_path = preview.output_path(os.path.join(table_dir, 'treatment_coverage_transitions.csv'))
+    transitions.to_csv(transitions_path, index=False)
+    print(f'Transitions saved to {transitions_path}')
+
+    # Product-level combos (codes 0-511)
+    with tracing.span('collapse.product_state_year', rows_in=len(df)) as s:
+        product_year = collapse_state_year(df, PRODUCT_COLUMNS)
+        s.rows_out = len(product_year)
+    with tracing.span('derive.product_transitions', rows_in=len(product_year)):
+        product_counts, product_pairs = transition_counts(product_year, 1 << len(PRODUCT_COLUMNS))
+    product_transitions = transitions_to_frame(product_counts, product_pairs, PRODUCT_COLUMNS)
+    product_path = preview.output_path(os.path.join(table_dir, 'treatment_product_transitions.csv'))
+    product_transitions.to_csv(product_path, index=False)
+    print(f'Product-level transitions saved to {product_path}')
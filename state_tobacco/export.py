@@ -0,0 +1,218 @@
+import gzip
+import io
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from pandas.io.stata import StataWriter
+
+try:
+    from pandas.io.stata import _set_endianness
+except ImportError:  # private helper, not part of the pandas API
+    _set_endianness = None
+
+from . import tracing
+
+# Writers for the large pipeline outputs. Each requested format is written in
+# its own thread; CSV is formatted and compressed in row blocks by a pool of
+# worker threads (zlib and zstd release the GIL while compressing) and the
+# blocks are appended in order. Concatenated gzip members and zstd frames are
+# themselves valid gzip/zstd files, so no block needs to know about the others.
+# The Stata writer converts and writes row blocks instead of materializing a
+# record array for the whole frame. It overrides private StataWriter methods,
+# so it is only used while it produces the same bytes as DataFrame.to_stata on
+# a small sample frame (checked once per process); otherwise `write_stata`
+# falls back to to_stata.
+
+CHUNK_ROWS = 100_000
+COMPRESSION_SUFFIXES = {None: '', 'gzip': '.gz', 'zstd': '.zst'}
+DEFAULT_LEVELS = {'gzip': 6, 'zstd': 3}
+
+
+def _compressor(compression, level=None):
+    """Return a function compressing one block of bytes."""
+    if compression is None:
+        return lambda data: data
+    level = DEFAULT_LEVELS[compression] if level is None else level
+    if compression == 'gzip':
+        return lambda data: gzip.compress(data, compresslevel=level)
+    if compression == 'zstd':
+        try:
+            import zstandard
+        except ImportError as e:
+            raise ImportError("zstd compression requires the 'zstandard' package") from e
+        # ZstdCompressor is not thread-safe, so each block gets its own
+        return lambda data: zstandard.ZstdCompressor(level=level).compress(data)
+    raise ValueError(f"Unknown compression: {compression}")
+
+
+def output_path(base_path, fmt, compression=None):
+    """File name for `fmt` ('csv' or 'dta'); compressed CSVs get a .gz/.zst suffix."""
+    if fmt == 'csv':
+        return f"{base_path}.csv{COMPRESSION_SUFFIXES[compression]}"
+    return f"{base_path}.{fmt}"
+
+
+def write_csv(df, path, compression=None, chunk_rows=CHUNK_ROWS, workers=None, level=None):
+    """
+    Write `df` as CSV (optionally gzip/zstd) in blocks of `chunk_rows` rows.
+
+    Blocks are formatted and compressed by `workers` threads, with at most
+    two blocks per worker in flight, and written in order. Returns the
+    number of bytes written.
+    """
+    compress = _compressor(compression, level)
+    workers = workers or min(8, os.cpu_count() or 1)
+
+    def encode(start):
+        block = df.iloc[start:start + chunk_rows]
+        return compress(block.to_csv(index=False, header=start == 0).encode('utf-8'))
+
+    starts = iter(range(0, max(len(df), 1), chunk_rows))
+    written = 0
+    with ThreadPoolExecutor(workers) as pool, open(path, 'wb') as f:
+        pending = deque(pool.submit(encode, start) for _, start in zip(range(2 * workers), starts))
+        while pending:
+            data = pending.popleft().result()
+            for start in starts:
+                pending.append(pool.submit(encode, start))
+                break
+            f.write(data)
+            written += len(data)
+    return written
+
+
+class BlockStataWriter(StataWriter):
+    """
+    pandas' Stata (format 114) writer, converting and writing the data section
+    in blocks of `block_rows` rows.
+
+    The stock writer pads every string cell in Python and builds a record
+    array plus a byte copy of the whole frame; here each block is packed
+    straight into a structured array of the same layout.
+    """
+
+    def __init__(self, *args, block_rows=CHUNK_ROWS, **kwargs):
+        self.block_rows = block_rows
+        super().__init__(*args, **kwargs)
+
+    def _record_dtype(self):
+        native_byteorder = self._byteorder == _set_endianness(sys.byteorder)
+        fields = []
+        for col, typ in zip(self.data.columns, self.typlist):
+            if typ <= self._max_string_length:
+                fields.append((col, f"S{typ}"))
+            else:
+                dtype = self.data[col].dtype
+                fields.append((col, dtype if native_byteorder else dtype.newbyteorder(self._byteorder)))
+        return np.dtype(fields)
+
+    def _prepare_data(self):
+        # Date columns are converted up front, as in StataWriter
+        return super()._prepare_data() if self._convert_dates else None
+
+    def _write_data(self, records):
+        if records is not None:
+            self._write_bytes(records.tobytes())
+            return
+        dtype = self._record_dtype()
+        strings = [col for col, typ in zip(self.data.columns, self.typlist)
+                   if typ <= self._max_string_length]
+        for start in range(0, len(self.data), self.block_rows):
+            block = self.data.iloc[start:start + self.block_rows]
+            records = np.empty(len(block), dtype=dtype)
+            for col in self.data.columns:
+                values = block[col]
+                if col in strings:
+                    # Strings are already encoded to bytes; S dtype pads with NULs
+                    values = values.fillna(b'').to_numpy(dtype=object)
+                records[col] = values
+            self._write_bytes(records.tobytes())
+
+
+# Private StataWriter attributes BlockStataWriter relies on
+_STATA_INTERNALS = ('_prepare_data', '_write_data', '_write_bytes', '_convert_dates',
+                    '_byteorder', '_max_string_length', 'typlist', 'data')
+
+
+@lru_cache(maxsize=None)
+def block_writer_supported():
+    """Whether BlockStataWriter writes the same bytes as DataFrame.to_stata with this pandas."""
+    if _set_endianness is None:
+        return False
+    sample = pd.DataFrame({
+        'flag': np.array([1, 0, -1, 1, 0], dtype=np.int8),
+        'count': np.array([1, 2, 300, -4, 5], dtype=np.int16),
+        'id': np.array([1, 70000, 3, 4, 5], dtype=np.int32),
+        'weight': [1.5, np.nan, 250.25, 0.0, 1e5],
+        'name': ['Alabama', None, 'District of Columbia', '', 'Ohio'],
+    })
+    stamp = pd.Timestamp(2020, 1, 1).to_pydatetime()
+    written, expected = io.BytesIO(), io.BytesIO()
+    try:
+        writer = BlockStataWriter(written, sample, write_index=False, time_stamp=stamp, block_rows=2)
+        if not all(hasattr(writer, name) for name in _STATA_INTERNALS):
+            return False
+        writer.write_file()
+        sample.to_stata(expected, write_index=False, time_stamp=stamp)
+    except Exception:
+        return False
+    return written.getvalue() == expected.getvalue()
+
+
+def write_stata(df, path, block_rows=CHUNK_ROWS):
+    """
+    Write `df` as a Stata .dta file, in row blocks when this pandas supports
+    BlockStataWriter; returns the file size in bytes.
+    """
+    if block_writer_supported():
+        BlockStataWriter(path, df, write_index=False, block_rows=block_rows).write_file()
+    else:
+        df.to_stata(path, write_index=False)
+    return os.path.getsize(path)
+
+
+def _timed(fmt, func, df, path, **kwargs):
+    with tracing.span(f'export.{fmt}', rows_in=len(df), path=path):
+        start = time.perf_counter()
+        size = func(df, path, **kwargs)
+        seconds = time.perf_counter() - start
+    return {
+        'format': fmt, 'path': path, 'rows': len(df), 'bytes': size, 'seconds': seconds,
+        'rows_per_s': len(df) / seconds if seconds else float('inf'),
+        'mb_per_s': size / (1024 * 1024) / seconds if seconds else float('inf')
+    }
+
+
+def export_frame(df, base_path, formats=('csv',), compression=None, chunk_rows=CHUNK_ROWS, workers=None):
+    """
+    Write `df` to `base_path` + extension in every format of `formats`
+    ('csv', 'dta') concurrently. Returns one throughput record per file.
+    """
+    jobs = []
+    for fmt in formats:
+        path = output_path(base_path, fmt, compression)
+        if fmt == 'csv':
+            jobs.append((fmt, write_csv, path, {'compression': compression, 'chunk_rows': chunk_rows,
+                                                 'workers': workers}))
+        elif fmt == 'dta':
+            jobs.append((fmt, write_stata, path, {'block_rows': chunk_rows}))
+        else:
+            raise ValueError(f"Unknown export format: {fmt}")
+
+    with ThreadPoolExecutor(len(jobs)) as pool:
+        futures = [pool.submit(_timed, fmt, func, df, path, **kwargs) for fmt, func, path, kwargs in jobs]
+        results = [future.result() for future in futures]
+    print_throughput(results)
+    return results
+
+
+def print_throughput(results):
+    for r in results:
+        print(f"  {r['path']}: {r['rows']:,} rows, {r['bytes'] / (1024 * 1024):,.1f} MB in "
+              f"{r['seconds']:.2f}s ({r['rows_per_s']:,.0f} rows/s, {r['mb_per_s']:,.1f} MB/s)")
@@ -0,0 +1,274 @@
+import pandas as pd
+import numpy as np
+import os
+from . import export, preview, statekeys, tracing
+from .quality import IngestProfile
+
+# The raw BRFSS and policy files are not distributed with this project.
+# To replicate the analysis, please download the data from the original sources
+# into `data_dir` (default "BRFSS Data").
+
+DEFAULT_DATA_DIR = "BRFSS Data"
+YEARS = statekeys.YEARS
+
+# Rows per read_stata chunk
+CHUNKSIZE = 250_000
+
+# Keep only relevant variables
+KEEP_VARS = ['_state', 'smoke100', 'smokday2', 'stopsmk2', 'lastsmk2',
+             'income2', '_incomg', 'sex', 'educa', 'race2', 'marital',
+             '_ageg5yr', 'employ', '_wt2', 'children', 'pregnant', '_llcpwt',
+             '_ststr', '_psu', 'numadult', 'hhadult', 'year']
+
+# FPL base amounts by year
+FPL_BASE = {
+    2011: 10890, 2012: 11170, 2013: 11490, 2014: 11670, 2015: 11770,
+    2016: 11880, 2017: 12060, 2018: 12140, 2019: 12490, 2020: 12760
+}
+
+# FPL additional person amounts by year
+FPL_ADDITIONAL = {
+    2011: 3820, 2012: 3960, 2013: 4020, 2014: 4060, 2015: 4160,
+    2016: 4160, 2017: 4180, 2018: 4320, 2019: 4420, 2020: 4480
+}
+
+# Income upper bounds for each income2 category
+INCOME_UPPER = {
+    1: 10000, 2: 15000, 3: 20000, 4: 25000, 5: 35000, 6: 50000, 7: 75000, 8: 100000
+}
+
+def load_brfss_years(data_dir=DEFAULT_DATA_DIR, years=YEARS, profile=None, chunksize=CHUNKSIZE):
+    """
+    Load the yearly BRFSS files and stack the relevant variables.
+
+    Files are read in `chunksize` row blocks. If `profile` (an
+    `IngestProfile`) is given, each raw chunk is added to it before the
+    unused variables are dropped.
+    """
+    # Create empty list to hold all dataframes
+    dfs = []
+    
+    # Import Stata files for all years
+    for year in years:
+        print(f"Loading BRFSS data for {year}...")
+        
+        # Load the data file
+        with tracing.span('ingest.read_stata', year=year) as s:
+            chunks = []
+            with pd.read_stata(os.path.join(data_dir, f"data{year}.dta"), chunksize=chunksize) as reader:
+                for chunk in reader:
+                    # Add year variable if not present
+                    if 'year' not in chunk.columns:
+                        chunk['year'] = year
+                    
+                    if profile is not None:
+                        with tracing.span('ingest.profile', rows_in=len(chunk)):
+                            profile.update(year, chunk)
+                    
+                    # Filter to variables that exist in the dataframe
+                    available_vars = [var for var in KEEP_VARS if var in chunk.columns]
+                    chunks.append(chunk[available_vars])
+            df = pd.concat(chunks, ignore_index=True)
+            s.rows_out = len(df)
+        
+        # Add to list of dataframes
+        dfs.append(df)
+        print(f"Successfully loaded data for {year}")
+    
+    # Combine all years
+    print("Combining data from all years...")
+    with tracing.span('ingest.concat', rows_in=sum(len(df) for df in dfs)) as s:
+        combined_data = pd.concat(dfs, ignore_index=True)
+        s.rows_out = len(combined_data)
+    print(f"Combined data shape: {combined_data.shape}")
+    return combined_data
+
+def merge_table(combined_data, data_dir, filename, on, how):
+    """Load one state-level .dta table and merge it onto the survey data."""
+    with tracing.span('merge.' + os.path.splitext(filename)[0], rows_in=len(combined_data), how=how) as s:
+        table = pd.read_stata(os.path.join(data_dir, filename))
+        combined_data = combined_data.merge(table, on=on, how=how)
+        s.rows_out = len(combined_data)
+    return combined_data
+
+def join_state_year_table(combined_data, data_dir, filename, fips, how):
+    """
+    Load one state-year .dta table (keyed by state_name and year) and join it
+    onto the survey data by the dense `state_year` key.
+    """
+    with tracing.span('merge.' + os.path.splitext(filename)[0], rows_in=len(combined_data), how=how) as s:
+        table = pd.read_stata(os.path.join(data_dir, filename))
+        keys = statekeys.keys_by_name(table, fips)
+        combined_data = statekeys.join(combined_data, table, keys, how, drop=['state_name', 'year'])
+        s.rows_out = len(combined_data)
+    return combined_data
+
+def merge_policy_data(combined_data, data_dir=DEFAULT_DATA_DIR):
+    """Merge the FIPS mapping and state-level policy tables onto the survey data."""
+    # Load FIPS code mapping and merge with combined data
+    print("Loading and merging FIPS code mapping...")
+    # In the Stata script, fips_gnis_mapping.dta has _state and state_name
+    fips = pd.read_stata(os.path.join(data_dir, "fips_gnis_mapping.dta"))
+    with tracing.span('merge.fips_gnis_mapping', rows_in=len(combined_data), how='inner') as s:
+        combined_data = combined_data.merge(fips, on='_state', how='inner')
+        s.rows_out = len(combined_data)
+
+    # Dense state-year key used by the joins below and carried into every output
+    statekeys.add_key(combined_data)
+    
+    # Load and merge Medicaid expansion data
+    print("Merging with Medicaid expansion data...")
+    combined_data = merge_table(combined_data, data_dir, "medicaid_expansion.dta", on='_state', how='left')
+    
+    # Load Cessation Treatments Coverage data
+    print("Merging with Cessation Treatments Coverage data...")
+    # In the Stata script, this file has state_name (not _state) and year as keys
+    combined_data = join_state_year_table(combined_data, data_dir, "Cessation_Treatments_Coverage.dta", fips, how='left')
+    
+    # Filter out states with _state > 56
+    with tracing.span('filter.state_fips', rows_in=len(combined_data)) as s:
+        combined_data = combined_data[combined_data['_state'] <= 56]
+        s.rows_out = len(combined_data)
+    
+    # Load and merge Smokefree Indoor Air Bar data
+    print("Merging with Smokefree Indoor Air Bar data...")
+    # This file has state_name and year as keys
+    combined_data = join_state_year_table(combined_data, data_dir, "Smokefree Indoor Air Bar.dta", fips, how='inner')
+    
+    # Load and merge Smokefree Indoor Air Private Worksites data
+    print("Merging with Smokefree Indoor Air Private Worksites data...")
+    combined_data = join_state_year_table(combined_data, data_dir, "Smokefree Indoor Private Worksites.dta", fips, how='inner')
+    
+    # Load and merge Smokefree Indoor Air Restaurants data
+    print("Merging with Smokefree Indoor Air Restaurants data...")
+    combined_data = join_state_year_table(combined_data, data_dir, "Smokefree Indoor Air Restaurants.dta", fips, how='inner')
+    
+    # Load and merge Cigarette Tax Per Pack data
+    print("Merging with Cigarette Tax Per Pack data...")
+    combined_data = join_state_year_table(combined_data, data_dir, "CigTax_PerPack.dta", fips, how='inner')
+    return combined_data
+
+def derive_eligibility(combined_data):
+    """Derive household size, FPL percentage and Medicaid eligibility."""
+    # Create consistent adults variable
+    print("Creating consistent adults variable...")
+    combined_data['totaladult'] = np.nan
+    
+    # For 2011-2013, use numadult
+    mask_2011_2013 = combined_data['year'].between(2011, 2013)
+    combined_data.loc[mask_2011_2013, 'totaladult'] = combined_data.loc[mask_2011_2013, 'numadult']
+    
+    # For 2014-2020, use numadult if available, otherwise hhadult
+    mask_2014_2020 = combined_data['year'].between(2014, 2020)
+    
+    # First use numadult if available
+    mask_numadult = mask_2014_2020 & combined_data['numadult'].notna()
+    combined_data.loc[mask_numadult, 'totaladult'] = combined_data.loc[mask_numadult, 'numadult']
+    
+    # Then use hhadult for those where numadult is missing
+    mask_hhadult = mask_2014_2020 & combined_data['numadult'].isna() & combined_data['hhadult'].notna()
+    combined_data.loc[mask_hhadult, 'totaladult'] = combined_data.loc[mask_hhadult, 'hhadult']
+    
+    # Calculate Federal Poverty Level (FPL)
+    print("Calculating Federal Poverty Level thresholds...")
+    combined_data['fpl_base'] = combined_data['year'].map(FPL_BASE)
+    combined_data['fpl_additional'] = combined_data['year'].map(FPL_ADDITIONAL)
+    
+    # Calculate household FPL threshold
+    combined_data['fpl_threshold'] = combined_data['fpl_base'] + (combined_data['fpl_additional'] * (combined_data['totaladult'] - 1))
+    
+    # Generate income upper bounds based on income2
+    combined_data['income_upper'] = combined_data['income2'].map(INCOME_UPPER)
+    
+    # Calculate FPL percentage
+    combined_data['fpl_percent'] = np.round((combined_data['income_upper'] / combined_data['fpl_threshold']) * 100)
+    
+    # Create Medicaid eligibility indicator
+    combined_data['Medicaidelig'] = (combined_data['fpl_percent'] <= 100).astype(int)
+    return combined_data
+
+def apply_sample_filters(combined_data):
+    """Restrict to Medicaid-eligible respondents with no children."""
+    # Apply final filters
+    print("Applying final sample filters...")
+    
+    # Keep only Medicaid eligible
+    with tracing.span('filter.medicaid_eligible', rows_in=len(combined_data)) as s:
+        combined_data = combined_data[combined_data['Medicaidelig'] == 1]
+        s.rows_out = len(combined_data)
+    
+    # Filter for no children
+    with tracing.span('filter.no_children', rows_in=len(combined_data)) as s:
+        combined_data = combined_data[combined_data['children'] == 88]
+        s.rows_out = len(combined_data)
+    
+    # Keep only males and females
+    with tracing.span('filter.sex', rows_in=len(combined_data)) as s:
+        combined_data = combined_data[combined_data['sex'].isin([1, 2])]
+        s.rows_out = len(combined_data)
+    return combined_data
+
+def states_suffix(states):
+    """File name suffix of a `--states` run (`_states-1-6`); empty for the full sample."""
+    if not states:
+        return ""
+    return "_states-" + "-".join(str(state) for state in sorted({int(state) for state in states}))
+
+def save_final_dataset(combined_data, output_dir=".", formats=('csv', 'dta'), compression=None, states=None):
+    """
+    Write the final sample in each of `formats`, concurrently. A sample of
+    only some `states` is written under a name ending in `states_suffix`.
+    """
+    # Save the final dataset (CSV optionally gzip/zstd compressed) and the Stata .dta file
+    print("Saving final dataset...")
+    os.makedirs(output_dir, exist_ok=True)
+    name = "Final_2011_2020_Medicaidelig" + states_suffix(states)
+    base_path = preview.output_path(os.path.join(output_dir, name))
+    export.export_frame(combined_data, base_path, formats, compression)
+
+def load_state_slices(parquet_dir, states, profile=None):
+    """
+    Load only the `_state` codes in `states` from the state-sorted Parquet
+    extracts (written by `extract`), adding each year to `profile`.
+    """
+    from . import sql
+    return sql.load_states(parquet_dir, states, profile=profile)
+
+def merge_brfss_data(data_dir=DEFAULT_DATA_DIR, output_dir=".", compression=None, states=None, parquet_dir=None):
+    """
+    Merge the survey years with the policy tables and write the final sample.
+
+    With `states`, only those `_state` codes are read, from the indexed
+    extracts in `parquet_dir`, instead of decoding every row of the .dta files,
+    and the outputs get a `_states-...` suffix so the full sample's files are
+    not overwritten.
+    """
+    print("Starting BRFSS data merge process...")
+    
+    profile = IngestProfile(KEEP_VARS)
+    with tracing.span('ingest') as s:
+        if states:
+            combined_data = load_state_slices(parquet_dir, states, profile)
+        else:
+            combined_data = load_brfss_years(data_dir, profile=profile)
+        s.rows_out = len(combined_data)
+    print("Data quality profile:")
+    profile.print_summary()
+    profile.write(output_dir, prefix='data_quality' + states_suffix(states))
+    if preview.is_enabled():
+        with tracing.span('ingest.preview_subsample', rows_in=len(combined_data)) as s:
+            combined_data = preview.subsample(combined_data)
+            s.rows_out = len(combined_data)
+    with tracing.span('merge', rows_in=len(combined_data)) as s:
+        combined_data = merge_policy_data(combined_data, data_dir)
+        s.rows_out = len(combined_data)
+    with tracing.span('derive.eligibility', rows_in=len(combined_data)) as s:
+        combined_data = derive_eligibility(combined_data)
+        s.rows_out = len(combined_data)
+    with tracing.span('filter', rows_in=len(combined_data)) as s:
+        combined_data = apply_sample_filters(combined_data)
+        s.rows_out = len(combined_data)
+    with tracing.span('export', rows_in=len(combined_data)):
+        save_final_dataset(combined_data, output_dir, compression=compression, states=states)
+    
+    return combined_data
@@ -2,7 +2,7 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import os
-import geopandas as gpd
+from . import preview, tracing
 from matplotlib.colors import LinearSegmentedColormap, Normalize
 import matplotlib.patches as mpatches
 from matplotlib.cm import ScalarMappable
@@ -22,6 +22,25 @@ COLORS = {
     'no_data': '#f0f0f0'            # Light gray for no data
 }
 
+# Hatching for significant LISA clusters drawn over the fill colors
+CLUSTER_HATCHES = {
+    'High-High': '////',
+    'Low-Low': '....',
+    'High-Low': '\\\\',
+    'Low-High': 'xx'
+}
+
+def treatment_colormaps():
+    """Light-to-dark colormaps for the NRT + Medication and NRT + Med + Counseling groups."""
+    nrt_med_cmap = LinearSegmentedColormap.from_list('nrt_med_cmap', 
+                                                    [COLORS['nrt_med_low'], 
+                                                     COLORS['nrt_med_high']])
+    
+    all_three_cmap = LinearSegmentedColormap.from_list('all_three_cmap', 
+                                                      [COLORS['all_three_low'], 
+                                                       COLORS['all_three_high']])
+    return nrt_med_cmap, all_three_cmap
+
 # Function to load and prepare data
 def load_data(file_path="state_level_descriptive_data.csv"):
     """Load the state-level tobacco data."""
@@ -46,7 +65,9 @@ def load_data(file_path="state_level_descriptive_data.csv"):
     return df
 
 # Function to create a single map visualization with filled colors
-def create_filled_color_map(df, shapefile_path, year, column, column_label, title, output_file, output_dir):
+@tracing.traced('render.map')
+def create_filled_color_map(df, shapefile_path, year, column, column_label, title, output_file, output_dir,
+                            clusters=None):
     """
     Create a map where states are filled with different colors based on treatment group,
     and the intensity of the color shows the outcome variable value.
@@ -69,9 +90,16 @@ def create_filled_color_map(df, shapefile_path, year, column, column_label, titl
         Filename for saving the visualization
     output_dir : str
         Directory for saving the visualization
+    clusters : DataFrame, optional
+        LISA results from `spatial.morans_i` (`variable`, `year`, `_state`,
+        `cluster`); significant clusters for this year and column are hatched
     """
+    import geopandas as gpd
+
     # Load the US states shapefile
-    us_states = gpd.read_file(shapefile_path)
+    with tracing.span('ingest.shapefile') as s:
+        us_states = gpd.read_file(shapefile_path)
+        s.rows_out = len(us_states)
     
     # Convert state FIPS codes for joining
     us_states['_state'] = us_states['STATEFP'].astype(int)
@@ -83,7 +111,9 @@ def create_filled_color_map(df, shapefile_path, year, column, column_label, titl
     year_data = df[df['year'] == year]
     
     # Merge with shapefile
-    merged_data = continental_us.merge(year_data, on='_state', how='left')
+    with tracing.span('merge.shapefile', rows_in=len(year_data)) as s:
+        merged_data = continental_us.merge(year_data, on='_state', how='left')
+        s.rows_out = len(merged_data)
     
     # Create figure
     fig, ax = plt.subplots(1, 1, figsize=(12, 8))
@@ -106,13 +136,7 @@ def create_filled_color_map(df, shapefile_path, year, column, column_label, titl
     norm = Normalize(vmin=vmin, vmax=vmax)
     
     # Create custom colormaps for each treatment group
-    nrt_med_cmap = LinearSegmentedColormap.from_list('nrt_med_cmap', 
-                                                    [COLORS['nrt_med_low'], 
-                                                     COLORS['nrt_med_high']])
-    
-    all_three_cmap = LinearSegmentedColormap.from_list('all_three_cmap', 
-                                                      [COLORS['all_three_low'], 
-                                                       COLORS['all_three_high']])
+    nrt_med_cmap, all_three_cmap = treatment_colormaps()
     
     # Plot NRT+Med states with blue color scheme
     if not nrt_med_states.empty:
@@ -149,10 +173,25 @@ def create_filled_color_map(df, shapefile_path, year, column, column_label, titl
     all_three_high_patch = mpatches.Patch(facecolor=COLORS['all_three_high'], 
                                         label=f'NRT + Med + Counseling (High {column_label})')
     
+    legend_handles = [nrt_med_low_patch, nrt_med_high_patch,
+                      all_three_low_patch, all_three_high_patch]
+
+    # Overlay significant LISA clusters as hatching
+    if clusters is not None:
+        year_clusters = clusters[(clusters['variable'] == column) & (clusters['year'] == year)]
+        cluster_states = merged_data.merge(year_clusters[['_state', 'cluster']], on='_state')
+        for cluster, hatch in CLUSTER_HATCHES.items():
+            cluster_data = cluster_states[cluster_states['cluster'] == cluster]
+            if cluster_data.empty:
+                continue
+            cluster_data.plot(ax=ax, facecolor='none', hatch=hatch,
+                              edgecolor=COLORS['border'], linewidth=0.8)
+            legend_handles.append(mpatches.Patch(facecolor='white', edgecolor=COLORS['border'],
+                                                 hatch=hatch, label=f'{cluster} cluster (LISA)'))
+
     # Add the legend
     ax.legend(
-        handles=[nrt_med_low_patch, nrt_med_high_patch, 
-                all_three_low_patch, all_three_high_patch], 
+        handles=legend_handles, 
         loc='lower right', 
         frameon=True,
         fontsize=9
@@ -173,25 +212,22 @@ def create_filled_color_map(df, shapefile_path, year, column, column_label, titl
     
     # Save figure
     map_file = os.path.join(output_dir, output_file)
-    plt.savefig(map_file, dpi=300, bbox_inches='tight')
+    preview.mark_figure(fig)
+    with tracing.span('render.savefig', output=output_file):
+        plt.savefig(map_file, dpi=300, bbox_inches='tight')
     plt.close()
     
     print(f"Map saved to {map_file}")
 
-def main():
-    """Main function to execute the map visualizations."""
-    # Set output directory
-    output_dir = "Visualizations"
-    
+def main(input_path="state_level_descriptive_data.csv",
+         shapefile_path=os.path.join("shapefiles", "cb_2018_us_state_500k.shp"),
+         output_dir="Visualizations", clusters=False, contiguity='queen'):
+    """Main function to execute the map visualizations; `clusters` adds LISA cluster overlays."""
     # Create output directory if it doesn't exist
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
         print(f"Created output directory: {output_dir}")
     
-    # Set path to your downloaded shapefile
-    shapefile_dir = "shapefiles"
-    shapefile_path = os.path.join(shapefile_dir, "cb_2018_us_state_500k.shp")
-    
     # Verify that the shapefile exists
     if not os.path.exists(shapefile_path):
         print(f"Shapefile not found at: {shapefile_path}")
@@ -202,7 +238,9 @@ def main():
     
     # Load the data
     print("\nLoading tobacco data...")
-    df = load_data()
+    with tracing.span('ingest.state_csv') as s:
+        df = load_data(input_path)
+        s.rows_out = 0 if df is None else len(df)
     
     if df is None:
         print("Failed to load data. Exiting.")
@@ -211,6 +249,13 @@ def main():
     print(f"Data loaded successfully with {len(df)} observations.")
     print(f"Found {df['_state'].nunique()} states across {df['year'].nunique()} years.")
     
+    # Local Moran's I clusters for the mapped outcomes
+    lisa = None
+    if clusters:
+        from . import spatial
+        adjacency = spatial.load_adjacency(shapefile_path, contiguity)
+        _, lisa = spatial.morans_i(df, adjacency, variables=['current_smoker_prev', 'past_year_quit_attempt_prev'])
+
     # Create four separate map visualizations
     print("\nCreating map visualizations...")
     
@@ -223,7 +268,8 @@ def main():
         column_label='Smoking Prevalence',
         title='Smoking Prevalence by State (2011)',
         output_file='map_1_smoking_2011.png',
-        output_dir=output_dir
+        output_dir=output_dir,
+        clusters=lisa
     )
     
     # Smoking Prevalence 2020
@@ -235,7 +281,8 @@ def main():
         column_label='Smoking Prevalence',
         title='Smoking Prevalence by State (2020)',
         output_file='map_2_smoking_2020.png',
-        output_dir=output_dir
+        output_dir=output_dir,
+        clusters=lisa
     )
     
     # Quit Success Rate 2011
@@ -247,7 +294,8 @@ def main():
         column_label='Quit Success Rate',
         title='Quit Success Rate by State (2011)',
         output_file='map_3_quit_success_2011.png',
-        output_dir=output_dir
+        output_dir=output_dir,
+        clusters=lisa
     )
     
     # Quit Success Rate 2020
@@ -259,7 +307,8 @@ def main():
         column_label='Quit Success Rate',
         title='Quit Success Rate by State (2020)',
         output_file='map_4_quit_success_2020.png',
-        output_dir=output_dir
+        output_dir=output_dir,
+        clusters=lisa
     )
     
     print("\nAll map visualizations completed successfully!")
@@ -268,6 +317,3 @@ def main():
     print("  - map_2_smoking_2020.png")
     print("  - map_3_quit_success_2011.png")
     print("  - map_4_quit_success_2020.png")
-
-if __name__ == "__main__":
-    main()
\ No newline at end of file
@@ -3,11 +3,13 @@ import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 import os
+import functools
 from matplotlib.ticker import PercentFormatter
+from . import preview, tracing
 
 # Set the aesthetics for the visualizations
-plt.style.use('seaborn-v0_8-whitegrid')
-plt.rcParams.update({
+STYLE = 'seaborn-v0_8-whitegrid'
+RC_PARAMS = {
     'font.family': 'serif',
     'font.size': 12,
     'axes.titlesize': 14,
@@ -16,7 +18,15 @@ plt.rcParams.update({
     'ytick.labelsize': 10,
     'legend.fontsize': 10,
     'figure.titlesize': 16
-})
+}
+
+def styled(func):
+    """Apply the project style while `func` runs, without changing global rcParams."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with plt.style.context(STYLE), plt.rc_context(RC_PARAMS):
+            return func(*args, **kwargs)
+    return wrapper
 
 # Define custom colors for consistent visualization
 COLORS = {
@@ -54,6 +64,7 @@ def load_data(file_path="state_level_descriptive_data.csv"):
     return df
 
 # 1. Smoking Prevalence Trends - First panel
+@styled
 def plot_smoking_prevalence_trends(df, output_dir):
     """Create a figure showing smoking prevalence trends by treatment group."""
     # Create figure
@@ -94,10 +105,12 @@ def plot_smoking_prevalence_trends(df, output_dir):
     plt.tight_layout(rect=[0, 0.03, 1, 0.97])
     
     # Save figure
+    preview.mark_figure(plt.gcf())
     plt.savefig(os.path.join(output_dir, '1_smoking_prevalence_trends.png'), dpi=300, bbox_inches='tight')
     plt.close()
 
 # 2. Quit Success Rate - Second panel
+@styled
 def plot_quit_success_rate(df, output_dir):
     """Create a figure showing quit success rate by treatment group."""
     # Create figure
@@ -142,10 +155,12 @@ def plot_quit_success_rate(df, output_dir):
     plt.tight_layout(rect=[0, 0.03, 1, 0.97])
     
     # Save figure
+    preview.mark_figure(plt.gcf())
     plt.savefig(os.path.join(output_dir, '2_quit_success_rate.png'), dpi=300, bbox_inches='tight')
     plt.close()
 
 # 3. Average Outcomes Bar Chart - Third panel
+@styled
 def plot_average_outcomes(df, output_dir):
     """Create a bar chart comparing average outcomes by treatment approach."""
     # Create figure
@@ -216,22 +231,22 @@ def plot_average_outcomes(df, output_dir):
     plt.tight_layout(rect=[0, 0.03, 1, 0.97])
     
     # Save figure
+    preview.mark_figure(plt.gcf())
     plt.savefig(os.path.join(output_dir, '3_average_outcomes.png'), dpi=300, bbox_inches='tight')
     plt.close()
 
 # Main function
-def main():
+def main(input_path="state_level_descriptive_data.csv", output_dir="Visualizations"):
     """Main function to execute all visualizations."""
-    # Set output directory
-    output_dir = "Visualizations"
-    
     # Create output directory if it doesn't exist
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
         print(f"Created output directory: {output_dir}")
     
     # Load data
-    df = load_data()
+    with tracing.span('ingest.state_csv') as s:
+        df = load_data(input_path)
+        s.rows_out = 0 if df is None else len(df)
     
     if df is None:
         print("Failed to load data. Exiting.")
@@ -243,19 +258,19 @@ def main():
     
     # Generate only the first three smoking outcome visualizations
     print("\nGenerating smoking prevalence trends visualization...")
-    plot_smoking_prevalence_trends(df, output_dir)
+    with tracing.span('render.smoking_prevalence_trends', rows_in=len(df)):
+        plot_smoking_prevalence_trends(df, output_dir)
     
     print("Generating quit success rate visualization...")
-    plot_quit_success_rate(df, output_dir)
+    with tracing.span('render.quit_success_rate', rows_in=len(df)):
+        plot_quit_success_rate(df, output_dir)
     
     print("Generating average outcomes visualization...")
-    plot_average_outcomes(df, output_dir)
+    with tracing.span('render.average_outcomes', rows_in=len(df)):
+        plot_average_outcomes(df, output_dir)
     
     print("\nAll visualizations have been saved to:", output_dir)
     print("The following files were created:")
     print("  - 1_smoking_prevalence_trends.png")
     print("  - 2_quit_success_rate.png")
     print("  - 3_average_outcomes.png")
-    
-if __name__ == "__main__":
-    main()
\ No newline at end of file
@@ -0,0 +1,306 @@
+import pandas as pd
+import numpy as np
+import os
+from . import bitpack, export, preview, reductions, statekeys, tracing
+
+# Keep only the necessary variables
+variables_to_keep = [
+    '_state', 'year', 'state_name', 'state_year', '_llcpwt', 'smoke100', 'smokday2',
+    'lastsmk2', 'stopsmk2', 'sex', '_ageg5yr', 'race2', 'educa', 'employ',
+    'income2', '_incomg', 'fpl_percent', 'pregnant', 'children', 'medicaidelig',
+    'individual_counseling', 'group_counseling', 'nicotine_patch', 'nicotine_gum',
+    'nicotine_lozenge', 'nicotine_nasal_spray', 'nicotine_inhaler',
+    'bupropion', 'varenicline'
+]
+
+# 0/1 indicators are stored as one byte per respondent (the collapse packs
+# them further into bitsets, see bitpack.py)
+INDICATOR_DTYPE = np.int8
+
+# Generate binary variables for each treatment
+treatment_vars = [
+    'nicotine_patch', 'nicotine_gum', 'nicotine_lozenge', 'nicotine_nasal_spray',
+    'nicotine_inhaler', 'bupropion', 'varenicline', 'individual_counseling',
+    'group_counseling'
+]
+
+
+def load_final_dataset(file_path="Final_2011_2020_Medicaidelig.csv"):
+    """Load the merged Medicaid-eligible BRFSS sample."""
+    # Load the dataset
+    df = pd.read_csv(file_path)
+
+    # Rename Medicaidelig to medicaidelig to match STATA code
+    df.rename(columns={'Medicaidelig': 'medicaidelig'}, inplace=True)
+
+    # Restrict to the relevant time period (before COVID-19)
+    df = df[df['year'] <= 2020]
+
+    # Files merged before the state-year key existed
+    if statekeys.COLUMN not in df.columns:
+        df = statekeys.add_key(df.copy())
+    return df
+
+
+###############################################################################
+# CLEAN INDIVIDUAL-LEVEL DATA
+
+def clean_individual_data(df, keep=variables_to_keep):
+    """Keep the analysis variables (`keep`) and drop invalid smoking responses."""
+    df = df[keep]
+
+    # Clean smoking status variables
+    # Drop observations with missing values for key smoking variables
+    df = df[(df['smoke100'] < 7) & (~df['smoke100'].isna())]  # Invalid or missing responses
+    df['smokday2'] = df['smokday2'].fillna(3)  # replace missing with 'No'
+    df = df[df['smokday2'] < 7]  # Invalid responses to current smoking frequency
+    df = df[(df['lastsmk2'] != 77) & (df['lastsmk2'] != 99) | (df['lastsmk2'].isna())]
+    return df
+
+
+def create_individual_variables(df):
+    """Create smoking status, quit attempt and demographic control variables."""
+    # Create smoking status variables
+    # Current smoker
+    df['current_smoker'] = ((df['smoke100'] == 1) &
+                            ((df['smokday2'] == 1) | (df['smokday2'] == 2))).astype(INDICATOR_DTYPE)
+
+    # Former smoker
+    df['former_smoker'] = ((df['smoke100'] == 1) & (df['smokday2'] == 3)).astype(INDICATOR_DTYPE)
+
+    # Never smoker
+    df['never_smoker'] = (df['smoke100'] == 2).astype(INDICATOR_DTYPE)
+
+    # Create quit attempt variables
+    # Current smoker quit attempts
+    df['quit_attempt'] = np.zeros(len(df), dtype=INDICATOR_DTYPE)
+    df.loc[(df['stopsmk2'] == 1) & (df['current_smoker'] == 1), 'quit_attempt'] = 1
+
+    # Recent quitters (former smokers who quit within past year)
+    df['recent_quitter'] = np.zeros(len(df), dtype=INDICATOR_DTYPE)
+    df.loc[(df['lastsmk2'] <= 4) & (df['former_smoker'] == 1), 'recent_quitter'] = 1
+    df.loc[((df['lastsmk2'] >= 77) | (df['lastsmk2'].isna())) &
+           (df['former_smoker'] == 1), 'recent_quitter'] = 0
+
+    # Combined quit attempt variable
+    df['past_year_quit_attempt'] = np.zeros(len(df), dtype=INDICATOR_DTYPE)
+    df.loc[df['recent_quitter'] == 1, 'past_year_quit_attempt'] = 1
+
+    # Create demographic and control variables
+    # Demographics
+    df['low_education'] = ((df['educa'] < 4) & (df['educa'] < 9)).astype(INDICATOR_DTYPE)
+    df['unemployed'] = ((df['employ'] > 2) & (df['employ'] < 9)).astype(INDICATOR_DTYPE)
+    df['low_income'] = (df['fpl_percent'] <= 100).astype(INDICATOR_DTYPE)
+    df['male'] = (df['sex'] == 1).astype(INDICATOR_DTYPE)
+    df['white'] = (df['race2'] == 1).astype(INDICATOR_DTYPE)
+    df['black'] = (df['race2'] == 2).astype(INDICATOR_DTYPE)
+    df['hispanic'] = (df['race2'] == 8).astype(INDICATOR_DTYPE)
+
+    # Age category indicators
+    df['age_18_24'] = ((df['_ageg5yr'] == 1) & (df['_ageg5yr'] < 14)).astype(INDICATOR_DTYPE)
+    df['age_25_34'] = (((df['_ageg5yr'] == 2) | (df['_ageg5yr'] == 3)) &
+                      (df['_ageg5yr'] < 14)).astype(INDICATOR_DTYPE)
+    df['age_35_44'] = (((df['_ageg5yr'] == 4) | (df['_ageg5yr'] == 5)) &
+                      (df['_ageg5yr'] < 14)).astype(INDICATOR_DTYPE)
+    df['age_45_54'] = (((df['_ageg5yr'] == 6) | (df['_ageg5yr'] == 7)) &
+                      (df['_ageg5yr'] < 14)).astype(INDICATOR_DTYPE)
+    df['age_55_64'] = (((df['_ageg5yr'] == 8) | (df['_ageg5yr'] == 9)) &
+                      (df['_ageg5yr'] < 14)).astype(INDICATOR_DTYPE)
+
+    # Smoke-free air law binary indicators are removed
+    return df
+
+
+###############################################################################
+# CREATE TREATMENT CATEGORY VARIABLES
+
+def create_treatment_categories(df):
+    """Create product coverage flags and the NRT/medication/counseling categories."""
+    for var in treatment_vars:
+        df[f'{var}_covered'] = ((df[var] == "Yes") | (df[var] == "Varies")).astype(INDICATOR_DTYPE)
+
+    # Create category-specific coverage indicators
+    # NRT category
+    df['any_nrt'] = ((df['nicotine_patch_covered'] == 1) |
+                     (df['nicotine_gum_covered'] == 1) |
+                     (df['nicotine_lozenge_covered'] == 1) |
+                     (df['nicotine_nasal_spray_covered'] == 1) |
+                     (df['nicotine_inhaler_covered'] == 1)).astype(INDICATOR_DTYPE)
+
+    # Medication category
+    df['any_medication'] = ((df['bupropion_covered'] == 1) |
+                            (df['varenicline_covered'] == 1)).astype(INDICATOR_DTYPE)
+
+    # Counseling category
+    df['any_counseling'] = ((df['individual_counseling_covered'] == 1) |
+                            (df['group_counseling_covered'] == 1)).astype(INDICATOR_DTYPE)
+    return df
+
+
+###############################################################################
+# AGGREGATE TO STATE-LEVEL DATA
+
+# State-level weighted shares: output column -> individual indicator
+SHARE_COLUMNS = {
+    'male_pct': 'male',
+    'white_pct': 'white',
+    'black_pct': 'black',
+    'hispanic_pct': 'hispanic',
+    'low_educ_pct': 'low_education',
+    'unemployed_pct': 'unemployed',
+    'poverty_pct': 'low_income',
+    'age_18_24_pct': 'age_18_24',
+    'age_25_34_pct': 'age_25_34',
+    'age_35_44_pct': 'age_35_44',
+    'age_45_54_pct': 'age_45_54',
+    'age_55_64_pct': 'age_55_64'
+}
+
+
+def aggregate_state_level(df):
+    """Collapse the individual-level data to weighted state-year measures."""
+    # Put rows in state-year key order and pack the 0/1 indicators as bitsets
+    order, bounds, keys = bitpack.key_order(df[statekeys.COLUMN].to_numpy(), statekeys.N_KEYS)
+    state, year = statekeys.decode(keys)
+    first = order[bounds[:-1]]
+    state_df = pd.DataFrame({'_state': state, 'year': year,
+                             'state_name': df['state_name'].to_numpy()[first],
+                             statekeys.COLUMN: keys.astype(np.int32)})
+    indicators = (['current_smoker', 'past_year_quit_attempt'] + list(SHARE_COLUMNS.values())
+                  + ['any_nrt', 'any_medication', 'any_counseling'])
+    packed = bitpack.PackedIndicators.from_frame(df, indicators, order)
+    weights = df['_llcpwt'].to_numpy(dtype=float)[order]
+
+    weighted = dict(zip(indicators, packed.weighted_sums(weights, bounds)))
+    total = reductions.segment_sum(weights, bounds)
+
+    # Calculate outcome variables
+    # Current smoking prevalence
+    state_df['current_smoker_count'] = weighted['current_smoker']
+    state_df['total_count'] = total
+    state_df['current_smoker_prev'] = state_df['current_smoker_count'] / state_df['total_count']
+
+    # Past-year quit attempt prevalence in total population
+    state_df['past_year_quit_attempt_prev'] = weighted['past_year_quit_attempt'] / total
+    state_df['past_year_quit_attempt_count'] = weighted['past_year_quit_attempt']
+
+    # Calculate control variables - demographics
+    for column, indicator in SHARE_COLUMNS.items():
+        state_df[column] = weighted[indicator] / total
+        if column == 'poverty_pct':
+            # medicaidelig is read from the merged file and may be missing, so it is not packed
+            medicaidelig = df['medicaidelig'].to_numpy(dtype=float)[order]
+            state_df['medicaid_elig_pct'] = reductions.segment_sum(medicaidelig * weights, bounds) / total
+
+    # Policy variables - removed as requested
+
+    # Treatment category variables: did anyone in the state-year have coverage?
+    coverage = packed.counts(bounds, ['any_nrt', 'any_medication', 'any_counseling'])
+    for column, counts in zip(['any_nrt', 'any_medication', 'any_counseling'], coverage):
+        state_df[column] = (counts > 0).astype(np.int64)
+
+    # Population variables
+    state_df['weighted_pop'] = total
+    state_df['sample_size'] = np.diff(bounds).astype(float)
+    return state_df
+
+
+###############################################################################
+# CREATE FOCUSED TREATMENT VARIABLES
+
+def assign_treatment_groups(state_df):
+    """Assign mutually exclusive treatment groups and keep groups 2 and 4."""
+    # Create mutually exclusive treatment categories
+    state_df['treatment_group'] = 0  # No coverage (control)
+    state_df.loc[(state_df['any_nrt'] == 1) & (state_df['any_medication'] == 0) &
+                (state_df['any_counseling'] == 0), 'treatment_group'] = 1  # NRT only
+    state_df.loc[(state_df['any_nrt'] == 1) & (state_df['any_medication'] == 1) &
+                (state_df['any_counseling'] == 0), 'treatment_group'] = 2  # NRT + Med
+    state_df.loc[(state_df['any_nrt'] == 0) & (state_df['any_medication'] == 0) &
+                (state_df['any_counseling'] == 1), 'treatment_group'] = 3  # Counseling only
+    state_df.loc[(state_df['any_nrt'] == 1) & (state_df['any_medication'] == 1) &
+                (state_df['any_counseling'] == 1), 'treatment_group'] = 4  # All three
+
+    # Validation to ensure mutual exclusivity in treatment_group assignment
+    # Generate indicator variables for the two key treatment groups we're focusing on
+    state_df['nrt_med'] = (state_df['treatment_group'] == 2).astype(int)
+    state_df['all_three'] = (state_df['treatment_group'] == 4).astype(int)
+
+    # Restrict sample to only the relevant treatment groups
+    state_df = state_df[(state_df['treatment_group'] == 2) | (state_df['treatment_group'] == 4)]
+
+    # Track treatment status changes over time
+    state_df = state_df.sort_values(statekeys.COLUMN)
+    return state_df
+
+
+###############################################################################
+# FINALIZE DATA
+
+def print_summary(state_df):
+    """Display coverage checks and summary statistics."""
+    # Check data coverage by state
+    state_coverage = state_df.groupby('_state').agg(
+        min_year=('year', 'min'),
+        max_year=('year', 'max')
+    )
+    state_coverage['num_years'] = state_coverage['max_year'] - state_coverage['min_year'] + 1
+    state_coverage['num_obs'] = state_df.groupby('_state').size()
+
+    # Display some summary statistics
+    print("\nTreatment groups and composition:")
+    print(state_df['treatment_group'].value_counts())
+    print("\nCross-tabulation of treatment group by year:")
+    print(pd.crosstab(state_df['treatment_group'], state_df['year']))
+
+    print("\nOutcome variables by treatment status:")
+    print(state_df.groupby('treatment_group')[
+        ['current_smoker_prev', 'past_year_quit_attempt_prev']
+    ].agg(['mean', 'std', 'min', 'max', 'count']))
+
+
+def main(input_path="Final_2011_2020_Medicaidelig.csv", output_dir=".", compression=None):
+    os.makedirs(output_dir, exist_ok=True)
+    with tracing.span('ingest.read_csv') as s:
+        if preview.is_enabled() and not os.path.exists(input_path):
+            # Only the preview ingest has been run; its output is already subsampled
+            df = load_final_dataset(preview.output_path(input_path))
+        else:
+            df = load_final_dataset(input_path)
+            if preview.is_enabled():
+                df = preview.subsample(df)
+        s.rows_out = len(df)
+    keep = variables_to_keep
+    if preview.is_enabled():
+        # The design variables are needed for the error bounds
+        keep = variables_to_keep + preview.DESIGN_VARS + ['preview_fraction', 'preview_stratum_psus']
+    with tracing.span('filter.smoking_responses', rows_in=len(df)) as s:
+        df = clean_individual_data(df, keep)
+        s.rows_out = len(df)
+    with tracing.span('derive.individual_variables', rows_in=len(df)):
+        df = create_individual_variables(df)
+    with tracing.span('derive.treatment_categories', rows_in=len(df)):
+        df = create_treatment_categories(df)
+
+    # Save individual-level dataset before collapsing
+    with tracing.span('export.individual_csv', rows_in=len(df)):
+        individual_path = preview.output_path(os.path.join(output_dir, "individual_level_with_category_indicators"))
+        export.export_frame(df, individual_path, compression=compression)
+
+    with tracing.span('collapse.state_year', rows_in=len(df)) as s:
+        state_df = aggregate_state_level(df)
+        s.rows_out = len(state_df)
+    if preview.is_enabled():
+        with tracing.span('collapse.preview_error_bounds', rows_in=len(df)):
+            state_df = preview.add_error_bounds(state_df, df)
+    with tracing.span('collapse.treatment_groups', rows_in=len(state_df)) as s:
+        state_df = assign_treatment_groups(state_df)
+        s.rows_out = len(state_df)
+
+    # Save the final dataset
+    with tracing.span('export.state_csv', rows_in=len(state_df)):
+        state_df.to_csv(preview.output_path(os.path.join(output_dir, "state_level_descriptive_data.csv")), index=False)
+
+    print_summary(state_df)
+
+    print("\nComplete!")
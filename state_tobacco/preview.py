@@ -0,0 +1,163 @@
+import os
+import numpy as np
+import pandas as pd
+from . import statekeys
+
+# Preview mode: run the pipeline on a design-preserving subsample for quick,
+# approximate tables and figures.
+#
+# The subsample keeps whole primary sampling units (_psu) and draws them
+# within every year x stratum (_ststr), keeping at least two PSUs per stratum
+# where there are two, so the design can still be used for variance
+# estimation. _llcpwt is scaled by (PSUs in stratum) / (PSUs drawn) so totals
+# stay on the population scale. State-level estimates then carry a
+# linearized standard error and a margin of error for the difference from
+# the full run.
+#
+# Preview mode is off by default; `enable(fraction)` (or `--preview FRACTION`
+# on the command line) turns it on for the stages of this process, which then
+# read and write `*_preview` files, put figures in a `preview` subdirectory
+# and stamp them as previews.
+
+DESIGN_VARS = ['_ststr', '_psu']
+SUFFIX = '_preview'
+# State-level estimate -> individual indicator it is the weighted share of
+BOUND_COLUMNS = {
+    'current_smoker_prev': 'current_smoker',
+    'past_year_quit_attempt_prev': 'past_year_quit_attempt'
+}
+Z_95 = 1.959964
+
+_fraction = None
+_seed = 0
+
+
+def enable(fraction, seed=0):
+    global _fraction, _seed
+    if not 0 < fraction <= 1:
+        raise ValueError(f"Preview fraction must be in (0, 1], got {fraction}")
+    _fraction, _seed = fraction, seed
+
+
+def disable():
+    global _fraction
+    _fraction = None
+
+
+def is_enabled():
+    return _fraction is not None
+
+
+def fraction():
+    return _fraction
+
+
+def output_path(path):
+    """`path` with the preview suffix before its extension (data.csv.gz -> data_preview.csv.gz)."""
+    if not is_enabled():
+        return path
+    root, ext = os.path.splitext(path)
+    if ext in ('.gz', '.zst'):
+        root, inner = os.path.splitext(root)
+        ext = inner + ext
+    return f"{root}{SUFFIX}{ext}"
+
+
+def figure_dir(output_dir):
+    """Directory for figures: a `preview` subdirectory in preview mode."""
+    return os.path.join(output_dir, 'preview') if is_enabled() else output_dir
+
+
+def mark_figure(fig):
+    """Stamp `fig` as a preview; does nothing outside preview mode."""
+    if is_enabled():
+        fig.text(0.5, 0.995, f"PREVIEW - approximate, {_fraction:.0%} subsample",
+                 ha='center', va='top', fontsize=12, fontweight='bold', color='#b22222')
+
+
+def subsample(df, fraction=None, seed=None, weight='_llcpwt'):
+    """
+    Draw whole PSUs within each year x stratum and rescale `weight`.
+
+    Adds `preview_fraction`, the share of rows kept, and `preview_stratum_psus`,
+    the PSUs drawn from the row's stratum (needed for variances once later
+    filters have removed some of them). Rows with a missing PSU are treated
+    as their own PSU, rows with a missing stratum as one stratum per year.
+    """
+    fraction = _fraction if fraction is None else fraction
+    seed = _seed if seed is None else seed
+
+    strata = df['_ststr'].fillna(-1).to_numpy()
+    psu = df['_psu'].to_numpy(dtype=float, na_value=np.nan)
+    psu = np.where(np.isnan(psu), -1.0 - np.arange(len(df)), psu)
+    units = pd.DataFrame({'year': df['year'].to_numpy(), 'stratum': strata, 'psu': psu})
+    unit = units.groupby(['year', 'stratum', 'psu'], sort=False).ngroup().to_numpy()
+    stratum = units.groupby(['year', 'stratum'], sort=False).ngroup().to_numpy()
+
+    # Stratum of each PSU, then a random rank of the PSUs within their stratum
+    unit_stratum = np.zeros(unit.max() + 1, dtype=np.int64)
+    unit_stratum[unit] = stratum
+    rng = np.random.default_rng(seed)
+    order = np.lexsort((rng.random(len(unit_stratum)), unit_stratum))
+    n_units = np.bincount(unit_stratum)
+    first = np.concatenate([[0], np.cumsum(n_units)[:-1]])
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order)) - first[unit_stratum[order]]
+
+    n_drawn = np.clip(np.rint(fraction * n_units), np.minimum(2, n_units), n_units).astype(np.int64)
+    keep = rank[unit] < n_drawn[stratum]
+
+    sample = df[keep].copy()
+    sample[weight] = sample[weight] * (n_units / n_drawn)[stratum[keep]]
+    sample['preview_fraction'] = len(sample) / max(len(df), 1)
+    sample['preview_stratum_psus'] = n_drawn[stratum[keep]]
+    print(f"Preview subsample: {len(sample):,} of {len(df):,} rows "
+          f"({n_drawn.sum():,} of {n_units.sum():,} PSUs in {len(n_units):,} strata)")
+    return sample
+
+
+def ratio_se(df, value, keys, weight='_llcpwt'):
+    """
+    Linearized standard error of the weighted share of `value` within each
+    group of `keys`, from PSU totals within strata (with-replacement design).
+
+    The groups are domains: PSUs of a stratum that have no rows in a group
+    contribute zero totals, so the stratum's PSU count comes from
+    `preview_stratum_psus` rather than from the rows present.
+    """
+    data = df[keys + DESIGN_VARS + ['preview_stratum_psus']].copy()
+    w = df[weight].to_numpy(dtype=float)
+    y = df[value].to_numpy(dtype=float)
+    data['w'] = w
+    data['wy'] = w * y
+    groups = data.groupby(keys)
+    total = groups['w'].transform('sum').to_numpy()
+    share = groups['wy'].transform('sum').to_numpy() / total
+    data['z'] = w * (y - share) / total
+
+    psu_totals = data.groupby(keys + DESIGN_VARS).agg(z=('z', 'sum'), n=('preview_stratum_psus', 'first'))
+    psu_totals['zz'] = psu_totals['z'] ** 2
+    strata = psu_totals.groupby(keys + ['_ststr']).agg(z=('z', 'sum'), zz=('zz', 'sum'), n=('n', 'first'))
+    # n/(n-1) * sum over all n PSUs of (z - mean)^2, zeros included; single-PSU strata add nothing
+    n = strata['n'].to_numpy(dtype=float)
+    ss = strata['zz'].to_numpy() - strata['z'].to_numpy() ** 2 / n
+    strata['v'] = np.where(n > 1, n / np.maximum(n - 1, 1) * ss, 0.0)
+    return np.sqrt(strata.groupby(keys)['v'].sum())
+
+
+def add_error_bounds(state_df, df, columns=BOUND_COLUMNS):
+    """
+    Add `<column>_se` and `<column>_moe` for each state-level share.
+
+    The margin of error is the 95% bound on the difference between the
+    preview estimate and the full-data estimate: the standard error scaled
+    by sqrt(1 - f), since the preview is a fraction f of the full sample.
+    """
+    fraction = float(df['preview_fraction'].iloc[0])
+    keys = state_df[statekeys.COLUMN].to_numpy()
+    for column, indicator in columns.items():
+        se = ratio_se(df, indicator, [statekeys.COLUMN])
+        state_df[f'{column}_se'] = se.reindex(keys).to_numpy()
+        state_df[f'{column}_moe'] = Z_95 * np.sqrt(1 - fraction) * state_df[f'{column}_se']
+    state_df['preview_fraction'] = fraction
+    return state_df
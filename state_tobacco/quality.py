@@ -0,0 +1,254 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+from . import preview
+
+# Data-quality profile accumulated chunk by chunk while the raw BRFSS files are
+# read, so it needs no second pass over the data. For every year and state it
+# counts the rows each sample filter of the pipeline drops, the missing values
+# of each variable, and a histogram of the codes of each categorical variable
+# (flagging codes outside the codebook). It also records variables absent from
+# a year's file, which `load_brfss_years` would otherwise drop silently.
+
+# Rows per state slot: FIPS codes are < 100; the last slot collects missing or
+# out-of-range codes
+STATE_SLOTS = 101
+
+
+def _values(chunk, col):
+    """Column `col` of a raw chunk as floats (NaN for missing values or an absent column)."""
+    if col not in chunk.columns:
+        return np.full(len(chunk), np.nan)
+    return chunk[col].to_numpy(dtype=float, na_value=np.nan)
+
+
+def medicaid_eligible(chunk):
+    """The Medicaidelig flag of `ingest.derive_eligibility` for the rows of a raw chunk."""
+    from .ingest import FPL_BASE, FPL_ADDITIONAL, INCOME_UPPER
+
+    year, numadult, hhadult = _values(chunk, 'year'), _values(chunk, 'numadult'), _values(chunk, 'hhadult')
+    totaladult = np.where((year >= 2011) & (year <= 2013), numadult,
+                          np.where((year >= 2014) & (year <= 2020),
+                                   np.where(np.isnan(numadult), hhadult, numadult), np.nan))
+    base = pd.Series(year).map(FPL_BASE).to_numpy(dtype=float)
+    additional = pd.Series(year).map(FPL_ADDITIONAL).to_numpy(dtype=float)
+    income_upper = pd.Series(_values(chunk, 'income2')).map(INCOME_UPPER).to_numpy(dtype=float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        fpl_percent = np.round(income_upper / (base + additional * (totaladult - 1)) * 100)
+    return fpl_percent <= 100
+
+
+# Sample filters in the order the pipeline applies them (ingest.merge_policy_data
+# and apply_sample_filters, then prepare.clean_individual_data):
+# name -> keep condition on a raw chunk. A row is counted as dropped by the
+# first filter it fails, so the drops add up to the rows the pipeline removes;
+# rows removed by the inner joins with the policy tables (state-years missing
+# from a table) are not counted and reach the later filters here.
+FILTERS = {
+    'state_fips': lambda chunk: _values(chunk, '_state') <= 56,
+    'medicaid_eligible': medicaid_eligible,
+    'no_children': lambda chunk: _values(chunk, 'children') == 88,
+    'sex_valid': lambda chunk: np.isin(_values(chunk, 'sex'), [1, 2]),
+    'smoke100_valid': lambda chunk: _values(chunk, 'smoke100') < 7,
+    # prepare fills a missing smokday2 with 3 and keeps a missing lastsmk2
+    'smokday2_valid': lambda chunk: ~(_values(chunk, 'smokday2') >= 7),
+    'lastsmk2_valid': lambda chunk: ~np.isin(_values(chunk, 'lastsmk2'), [77, 99])
+}
+
+# Documented codes for the categorical variables
+EXPECTED_CODES = {
+    '_state': set(range(1, 57)) - {3, 7, 14, 43, 52} | {66, 72, 78},
+    'smoke100': {1, 2, 7, 9},
+    'smokday2': {1, 2, 3, 7, 9},
+    'stopsmk2': {1, 2, 7, 9},
+    'lastsmk2': set(range(1, 9)) | {77, 99},
+    'income2': set(range(1, 9)) | {77, 99},
+    '_incomg': set(range(1, 6)) | {9},
+    'sex': {1, 2, 7, 9},
+    'educa': set(range(1, 7)) | {9},
+    'race2': set(range(1, 10)),
+    'marital': set(range(1, 7)) | {9},
+    '_ageg5yr': set(range(1, 15)),
+    'employ': set(range(1, 10)),
+    'children': set(range(1, 89)) | {99},
+    'pregnant': {1, 2, 7, 9},
+    'numadult': set(range(1, 100)),
+    'hhadult': set(range(1, 100))
+}
+
+# Histogram bins for integer codes 0..CODE_BINS-1; other values are tallied separately
+CODE_BINS = 100
+
+
+class IngestProfile:
+    """Accumulates drop counts, missingness and code histograms over ingest chunks."""
+
+    def __init__(self, columns, filters=FILTERS, code_vars=EXPECTED_CODES):
+        self.columns = list(columns)
+        self.filters = dict(filters)
+        self.code_vars = dict(code_vars)
+        self.missing_columns = {}
+        self.rows = {}
+        self.dropped = {}
+        self.missing = {}
+        self.codes = {}
+        self.overflow = {}
+
+    def _year_arrays(self, year):
+        if year not in self.rows:
+            self.rows[year] = np.zeros(STATE_SLOTS, dtype=np.int64)
+            self.dropped[year] = {name: np.zeros(STATE_SLOTS, dtype=np.int64) for name in self.filters}
+            self.missing[year] = {col: np.zeros(STATE_SLOTS, dtype=np.int64) for col in self.columns}
+            self.codes[year] = {var: np.zeros((STATE_SLOTS, CODE_BINS), dtype=np.int64)
+                                for var in self.code_vars}
+            self.overflow[year] = {var: {} for var in self.code_vars}
+        return self.rows[year], self.missing[year], self.codes[year], self.overflow[year]
+
+    def update(self, year, chunk):
+        """Add one chunk of raw rows for `year` to the profile."""
+        rows, missing, codes, overflow = self._year_arrays(year)
+        if year not in self.missing_columns:
+            self.missing_columns[year] = [col for col in self.columns if col not in chunk.columns]
+
+        state = chunk['_state'].to_numpy(dtype=float, na_value=np.nan)
+        slot = np.where(np.isnan(state) | (state < 0) | (state >= STATE_SLOTS - 1),
+                        STATE_SLOTS - 1, np.nan_to_num(state)).astype(np.intp)
+        state_rows = np.bincount(slot, minlength=STATE_SLOTS)
+        rows += state_rows
+
+        # Each row counts against the first filter that removes it
+        remaining = np.ones(len(chunk), dtype=bool)
+        for name, keep in self.filters.items():
+            kept = np.asarray(keep(chunk), dtype=bool)
+            self.dropped[year][name] += np.bincount(slot[remaining & ~kept], minlength=STATE_SLOTS)
+            remaining &= kept
+
+        for col in set(self.columns) | set(self.code_vars):
+            if col not in chunk.columns:
+                if col in missing:
+                    missing[col] += state_rows
+                continue
+            values = chunk[col].to_numpy(dtype=float, na_value=np.nan)
+            isna = np.isnan(values)
+            if col in missing:
+                missing[col] += np.bincount(slot[isna], minlength=STATE_SLOTS)
+            if col not in codes:
+                continue
+
+            # One bincount over (state slot, code) pairs
+            in_range = ~isna & (values >= 0) & (values < CODE_BINS) & (values == np.floor(values))
+            flat = slot[in_range] * CODE_BINS + values[in_range].astype(np.intp)
+            codes[col] += np.bincount(flat, minlength=STATE_SLOTS * CODE_BINS).reshape(STATE_SLOTS, CODE_BINS)
+            odd = ~isna & ~in_range
+            if odd.any():
+                for key in zip(slot[odd].tolist(), values[odd].tolist()):
+                    overflow[col][key] = overflow[col].get(key, 0) + 1
+
+    def drops(self):
+        """Rows, rows dropped by each filter (in pipeline order) and rows kept, per year and state."""
+        frames = []
+        for year, rows in self.rows.items():
+            present = np.nonzero(rows)[0]
+            frame = pd.DataFrame({'year': year, '_state': present, 'rows': rows[present]})
+            kept = rows[present].copy()
+            for name, counts in self.dropped[year].items():
+                frame[f'{name}_dropped'] = counts[present]
+                kept -= counts[present]
+            frame['kept'] = kept
+            frames.append(frame)
+        return self._concat(frames, state_slots=True)
+
+    def missingness(self):
+        """Missing values per year, state and variable (long format)."""
+        frames = []
+        for year, rows in self.rows.items():
+            present = np.nonzero(rows)[0]
+            for col, counts in self.missing[year].items():
+                frames.append(pd.DataFrame({
+                    'year': year, '_state': present, 'variable': col,
+                    'n_missing': counts[present],
+                    'pct_missing': counts[present] / rows[present]
+                }))
+        return self._concat(frames, state_slots=True)
+
+    def code_histograms(self):
+        """Count of each observed code per year and variable, flagging undocumented codes."""
+        frames = []
+        for year, codes in self.codes.items():
+            for var, counts in codes.items():
+                totals = counts.sum(axis=0)
+                observed = np.nonzero(totals)[0]
+                values = list(observed.astype(float))
+                tallies = list(totals[observed])
+                extra = {}
+                for (_, value), count in self.overflow[year][var].items():
+                    extra[value] = extra.get(value, 0) + count
+                values += list(extra)
+                tallies += list(extra.values())
+                frames.append(pd.DataFrame({
+                    'year': year, 'variable': var, 'code': values,
+                    'count': np.array(tallies, dtype=np.int64),
+                    'expected': np.array([value in self.code_vars[var] for value in values], dtype=bool)
+                }))
+        return self._concat(frames)
+
+    def missing_column_table(self):
+        """Variables in the keep list that a year's file does not contain."""
+        return pd.DataFrame([{'year': year, 'variable': col}
+                             for year, cols in self.missing_columns.items() for col in cols],
+                            columns=['year', 'variable'])
+
+    @staticmethod
+    def _concat(frames, state_slots=False):
+        if not frames:
+            return pd.DataFrame()
+        frame = pd.concat(frames, ignore_index=True)
+        if state_slots:
+            # Missing or out-of-range FIPS codes are reported as _state = NaN
+            frame['_state'] = frame['_state'].where(frame['_state'] < STATE_SLOTS - 1)
+        return frame
+
+    def summary(self):
+        """Totals per year: rows, rows dropped by each filter and kept, unexpected codes, missing columns."""
+        summary = {}
+        histograms = self.code_histograms()
+        for year, rows in self.rows.items():
+            unexpected = {}
+            year_codes = histograms[(histograms['year'] == year) & ~histograms['expected']]
+            for var, group in year_codes.groupby('variable'):
+                unexpected[var] = {str(code): int(count) for code, count in zip(group['code'], group['count'])}
+            dropped = {name: int(counts.sum()) for name, counts in self.dropped[year].items()}
+            summary[int(year)] = {
+                'rows': int(rows.sum()),
+                'dropped_by_filter': dropped,
+                'kept': int(rows.sum()) - sum(dropped.values()),
+                'unexpected_codes': unexpected,
+                'missing_columns': self.missing_columns.get(year, [])
+            }
+        return summary
+
+    def write(self, output_dir, prefix='data_quality'):
+        """Write the profile tables as CSV plus a JSON summary (`*_preview` files in preview mode)."""
+        os.makedirs(output_dir, exist_ok=True)
+
+        def path(name):
+            return preview.output_path(os.path.join(output_dir, f'{prefix}_{name}'))
+
+        self.drops().to_csv(path('drops.csv'), index=False)
+        self.missingness().to_csv(path('missing.csv'), index=False)
+        self.code_histograms().to_csv(path('codes.csv'), index=False)
+        self.missing_column_table().to_csv(path('missing_columns.csv'), index=False)
+        with open(path('summary.json'), 'w') as f:
+            json.dump(self.summary(), f, indent=2)
+        print(f"Data quality profile written to {output_dir}")
+
+    def print_summary(self):
+        for year, stats in self.summary().items():
+            dropped = ', '.join(f"{name}={count:,}" for name, count in stats['dropped_by_filter'].items() if count)
+            print(f"  {year}: {stats['rows']:,} rows, {stats['kept']:,} kept; "
+                  f"dropped in pipeline order: {dropped or 'none'}")
+            if stats['missing_columns']:
+                print(f"    missing columns: {', '.join(stats['missing_columns'])}")
+            for var, codes in stats['unexpected_codes'].items():
+                print(f"    unexpected {var} codes: {codes}")
@@ -0,0 +1,190 @@
+import math
+import numpy as np
+
+# Exact, order-independent grouped sums of float64 values. A plain float sum
+# depends on the order of the additions, so splitting an aggregation into
+# different chunks, threads or processes changes the last digits. Here every
+# value is split into its binary exponent and three 18-bit pieces of its
+# 53-bit mantissa; the pieces are summed per group and exponent. Those sums
+# are sums of small integers, exact in float64 (up to 2^35 values per group and
+# exponent), so they do not depend on the order or partitioning of the input.
+# Each group total is then rounded once with math.fsum, which makes it the
+# correctly rounded exact sum: bit-identical for any chunk size or number of
+# workers, and at least as accurate as a naive sum.
+#
+# Accumulators of disjoint parts of the data can be merged in any order with
+# `merge`. Non-finite values (NaN, inf) propagate as in a plain sum.
+#
+# When one array of values is summed over many different subsets (weights over
+# the rows of each indicator), `split_fixed` instead writes every value on one
+# fixed-point grid and cuts it into 18-bit limbs: then any float summation of a
+# limb array (np.add.reduceat, a matrix product) is exact, and `combine_fixed`
+# rounds each total once. The number of limbs grows with the dynamic range of
+# the values (4 for survey weights spanning 1 to 10^5).
+
+LIMB_BITS = 18
+N_LIMBS = 3
+MANTISSA_BITS = 53
+_LIMB_MASK = (1 << LIMB_BITS) - 1
+# Rows split into limbs at a time by `segment_sum`
+BLOCK_ROWS = 1 << 16
+
+
+class ExactSum:
+    """Running exact sums for `n_groups` groups."""
+
+    def __init__(self, n_groups):
+        self.n_groups = n_groups
+        # limbs x groups x exponents (from e_low) of integer piece sums
+        self.e_low = 0
+        self.limbs = np.zeros((N_LIMBS, n_groups, 0))
+        self.special = np.zeros(n_groups)
+
+    def _widen(self, e_low, e_high):
+        """Extend the exponent range to cover [e_low, e_high]."""
+        width = self.limbs.shape[2]
+        if width and e_low >= self.e_low and e_high < self.e_low + width:
+            return
+        low = min(e_low, self.e_low) if width else e_low
+        high = max(e_high, self.e_low + width - 1) if width else e_high
+        limbs = np.zeros((N_LIMBS, self.n_groups, high - low + 1))
+        limbs[:, :, self.e_low - low:self.e_low - low + width] = self.limbs
+        self.e_low, self.limbs = low, limbs
+
+    def add(self, values, groups):
+        """Add `values` to the sums of their groups (integer codes in [0, n_groups))."""
+        values = np.asarray(values, dtype=float)
+        groups = np.asarray(groups, dtype=np.int64)
+        finite = np.isfinite(values)
+        if not finite.all():
+            np.add.at(self.special, groups[~finite], values[~finite])
+            values, groups = values[finite], groups[finite]
+        nonzero = values != 0
+        values, groups = values[nonzero], groups[nonzero]
+        if not len(values):
+            return self
+
+        # value = mantissa * 2^(exponent - 53) with an exact 53-bit integer mantissa
+        fraction, exponent = np.frexp(values)
+        mantissa = (fraction * 2.0 ** MANTISSA_BITS).astype(np.int64)
+        sign = np.sign(mantissa)
+        magnitude = np.abs(mantissa)
+
+        e_low, e_high = int(exponent.min()), int(exponent.max())
+        width = e_high - e_low + 1
+        bins = groups * width + (exponent - e_low)
+        self._widen(e_low, e_high)
+        offset = e_low - self.e_low
+        for j in range(N_LIMBS):
+            piece = sign * ((magnitude >> (LIMB_BITS * j)) & _LIMB_MASK)
+            sums = np.bincount(bins, weights=piece, minlength=self.n_groups * width)
+            self.limbs[j, :, offset:offset + width] += sums.reshape(self.n_groups, width)
+        return self
+
+    def merge(self, other):
+        """Add the sums of another accumulator over the same groups."""
+        if other.limbs.shape[2]:
+            self._widen(other.e_low, other.e_low + other.limbs.shape[2] - 1)
+            offset = other.e_low - self.e_low
+            self.limbs[:, :, offset:offset + other.limbs.shape[2]] += other.limbs
+        self.special += other.special
+        return self
+
+    def result(self):
+        """The correctly rounded sum of each group (0.0 for empty groups)."""
+        totals = np.zeros(self.n_groups)
+        exponents = self.e_low + np.arange(self.limbs.shape[2]) - MANTISSA_BITS
+        scales = [np.ldexp(1.0, exponents + LIMB_BITS * j) for j in range(N_LIMBS)]
+        for g in np.flatnonzero(self.limbs.any(axis=(0, 2))):
+            # Each term is an exact float (an integer below 2^53 times a power of two)
+            terms = np.concatenate([self.limbs[j, g] * scales[j] for j in range(N_LIMBS)])
+            totals[g] = math.fsum(terms[terms != 0].tolist())
+        return totals + self.special
+
+
+def grouped_sum(values, groups, n_groups):
+    """Exact per-group sums of `values` for integer group codes `groups`."""
+    return ExactSum(n_groups).add(values, groups).result()
+
+
+def segment_sum(values, bounds, block_rows=BLOCK_ROWS):
+    """
+    Exact sums of `values[..., bounds[i]:bounds[i + 1]]` for each segment
+    (rows in group order, along the last axis), by fixed-point limbs and
+    np.add.reduceat over blocks of `block_rows` rows.
+    """
+    values = np.asarray(values, dtype=float)
+    bounds = np.asarray(bounds, dtype=np.int64)
+    rows = values.reshape(-1, values.shape[-1])
+    e_low, n_limbs = fixed_layout(values)
+    limb_sums = np.zeros((n_limbs, len(rows), len(bounds) - 1))
+    special = np.zeros((len(rows), len(bounds) - 1))
+    for start in range(bounds[0], bounds[-1], block_rows):
+        stop = min(start + block_rows, bounds[-1])
+        block = rows[:, start:stop]
+        finite = np.isfinite(block)
+        limbs = split_fixed(np.where(finite, block, 0.0).ravel(), e_low, n_limbs)
+
+        # Segments of the block that belong to one group; limb sums are exact in any order
+        cuts = np.unique(np.concatenate([[start], bounds[(bounds > start) & (bounds < stop)]]))
+        group = np.searchsorted(bounds, cuts, side='right') - 1
+        limb_sums[:, :, group] += np.add.reduceat(limbs.reshape(n_limbs, *block.shape), cuts - start, axis=-1)
+        if not finite.all():
+            # NaN/inf propagate as in a plain sum
+            column, row = np.nonzero(~finite)
+            np.add.at(special, (column, np.searchsorted(bounds, start + row, side='right') - 1),
+                      block[column, row])
+    totals = combine_fixed(limb_sums, e_low) + special
+    return totals.reshape(values.shape[:-1] + (len(bounds) - 1,))
+
+
+def fixed_layout(values):
+    """
+    (lowest binary exponent, number of limbs) of the fixed-point grid that
+    holds all finite nonzero `values` exactly.
+    """
+    magnitude = np.abs(np.asarray(values, dtype=float))
+    used = np.isfinite(magnitude) & (magnitude != 0)
+    if not used.any():
+        return 0, 1
+    e_low = int(np.frexp(np.where(used, magnitude, np.inf).min())[1])
+    e_high = int(np.frexp(np.where(used, magnitude, 0.0).max())[1])
+    bits = MANTISSA_BITS + e_high - e_low
+    return e_low, -(-bits // LIMB_BITS)
+
+
+def _scale(x, exponent, out):
+    """x * 2^exponent into `out`, exact while the result is a normal float."""
+    if abs(exponent) < 1000:
+        return np.multiply(x, 2.0 ** exponent, out=out)
+    out[...] = np.ldexp(x, exponent)
+    return out
+
+
+def split_fixed(values, e_low, n_limbs):
+    """
+    Limbs (n_limbs x len(values), float64) of the finite `values` on the grid
+    of `fixed_layout`: value = sum_j limbs[j] * 2^(e_low - 53 + 18 j), every
+    limb an integer below 2^18 in magnitude. Sums of up to 2^35 limbs are exact.
+    """
+    values = np.asarray(values, dtype=float)
+    rest = np.abs(values)
+    limbs = np.empty((n_limbs, len(values)))
+    scratch = np.empty_like(rest)
+    # Peel limbs off from the top: scaling by powers of two, flooring and
+    # subtracting the leading bits are all exact
+    for j in reversed(range(n_limbs)):
+        exponent = e_low - MANTISSA_BITS + LIMB_BITS * j
+        limb = np.floor(_scale(rest, -exponent, limbs[j]), out=limbs[j])
+        rest -= _scale(limb, exponent, scratch)
+    return np.copysign(limbs, values, out=limbs)
+
+
+def combine_fixed(limb_sums, e_low):
+    """Correctly rounded totals from limb sums (n_limbs x ...) on the grid starting at `e_low`."""
+    limb_sums = np.asarray(limb_sums, dtype=float)
+    n_limbs = limb_sums.shape[0]
+    exponents = e_low - MANTISSA_BITS + LIMB_BITS * np.arange(n_limbs)
+    terms = np.ldexp(limb_sums.reshape(n_limbs, -1), exponents[:, None]).T
+    totals = np.array([math.fsum(row) for row in terms.tolist()])
+    return totals.reshape(limb_sums.shape[1:])
@@ -0,0 +1,264 @@
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from scipy import sparse, stats
+from . import preview, tracing
+
+# Individual-level logistic regression of smoking outcomes on treatment
+# coverage, the demographic controls built in prepare.py, and state and year
+# fixed effects, weighted by _llcpwt.
+#
+# The model columns are read from the individual-level file once, in chunks,
+# and kept on disk as compact per-chunk arrays that are memory-mapped on every
+# IRLS (Newton) iteration. Each iteration computes the weighted Gram matrix
+# X'AX and score X'(w(y - p)) chunk by chunk in worker threads and sums them,
+# so memory is bounded by the chunk size times the number of workers. Fixed
+# effects are never expanded into dummy columns: their blocks of the Gram
+# matrix are weighted counts (bincounts) and sparse one-hot products.
+#
+# Standard errors are cluster-robust by state, the level at which coverage
+# varies; the individual-level file does not carry the _ststr/_psu design.
+
+DEFAULT_INPUT = "individual_level_with_category_indicators.csv"
+OUTCOMES = ['current_smoker', 'recent_quitter']
+COVERAGE = ['any_nrt', 'any_medication', 'any_counseling']
+COVARIATES = ['male', 'white', 'black', 'hispanic', 'low_education', 'unemployed',
+              'age_18_24', 'age_25_34', 'age_35_44', 'age_45_54', 'age_55_64']
+CHUNKSIZE = 500_000
+MAX_ITER = 25
+TOL = 1e-10
+
+
+class DesignCache:
+    """
+    The model columns of the individual-level file as one structured .npy
+    per chunk in a temporary directory. Rows missing any model variable or
+    with a non-positive weight are dropped.
+    """
+
+    def __init__(self, path, outcomes=OUTCOMES, regressors=COVERAGE + COVARIATES,
+                 chunksize=CHUNKSIZE, directory=None):
+        self.outcomes = list(outcomes)
+        self.regressors = list(regressors)
+        self.directory = tempfile.mkdtemp(prefix='state_tobacco_design_', dir=directory)
+        self.dtype = np.dtype([('y', np.int8, len(self.outcomes)), ('x', np.float32, len(self.regressors)),
+                               ('w', np.float64), ('state', np.int16), ('year', np.int16)])
+        self.files = []
+        self.rows_read = 0
+        self.rows = 0
+        states, years = set(), set()
+
+        columns = ['_state', 'year', '_llcpwt'] + self.outcomes + self.regressors
+        with tracing.span('regression.cache', path=path) as s:
+            for chunk in pd.read_csv(path, usecols=columns, chunksize=chunksize):
+                self.rows_read += len(chunk)
+                chunk = chunk.dropna()
+                chunk = chunk[chunk['_llcpwt'] > 0]
+                records = np.empty(len(chunk), dtype=self.dtype)
+                records['y'] = chunk[self.outcomes].to_numpy()
+                records['x'] = chunk[self.regressors].to_numpy()
+                records['w'] = chunk['_llcpwt'].to_numpy()
+                records['state'] = chunk['_state'].to_numpy()
+                records['year'] = chunk['year'].to_numpy()
+                states.update(np.unique(records['state']).tolist())
+                years.update(np.unique(records['year']).tolist())
+
+                file = os.path.join(self.directory, f'chunk_{len(self.files):05d}.npy')
+                np.save(file, records)
+                self.files.append(file)
+                self.rows += len(records)
+            s.rows_out = self.rows
+
+        self.states = np.array(sorted(states))
+        self.years = np.array(sorted(years))
+
+    def chunks(self):
+        for file in self.files:
+            yield np.load(file, mmap_mode='r')
+
+    def close(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def _chunk_terms(records, outcome, beta_dense, beta_state, beta_year, state_lookup, year_lookup,
+                 n_states, n_years):
+    """
+    Log-likelihood, Gram matrix, score and per-state score totals of one chunk,
+    over all fixed-effect levels (reference levels are dropped by the caller).
+    """
+    n = len(records)
+    dense = np.empty((n, len(beta_dense)))
+    dense[:, 0] = 1.0
+    dense[:, 1:] = records['x']
+    y = records['y'][:, outcome].astype(float)
+    w = records['w']
+    s = state_lookup[records['state']]
+    t = year_lookup[records['year']]
+
+    eta = dense @ beta_dense + beta_state[s] + beta_year[t]
+    mu = 1 / (1 + np.exp(-eta))
+    loglik = np.sum(w * (y * eta - np.logaddexp(0, eta)))
+    a = w * mu * (1 - mu)
+    r = w * (y - mu)
+
+    rows = np.arange(n)
+    onehot_a = sparse.csr_matrix((a, (rows, s)), shape=(n, n_states))
+    onehot_ay = sparse.csr_matrix((a, (rows, t)), shape=(n, n_years))
+    state_year = s * n_years + t
+
+    dd = (dense * a[:, None]).T @ dense
+    ds = (onehot_a.T @ dense).T
+    dy = (onehot_ay.T @ dense).T
+    sy = np.bincount(state_year, a, minlength=n_states * n_years).reshape(n_states, n_years)
+    gram = np.block([
+        [dd, ds, dy],
+        [ds.T, np.diag(np.bincount(s, a, minlength=n_states)), sy],
+        [dy.T, sy.T, np.diag(np.bincount(t, a, minlength=n_years))]
+    ])
+    score = np.concatenate([dense.T @ r, np.bincount(s, r, minlength=n_states),
+                            np.bincount(t, r, minlength=n_years)])
+
+    # Score totals per state (the clusters)
+    onehot_r = sparse.csr_matrix((r, (rows, s)), shape=(n, n_states))
+    clusters = np.hstack([
+        onehot_r.T @ dense,
+        np.diag(np.bincount(s, r, minlength=n_states)),
+        np.bincount(state_year, r, minlength=n_states * n_years).reshape(n_states, n_years)
+    ])
+    return loglik, gram, score, clusters
+
+
+def _independent_columns(gram, tol=1e-9):
+    """Greedy choice of linearly independent columns from a Gram matrix (pivoted Cholesky)."""
+    keep = []
+    for j in range(len(gram)):
+        candidate = keep + [j]
+        sub = gram[np.ix_(candidate, candidate)]
+        scale = np.sqrt(np.diag(sub))
+        if scale[-1] == 0:
+            continue
+        if np.linalg.eigvalsh(sub / np.outer(scale, scale))[0] > tol:
+            keep.append(j)
+    return np.array(keep)
+
+
+def fit_logit(cache, outcome, max_iter=MAX_ITER, tol=TOL, workers=None):
+    """
+    Fit the weighted logit of `outcome` by IRLS over the cached chunks.
+
+    Returns a DataFrame of coefficients (with state-clustered standard errors)
+    for the intercept, coverage and covariates, and a dict of fit statistics.
+    """
+    k = cache.outcomes.index(outcome)
+    n_states, n_years = len(cache.states), len(cache.years)
+    state_lookup = np.zeros(cache.states.max() + 1, dtype=np.intp)
+    state_lookup[cache.states] = np.arange(n_states)
+    year_lookup = np.zeros(cache.years.max() + 1, dtype=np.intp)
+    year_lookup[cache.years] = np.arange(n_years)
+
+    names = (['intercept'] + cache.regressors + [f'state_{code}' for code in cache.states]
+             + [f'year_{year}' for year in cache.years])
+    n_dense = 1 + len(cache.regressors)
+    # The first state and year are the reference levels
+    columns = np.r_[np.arange(n_dense), n_dense + np.arange(1, n_states),
+                    n_dense + n_states + np.arange(1, n_years)]
+    beta = np.zeros(len(names))
+    workers = workers or min(8, os.cpu_count() or 1)
+
+    def accumulate(records):
+        return _chunk_terms(records, k, beta[:n_dense], beta[n_dense:n_dense + n_states],
+                            beta[n_dense + n_states:], state_lookup, year_lookup, n_states, n_years)
+
+    previous = None
+    with ThreadPoolExecutor(workers) as pool:
+        for iteration in range(1, max_iter + 1):
+            with tracing.span('regression.irls_pass', rows_in=cache.rows, iteration=iteration):
+                loglik, gram, score, clusters = 0.0, 0.0, 0.0, 0.0
+                # Partial sums are added in chunk order, so results do not depend on scheduling
+                for terms in pool.map(accumulate, cache.chunks()):
+                    loglik += terms[0]
+                    gram = gram + terms[1]
+                    score = score + terms[2]
+                    clusters = clusters + terms[3]
+            if iteration == 1:
+                # Coverage constant in the sample, empty levels, etc. are omitted
+                columns = columns[_independent_columns(gram[np.ix_(columns, columns)])]
+            if previous is not None and abs(loglik - previous) <= tol * (abs(loglik) + tol):
+                converged = True
+                break
+            previous = loglik
+            step = np.linalg.solve(gram[np.ix_(columns, columns)], score[columns])
+            beta[columns] += step
+        else:
+            converged = False
+            print(f"  {outcome}: IRLS did not converge in {max_iter} iterations")
+
+    # Sandwich covariance with the usual G/(G-1) small-sample factor
+    bread = np.linalg.inv(gram[np.ix_(columns, columns)])
+    meat = clusters[:, columns].T @ clusters[:, columns] * n_states / (n_states - 1)
+    cov = bread @ meat @ bread
+    se = np.full(len(names), np.nan)
+    se[columns] = np.sqrt(np.diag(cov))
+
+    reported = slice(0, n_dense)
+    coef = beta[reported]
+    z = coef / se[reported]
+    results = pd.DataFrame({
+        'outcome': outcome,
+        'term': names[reported],
+        'coef': coef,
+        'std_err': se[reported],
+        'z': z,
+        'p_value': 2 * stats.norm.sf(np.abs(z)),
+        'odds_ratio': np.exp(coef),
+        'ci_low': np.exp(coef - 1.959964 * se[reported]),
+        'ci_high': np.exp(coef + 1.959964 * se[reported])
+    })
+    omitted = [names[j] for j in np.setdiff1d(np.r_[np.arange(n_dense), n_dense + np.arange(1, n_states),
+                                                     n_dense + n_states + np.arange(1, n_years)], columns)]
+    results.loc[results['term'].isin(omitted), ['coef', 'odds_ratio', 'ci_low', 'ci_high']] = np.nan
+    fit = {
+        'outcome': outcome,
+        'n_obs': cache.rows,
+        'n_states': n_states,
+        'n_years': n_years,
+        'iterations': iteration,
+        'converged': converged,
+        'log_likelihood': loglik,
+        'omitted': omitted
+    }
+    return results, fit
+
+
+def main(input_path=DEFAULT_INPUT, outcomes=OUTCOMES, output_dir=".", chunksize=CHUNKSIZE,
+         workers=None, max_iter=MAX_ITER):
+    """Fit the logit for each outcome and write the coefficient table."""
+    print(f"Reading model variables from {input_path}...")
+    tables = []
+    with DesignCache(input_path, outcomes, chunksize=chunksize) as cache:
+        print(f"  {cache.rows:,} of {cache.rows_read:,} rows with complete data "
+              f"in {len(cache.files)} chunks; {len(cache.states)} states, {len(cache.years)} years")
+        for outcome in outcomes:
+            with tracing.span('regression.fit', rows_in=cache.rows, outcome=outcome):
+                results, fit = fit_logit(cache, outcome, max_iter=max_iter, workers=workers)
+            tables.append(results)
+            print(f"\n{outcome}: weighted logit, state and year fixed effects, "
+                  f"{fit['iterations']} iterations, log pseudo-likelihood {fit['log_likelihood']:,.1f}")
+            if fit['omitted']:
+                print(f"  omitted (collinear or constant): {', '.join(fit['omitted'])}")
+            print(results.drop(columns='outcome').round(4).to_string(index=False))
+
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = preview.output_path(os.path.join(output_dir, "individual_logit_results.csv"))
+    pd.concat(tables, ignore_index=True).to_csv(output_path, index=False)
+    print(f"\nResults saved to {output_path}")
@@ -0,0 +1,356 @@
+import asyncio
+import json
+import math
+from functools import lru_cache
+from urllib.parse import parse_qs, urlsplit
+import numpy as np
+import pandas as pd
+
+# Local HTTP/JSON query service over the state-level panel. The panel is loaded
+# once into a dense metric x state x year array with the treatment group of
+# every state-year alongside, and the treatment-group means over time are
+# precomputed for every metric. A query is then a few index operations on
+# those arrays; the encoded response of each distinct query (and each chart
+# fragment) is kept in an LRU cache, so repeated dashboard requests are a
+# dictionary lookup. The HTTP layer is plain asyncio with keep-alive, no
+# framework.
+#
+#   GET /meta                                      metrics, states, years, groups
+#   GET /query?metric=M&states=1,6&years=2011-2015[&by=treatment_group][&weight=pop]
+#   GET /trend?metric=M[&weight=pop]               treatment-group means by year
+#   GET /chart?metric=M[&weight=pop]               the trend as an SVG fragment
+#   GET /stats                                     request and cache counters
+
+DEFAULT_INPUT = "state_level_descriptive_data.csv"
+HOST = '127.0.0.1'
+PORT = 8765
+CACHE_SIZE = 4096
+GROUP_LABELS = {2: 'NRT + Medication', 4: 'NRT + Medication + Counseling'}
+# Same colors as the trend charts in plots.py
+GROUP_COLORS = {2: '#1f77b4', 4: '#ff7f0e'}
+MAX_REQUEST_BYTES = 16 * 1024
+PATHS = ('/meta', '/query', '/trend', '/chart')
+
+
+class QueryError(ValueError):
+    """A malformed or unknown query parameter (answered with HTTP 400)."""
+
+
+class StatePanel:
+    """The state-level panel as indexed arrays, with precomputed group means by year."""
+
+    def __init__(self, df):
+        df = df.dropna(subset=['_state', 'year'])
+        self.states = np.sort(df['_state'].unique()).astype(int)
+        self.years = np.sort(df['year'].unique()).astype(int)
+        self.metrics = [col for col in df.columns
+                        if col not in ('_state', 'year', 'state_year', 'treatment_group')
+                        and pd.api.types.is_numeric_dtype(df[col])]
+        self.names = df.groupby('_state')['state_name'].first().reindex(self.states).tolist() \
+            if 'state_name' in df.columns else [None] * len(self.states)
+
+        s = np.searchsorted(self.states, df['_state'].to_numpy().astype(int))
+        t = np.searchsorted(self.years, df['year'].to_numpy().astype(int))
+        self.values = np.full((len(self.metrics), len(self.states), len(self.years)), np.nan)
+        self.values[:, s, t] = df[self.metrics].to_numpy(dtype=float).T
+        self.groups = np.zeros((len(self.states), len(self.years)), dtype=np.int64)
+        if 'treatment_group' in df.columns:
+            self.groups[s, t] = df['treatment_group'].fillna(0).to_numpy().astype(np.int64)
+        self.weights = (self.values[self.metrics.index('weighted_pop')] if 'weighted_pop' in self.metrics
+                        else np.ones((len(self.states), len(self.years))))
+        self.group_codes = sorted(set(np.unique(self.groups).tolist()) - {0})
+        self.metric_index = {metric: i for i, metric in enumerate(self.metrics)}
+
+        # metric x group x year means over all states, plain and weighted
+        all_states = np.ones(len(self.states), dtype=bool)
+        self.trends = {weighted: self.group_means(all_states, weighted) for weighted in (False, True)}
+
+    @classmethod
+    def from_csv(cls, path=DEFAULT_INPUT):
+        return cls(pd.read_csv(path))
+
+    def group_means(self, state_mask, weighted=False, metrics=slice(None)):
+        """Means of `metrics` by treatment group and year over the states in `state_mask`."""
+        values = self.values[metrics][:, state_mask]
+        groups = self.groups[state_mask]
+        weights = self.weights[state_mask] if weighted else np.ones(groups.shape)
+        means = np.full((values.shape[0], len(self.group_codes), len(self.years)), np.nan)
+        for g, code in enumerate(self.group_codes):
+            member = (groups == code)[None] & ~np.isnan(values)
+            w = np.where(member, weights[None], 0.0)
+            total = w.sum(axis=1)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                means[:, g] = np.where(total > 0, (np.where(member, values, 0.0) * w).sum(axis=1) / total, np.nan)
+        return means
+
+    def metric(self, name):
+        if name not in self.metric_index:
+            raise QueryError(f"Unknown metric: {name}")
+        return self.metric_index[name]
+
+    def state_mask(self, states):
+        if states is None:
+            return np.ones(len(self.states), dtype=bool)
+        unknown = sorted(set(states) - set(self.states.tolist()))
+        if unknown:
+            raise QueryError(f"Unknown states: {unknown}")
+        return np.isin(self.states, states)
+
+    def year_mask(self, years):
+        if years is None:
+            return np.ones(len(self.years), dtype=bool)
+        return np.isin(self.years, years)
+
+
+def _json(value):
+    """JSON-safe value: NaN becomes null, NumPy scalars plain numbers."""
+    if isinstance(value, (float, np.floating)):
+        return None if math.isnan(value) else round(float(value), 10)
+    if isinstance(value, np.integer):
+        return int(value)
+    return value
+
+
+def _parse_ints(text, name, allowed):
+    """
+    '1,6,9' or '2011-2015' (or a mix) as a sorted tuple of ints; None when
+    absent. Ranges only expand to the `allowed` values they cover, so their
+    width does not matter; a range covering none of them is an error.
+    """
+    if text is None:
+        return None
+    values = set()
+    try:
+        for part in text.split(','):
+            if '-' in part:
+                low, high = part.split('-')
+                low, high = int(low), int(high)
+                covered = [value for value in allowed if low <= value <= high]
+                if not covered:
+                    raise QueryError(f"{name} range {part} is outside the panel")
+                values.update(covered)
+            elif part:
+                values.add(int(part))
+    except QueryError:
+        raise
+    except ValueError:
+        raise QueryError(f"Bad {name}: {text}") from None
+    return tuple(sorted(values))
+
+
+class QueryService:
+    """Answers the service's queries from a StatePanel, caching encoded responses."""
+
+    def __init__(self, panel, cache_size=CACHE_SIZE):
+        self.panel = panel
+        self.requests = 0
+        self.errors = 0
+        self._answer = lru_cache(maxsize=cache_size)(self._answer_uncached)
+
+    def handle(self, target):
+        """Return (status, content type, body bytes) for a request target such as '/trend?metric=x'."""
+        self.requests += 1
+        url = urlsplit(target)
+        params = parse_qs(url.query)
+        if any(len(values) > 1 for values in params.values()):
+            self.errors += 1
+            return 400, 'application/json', b'{"error": "repeated query parameter"}'
+        params = {key: values[0] for key, values in params.items()}
+        if url.path == '/stats':
+            return 200, 'application/json', self._encode(self.stats())
+        if url.path not in PATHS:
+            self.errors += 1
+            return 404, 'application/json', self._encode({'error': f"Unknown path: {url.path}"})
+        try:
+            return self._answer(self._normalize(url.path, params))
+        except QueryError as e:
+            self.errors += 1
+            return 400, 'application/json', self._encode({'error': str(e)})
+
+    def stats(self):
+        info = self._answer.cache_info()
+        return {'requests': self.requests, 'errors': self.errors, 'cache_hits': info.hits,
+                'cache_misses': info.misses, 'cache_size': info.currsize, 'cache_max': info.maxsize}
+
+    def _normalize(self, path, params):
+        """A hashable cache key, so equivalent queries (e.g. reordered states) share one entry."""
+        weight = params.get('weight')
+        if weight not in (None, 'pop'):
+            raise QueryError(f"Bad weight: {weight} (use weight=pop)")
+        by = params.get('by')
+        if by not in (None, 'treatment_group'):
+            raise QueryError(f"Bad by: {by} (use by=treatment_group)")
+        metric = params.get('metric')
+        if path != '/meta':
+            if metric is None:
+                raise QueryError("Missing metric")
+            self.panel.metric(metric)
+        return (path, metric, _parse_ints(params.get('states'), 'states', self.panel.states.tolist()),
+                _parse_ints(params.get('years'), 'years', self.panel.years.tolist()), by, weight == 'pop')
+
+    def _answer_uncached(self, key):
+        path, metric, states, years, by, weighted = key
+        if path == '/meta':
+            body = self.meta()
+        elif path == '/query':
+            body = self.query(metric, states, years, by, weighted)
+        elif path == '/trend':
+            body = self.trend(metric, states, years, weighted)
+        else:
+            return 200, 'image/svg+xml', self.chart(metric, states, years, weighted).encode()
+        return 200, 'application/json', self._encode(body)
+
+    @staticmethod
+    def _encode(body):
+        return json.dumps(body, separators=(',', ':')).encode()
+
+    def meta(self):
+        panel = self.panel
+        return {
+            'metrics': panel.metrics,
+            'states': [{'_state': int(code), 'state_name': name} for code, name in zip(panel.states, panel.names)],
+            'years': panel.years.tolist(),
+            'treatment_groups': {str(code): GROUP_LABELS.get(code, str(code)) for code in panel.group_codes}
+        }
+
+    def query(self, metric, states, years, by, weighted):
+        """Metric values per state-year with their treatment group, or group means with by=treatment_group."""
+        if by == 'treatment_group':
+            return self.trend(metric, states, years, weighted)
+        panel = self.panel
+        s = np.flatnonzero(panel.state_mask(states))
+        t = np.flatnonzero(panel.year_mask(years))
+        values = panel.values[panel.metric(metric)][np.ix_(s, t)]
+        a, b = np.nonzero(~np.isnan(values))
+        names = [panel.names[i] for i in s[a]]
+        rows = [{'_state': state, 'state_name': name, 'year': year, 'treatment_group': group or None, 'value': value}
+                for state, name, year, group, value in zip(panel.states[s[a]].tolist(), names,
+                                                          panel.years[t[b]].tolist(),
+                                                          panel.groups[s[a], t[b]].tolist(),
+                                                          values[a, b].round(10).tolist())]
+        return {'metric': metric, 'rows': rows}
+
+    def trend(self, metric, states, years, weighted):
+        """Treatment-group means of `metric` by year (precomputed when no states are selected)."""
+        panel = self.panel
+        m = panel.metric(metric)
+        if states is None:
+            means = panel.trends[weighted][m]
+        else:
+            means = panel.group_means(panel.state_mask(states), weighted, metrics=[m])[0]
+        t = np.flatnonzero(panel.year_mask(years))
+        return {
+            'metric': metric,
+            'weighted': weighted,
+            'years': panel.years[t].tolist(),
+            'groups': {str(code): {'label': GROUP_LABELS.get(code, str(code)),
+                                   'means': [_json(v) for v in means[g, t]]}
+                       for g, code in enumerate(panel.group_codes)}
+        }
+
+    def chart(self, metric, states, years, weighted, width=480, height=240, pad=32):
+        """The group trend as a standalone SVG line chart fragment."""
+        trend = self.trend(metric, states, years, weighted)
+        x_years = trend['years']
+        series = [(int(code), group['means']) for code, group in trend['groups'].items()]
+        values = [v for _, means in series for v in means if v is not None]
+        low, high = (min(values), max(values)) if values else (0.0, 1.0)
+        if high == low:
+            low, high = low - 0.5, high + 0.5
+
+        def x(i):
+            return pad + (width - 2 * pad) * (i / max(len(x_years) - 1, 1))
+
+        def y(v):
+            return height - pad - (height - 2 * pad) * (v - low) / (high - low)
+
+        parts = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+                 f'viewBox="0 0 {width} {height}" font-family="sans-serif" font-size="10">',
+                 f'<text x="{width / 2}" y="14" text-anchor="middle" font-size="12">{metric}</text>']
+        for code, means in series:
+            points = ' '.join(f'{x(i):.1f},{y(v):.1f}' for i, v in enumerate(means) if v is not None)
+            parts.append(f'<polyline fill="none" stroke="{GROUP_COLORS.get(code, "#555")}" stroke-width="2" '
+                         f'points="{points}"><title>{GROUP_LABELS.get(code, code)}</title></polyline>')
+        for i, year in enumerate(x_years):
+            parts.append(f'<text x="{x(i):.1f}" y="{height - pad + 14}" text-anchor="middle">{year}</text>')
+        parts.append(f'<text x="{pad - 4}" y="{y(high):.1f}" text-anchor="end">{high:.3g}</text>')
+        parts.append(f'<text x="{pad - 4}" y="{y(low):.1f}" text-anchor="end">{low:.3g}</text>')
+        parts.append('</svg>')
+        return ''.join(parts)
+
+
+STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+               413: 'Request Entity Too Large'}
+
+
+def _response(status, content_type, body, keep_alive):
+    head = (f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\nContent-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode('latin-1') + body
+
+
+async def _serve_connection(service, reader, writer):
+    """Answer requests on one connection until the client closes it or asks to."""
+    try:
+        while True:
+            try:
+                head = await reader.readuntil(b'\r\n\r\n')
+            except asyncio.IncompleteReadError:
+                break
+            except asyncio.LimitOverrunError:
+                writer.write(_response(413, 'application/json', b'{"error": "request too large"}', False))
+                break
+            lines = head.decode('latin-1').split('\r\n')
+            parts = lines[0].split(' ')
+            headers = {}
+            for line in lines[1:]:
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip().lower()
+            if len(parts) != 3:
+                writer.write(_response(400, 'application/json', b'{"error": "bad request line"}', False))
+                break
+            method, target, version = parts
+            keep_alive = (headers.get('connection') != 'close' if version == 'HTTP/1.1'
+                          else headers.get('connection') == 'keep-alive')
+            if 'content-length' in headers:
+                try:
+                    length = int(headers['content-length'])
+                except ValueError:
+                    length = -1
+                if not 0 <= length <= MAX_REQUEST_BYTES:
+                    writer.write(_response(400, 'application/json', b'{"error": "bad content-length"}', False))
+                    break
+                await reader.readexactly(length)
+            if method != 'GET':
+                response = _response(405, 'application/json', b'{"error": "only GET is supported"}', keep_alive)
+            else:
+                response = _response(*service.handle(target), keep_alive)
+            writer.write(response)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(service, host=HOST, port=PORT):
+    server = await asyncio.start_server(lambda r, w: _serve_connection(service, r, w), host, port,
+                                        limit=MAX_REQUEST_BYTES)
+    addresses = ', '.join(f"http://{sock.getsockname()[0]}:{sock.getsockname()[1]}" for sock in server.sockets)
+    print(f"Serving state-level queries on {addresses} (Ctrl-C to stop)")
+    async with server:
+        await server.serve_forever()
+
+
+def main(input_path=DEFAULT_INPUT, host=HOST, port=PORT, cache_size=CACHE_SIZE):
+    """Load the state-level panel and serve queries until interrupted."""
+    panel = StatePanel.from_csv(input_path)
+    print(f"Loaded {len(panel.metrics)} metrics for {len(panel.states)} states and {len(panel.years)} years "
+          f"from {input_path}")
+    service = QueryService(panel, cache_size)
+    try:
+        asyncio.run(serve(service, host, port))
+    except KeyboardInterrupt:
+        print(f"\nStopped. {service.stats()}")
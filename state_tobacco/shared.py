@@ -0,0 +1,139 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from . import tracing
+
+# Zero-copy sharing of a prepared frame with worker processes. The columns are
+# written once as .npy files in a RAM-backed directory (/dev/shm where it
+# exists) and every worker memory-maps them read-only, so all processes share
+# the same page-cache pages: the frame is never pickled, and a worker's own
+# memory and startup cost do not grow with the data or the number of workers.
+# Only a small spec (paths, dtypes, categories) is sent to the workers.
+#
+# String columns (e.g. state_name) are stored as categorical codes; nullable
+# numeric columns as float64 with NaN.
+
+SHM_DIR = '/dev/shm'
+
+# Columns attached in this process, set by the pool initializer
+_attached = None
+
+
+class SharedFrame:
+    """
+    The columns of a DataFrame published as memory-mapped files. Use as a
+    context manager, or call `close()`, to remove the files; workers attach
+    through `spec`.
+    """
+
+    def __init__(self, df, columns=None, directory=None):
+        if directory is None and os.path.isdir(SHM_DIR) and os.access(SHM_DIR, os.W_OK):
+            directory = SHM_DIR
+        self.directory = tempfile.mkdtemp(prefix='state_tobacco_shared_', dir=directory)
+        self.spec = {'directory': self.directory, 'rows': len(df), 'columns': {}}
+        columns = list(df.columns if columns is None else columns)
+
+        with tracing.span('shared.publish', rows_in=len(df), columns=len(columns)):
+            for i, column in enumerate(columns):
+                values, categories = _to_numpy(df[column])
+                path = os.path.join(self.directory, f'col_{i:04d}.npy')
+                np.save(path, values)
+                self.spec['columns'][column] = {'path': path, 'categories': categories}
+        self.nbytes = sum(os.path.getsize(c['path']) for c in self.spec['columns'].values())
+
+    def close(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def pool(self, workers=None):
+        """
+        A process pool whose workers attach to the columns once, at startup.
+        Workers are started from a fork server (spawned where there is none),
+        not forked from this process, so they do not inherit its heap.
+        """
+        workers = workers or os.cpu_count() or 1
+        method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context(method),
+                                   initializer=_initialize, initargs=(self.spec,))
+
+
+def _to_numpy(series):
+    """Column values as a plain NumPy array, plus the categories of a coded string column."""
+    dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        return series.cat.codes.to_numpy(), list(dtype.categories)
+    if pd.api.types.is_bool_dtype(dtype) and not series.hasnans:
+        return series.to_numpy(dtype=bool), None
+    if pd.api.types.is_numeric_dtype(dtype):
+        if isinstance(dtype, np.dtype):
+            return series.to_numpy(), None
+        return series.to_numpy(dtype=float, na_value=np.nan), None
+    if pd.api.types.is_datetime64_dtype(dtype):
+        return series.to_numpy(), None
+    codes, categories = pd.factorize(series, sort=True)
+    return codes, list(categories)
+
+
+def attach(spec):
+    """
+    Map the published columns read-only. Returns a dict of column name to
+    NumPy array (codes for string columns) without copying any data.
+    """
+    # Plain ndarray views of the maps, so pandas does not carry the memmap subclass around
+    return {column: np.load(info['path'], mmap_mode='r').view(np.ndarray)
+            for column, info in spec['columns'].items()}
+
+
+def attach_frame(spec, columns=None):
+    """
+    The published columns as a DataFrame backed by the read-only maps.
+    String columns become categoricals over the shared codes.
+    """
+    arrays = attach(spec)
+    data = {}
+    for column in (columns or list(arrays)):
+        categories = spec['columns'][column]['categories']
+        values = arrays[column]
+        if categories is not None:
+            values = pd.Categorical.from_codes(values, categories=categories)
+        data[column] = values
+    return pd.DataFrame(data, copy=False)
+
+
+def _initialize(spec):
+    global _attached
+    _attached = attach(spec)
+
+
+def columns():
+    """The columns attached in this worker (inside a `SharedFrame.pool`)."""
+    if _attached is None:
+        raise RuntimeError("No shared frame attached in this process; run inside SharedFrame.pool()")
+    return _attached
+
+
+def worker_memory_mb():
+    """
+    (unique, proportional) set size of this process in MB from
+    /proc/self/smaps_rollup: memory it owns vs. its share of mapped pages.
+    (None, None) where that file does not exist (other than Linux).
+    """
+    if not os.path.exists('/proc/self/smaps_rollup'):
+        return None, None
+    sizes = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            key, _, rest = line.partition(':')
+            if key in ('Private_Clean', 'Private_Dirty', 'Pss'):
+                sizes[key] = int(rest.split()[0]) / 1024
+    return sizes['Private_Clean'] + sizes['Private_Dirty'], sizes['Pss']
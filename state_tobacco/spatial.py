@@ -0,0 +1,250 @@
+import os
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from . import preview, tracing
+
+# Spatial autocorrelation of the state-level outcomes. A binary state
+# contiguity matrix is built once from the shapefile and cached next to it;
+# global Moran's I and local Moran's I (LISA) are then computed for every
+# variable and year with one sparse product over a states x (variable, year)
+# matrix. A state-year missing from the data (the state-level file only keeps
+# treatment groups 2 and 4) simply drops out: the spatial lag is the mean of
+# the neighbors that are present, i.e. row standardization within each year.
+#
+# Significance comes from permutations: the global statistic permutes the
+# values over states, the local one draws each state's neighbors at random
+# from the other states (conditional randomization), both as array operations.
+
+DEFAULT_SHAPEFILE = os.path.join("shapefiles", "cb_2018_us_state_500k.shp")
+DEFAULT_VARIABLES = ['current_smoker_prev', 'past_year_quit_attempt_prev',
+                     'any_nrt', 'any_medication', 'any_counseling']
+PERMUTATIONS = 999
+ALPHA = 0.05
+
+# LISA quadrants (PySAL numbering): sign of the value and of its spatial lag
+QUADRANTS = {1: 'High-High', 2: 'Low-High', 3: 'Low-Low', 4: 'High-Low'}
+NOT_SIGNIFICANT = 'Not significant'
+NO_NEIGHBORS = 'No neighbors'
+
+_ADJACENCY = {}
+
+
+def _cache_path(shapefile_path, contiguity):
+    return f"{os.path.splitext(shapefile_path)[0]}.{contiguity}.npz"
+
+
+def build_adjacency(shapefile_path, contiguity='queen'):
+    """
+    Binary contiguity matrix of the shapefile's states, ordered by FIPS code.
+
+    Queen contiguity links states that share any boundary point (Arizona and
+    Colorado at Four Corners); rook requires a shared edge of positive length.
+    """
+    import geopandas as gpd
+    import shapely
+
+    if contiguity not in ('queen', 'rook'):
+        raise ValueError(f"Unknown contiguity: {contiguity}")
+    states = gpd.read_file(shapefile_path)
+    states = states.assign(_state=states['STATEFP'].astype(int)).sort_values('_state')
+    geoms = states.geometry.to_numpy()
+
+    # Candidate pairs from the spatial index, then the exact test
+    left, right = shapely.STRtree(geoms).query(geoms, predicate='intersects')
+    keep = left < right
+    left, right = left[keep], right[keep]
+    if contiguity == 'rook':
+        shared = shapely.intersection(shapely.boundary(geoms[left]), shapely.boundary(geoms[right]))
+        keep = shapely.length(shared) > 0
+        left, right = left[keep], right[keep]
+
+    n = len(geoms)
+    rows, cols = np.concatenate([left, right]), np.concatenate([right, left])
+    matrix = sparse.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(n, n))
+    return states['_state'].to_numpy(), matrix
+
+
+def load_adjacency(shapefile_path=DEFAULT_SHAPEFILE, contiguity='queen'):
+    """
+    Return (FIPS codes, CSR adjacency), building it only if neither the
+    in-process cache nor the .npz next to the shapefile is current.
+    """
+    mtime = os.path.getmtime(shapefile_path)
+    key = (os.path.abspath(shapefile_path), contiguity)
+    if key in _ADJACENCY and _ADJACENCY[key][0] == mtime:
+        return _ADJACENCY[key][1]
+
+    cache_path = _cache_path(shapefile_path, contiguity)
+    adjacency = None
+    if os.path.exists(cache_path):
+        cached = np.load(cache_path)
+        if cached['source_mtime'] == mtime:
+            n = len(cached['fips'])
+            matrix = sparse.csr_matrix((np.ones(len(cached['indices'])), cached['indices'], cached['indptr']),
+                                       shape=(n, n))
+            adjacency = cached['fips'], matrix
+
+    if adjacency is None:
+        with tracing.span('spatial.adjacency', contiguity=contiguity) as s:
+            adjacency = build_adjacency(shapefile_path, contiguity)
+            s.rows_out = adjacency[1].nnz
+        try:
+            np.savez(cache_path, fips=adjacency[0], indptr=adjacency[1].indptr,
+                     indices=adjacency[1].indices, source_mtime=mtime)
+        except OSError:
+            print(f"Could not write adjacency cache {cache_path}")
+
+    _ADJACENCY[key] = (mtime, adjacency)
+    return adjacency
+
+
+def _pseudo_p(simulated, observed):
+    """Folded pseudo p-value: the smaller tail of the permutation distribution."""
+    permutations = simulated.shape[-1]
+    larger = (simulated >= observed[..., None]).sum(axis=-1)
+    larger = np.minimum(larger, permutations - larger)
+    return (larger + 1) / (permutations + 1)
+
+
+def _permutation_test(z, matrix, permutations, rng):
+    """
+    Permutation p-values for one series: `z` holds the centered values of the
+    states present, `matrix` their binary adjacency.
+    """
+    m = len(z)
+    neighbors = np.asarray(matrix.sum(axis=1)).ravel()
+    linked = neighbors > 0
+    sum_sq = (z ** 2).sum()
+    m2 = sum_sq / (m - 1)
+
+    # Global: permute values over states; one sparse product for all permutations
+    perms = rng.permuted(np.tile(np.arange(m), (permutations, 1)), axis=1)
+    zp = z[perms].T
+    lag = (matrix @ zp)[linked] / neighbors[linked, None]
+    global_sim = m / linked.sum() * (zp[linked] * lag).sum(axis=0) / sum_sq
+
+    # Local: draw each state's neighbors from the other m-1 states. The draws
+    # are shared across states (shifted past the state itself) and cumulative
+    # sums give the lag for every neighbor count at once.
+    local_sim = np.full((m, permutations), np.nan)
+    k = neighbors.astype(int)
+    if linked.any() and m > 1:
+        kmax = min(k.max(), m - 1)
+        draws = np.argsort(rng.random((permutations, m - 1)), axis=1)[:, :kmax]
+        ids = draws[None, :, :] + (draws[None, :, :] >= np.arange(m)[:, None, None])
+        sums = np.cumsum(z[ids], axis=2)
+        states = np.flatnonzero(linked)
+        kk = np.minimum(k[states], kmax)
+        lag_sim = sums[states, :, kk - 1] / kk[:, None]
+        local_sim[states] = z[states, None] * lag_sim / m2
+    return global_sim, local_sim
+
+
+def morans_i(df, adjacency, variables=DEFAULT_VARIABLES, permutations=PERMUTATIONS, seed=0, alpha=ALPHA):
+    """
+    Global and local Moran's I for each variable and year of the state-level data.
+
+    Returns (global results, one row per variable-year; LISA results, one row
+    per variable-year-state). Constant series have undefined statistics (NaN).
+    """
+    fips, matrix = adjacency
+    variables = [var for var in variables if var in df.columns]
+    unmatched = sorted(set(df['_state']) - set(fips))
+    if unmatched:
+        print(f"States not in the shapefile, left out of the spatial analysis: {unmatched}")
+
+    # states x (variable, year) matrix of values, NaN where a state-year is missing
+    wide = df.pivot_table(index='_state', columns='year', values=variables, aggfunc='first')
+    wide = wide.reindex(index=fips, columns=pd.MultiIndex.from_product([variables, sorted(df['year'].unique())]))
+    values = wide.to_numpy(dtype=float)
+    present = ~np.isnan(values)
+
+    # Observed statistics for every series in one batched sparse product
+    with tracing.span('spatial.morans_i', rows_in=values.size):
+        n = present.sum(axis=0)
+        means = np.nansum(values, axis=0) / np.maximum(n, 1)
+        z = np.where(present, values - means, 0.0)
+        neighbors = matrix @ present.astype(float)
+        lag_sum = matrix @ z
+        linked = present & (neighbors > 0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            lag = np.where(linked, lag_sum / neighbors, np.nan)
+            sum_sq = (z ** 2).sum(axis=0)
+            m2 = sum_sq / (n - 1)
+            local_i = z * lag / m2
+            global_i = n / linked.sum(axis=0) * np.nansum(np.where(linked, z * lag, 0), axis=0) / sum_sq
+        global_i[sum_sq == 0] = np.nan
+
+    rng = np.random.default_rng(seed)
+    global_p = np.full(values.shape[1], np.nan)
+    global_z = np.full(values.shape[1], np.nan)
+    local_p = np.full(values.shape, np.nan)
+    with tracing.span('spatial.permutations', rows_in=values.shape[1], permutations=permutations):
+        for col in range(values.shape[1]):
+            idx = np.flatnonzero(present[:, col])
+            if len(idx) < 3 or sum_sq[col] == 0 or not linked[:, col].any():
+                continue
+            global_sim, local_sim = _permutation_test(z[idx, col], matrix[idx][:, idx], permutations, rng)
+            global_p[col] = _pseudo_p(global_sim, global_i[col:col + 1])[0]
+            global_z[col] = (global_i[col] - global_sim.mean()) / global_sim.std()
+            local_p[idx, col] = _pseudo_p(local_sim, local_i[idx, col])
+            local_p[idx[~linked[idx, col]], col] = np.nan
+
+    series = wide.columns
+    global_df = pd.DataFrame({
+        'variable': series.get_level_values(0),
+        'year': series.get_level_values(1).astype(int),
+        'n_states': n,
+        'morans_i': global_i,
+        'expected_i': -1 / (n - 1.0),
+        'z_sim': global_z,
+        'p_sim': global_p
+    })
+
+    quadrant = np.select([(z > 0) & (lag > 0), (z <= 0) & (lag > 0), (z <= 0) & (lag <= 0), (z > 0) & (lag <= 0)],
+                         [1, 2, 3, 4], 0)
+    cluster = np.where(local_p < alpha, pd.Series(quadrant.ravel()).map(QUADRANTS).to_numpy().reshape(quadrant.shape),
+                       NOT_SIGNIFICANT)
+    cluster = np.where(present & ~linked, NO_NEIGHBORS, cluster)
+    rows, cols = np.nonzero(present)
+    local_df = pd.DataFrame({
+        'variable': series.get_level_values(0)[cols],
+        'year': series.get_level_values(1)[cols].astype(int),
+        '_state': fips[rows],
+        'value': values[rows, cols],
+        'spatial_lag': lag[rows, cols] + means[cols],
+        'local_i': local_i[rows, cols],
+        'p_sim': local_p[rows, cols],
+        'quadrant': quadrant[rows, cols],
+        'cluster': cluster[rows, cols]
+    }).sort_values(['variable', 'year', '_state'], ignore_index=True)
+    return global_df, local_df
+
+
+def main(input_path="state_level_descriptive_data.csv", shapefile_path=DEFAULT_SHAPEFILE, output_dir=".",
+         contiguity='queen', permutations=PERMUTATIONS, seed=0):
+    """Write global Moran's I and LISA tables for the state-level outcomes and coverage."""
+    if not os.path.exists(shapefile_path):
+        print(f"Shapefile not found at: {shapefile_path}")
+        return 1
+    with tracing.span('ingest.state_csv') as s:
+        df = pd.read_csv(input_path)
+        s.rows_out = len(df)
+
+    fips, matrix = load_adjacency(shapefile_path, contiguity)
+    print(f"{contiguity.capitalize()} contiguity: {len(fips)} states, {matrix.nnz // 2} neighbor pairs")
+    global_df, local_df = morans_i(df, (fips, matrix), permutations=permutations, seed=seed)
+
+    os.makedirs(output_dir, exist_ok=True)
+    global_path = preview.output_path(os.path.join(output_dir, "spatial_morans_i.csv"))
+    lisa_path = preview.output_path(os.path.join(output_dir, "spatial_lisa.csv"))
+    global_df.to_csv(global_path, index=False)
+    local_df.to_csv(lisa_path, index=False)
+
+    print("\nGlobal Moran's I (p from permutations):")
+    print(global_df.pivot(index='year', columns='variable', values='morans_i').round(3).to_string())
+    significant = local_df[local_df['cluster'].isin(QUADRANTS.values())]
+    print(f"\nSignificant LISA clusters (p < {ALPHA}): {len(significant)} state-years")
+    print(significant.groupby(['variable', 'cluster']).size().to_string())
+    print(f"\nTables saved to {global_path} and {lisa_path}")
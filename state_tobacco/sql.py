@@ -0,0 +1,429 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+from . import export, statekeys, tracing
+from .ingest import KEEP_VARS, FPL_BASE, FPL_ADDITIONAL, INCOME_UPPER, YEARS
+from .prepare import variables_to_keep, treatment_vars
+
+# Alternative execution backend: the ingest joins, eligibility filters, recodes
+# and state-year collapse expressed as DuckDB views over Parquet extracts of the
+# raw .dta files. DuckDB runs the queries multi-threaded and spills to disk
+# when a `memory_limit` is set, and analysts can query the same views directly:
+#
+#     con = sql.connect("extracts")
+#     con.sql("SELECT year, avg(current_smoker) FROM individual GROUP BY year").df()
+#
+# Views: brfss, fips, medicaid_expansion, cessation, sia_bar, sia_worksites,
+# sia_restaurants, cig_tax, merged, eligible, individual, state_level.
+#
+# The survey extracts are sorted by _state with one Parquet row group per
+# state, indexed in state_index.json, so `load_states` reads only the requested
+# states and DuckDB skips the other row groups when a query filters on _state.
+
+# View name -> file stem of each state-level policy table
+POLICY_TABLES = {
+    'fips': 'fips_gnis_mapping',
+    'medicaid_expansion': 'medicaid_expansion',
+    'cessation': 'Cessation_Treatments_Coverage',
+    'sia_bar': 'Smokefree Indoor Air Bar',
+    'sia_worksites': 'Smokefree Indoor Private Worksites',
+    'sia_restaurants': 'Smokefree Indoor Air Restaurants',
+    'cig_tax': 'CigTax_PerPack'
+}
+
+# Per-state row ranges of the state-sorted brfss_{year}.parquet extracts
+STATE_INDEX = 'state_index.json'
+
+# Weighted shares in the same order as `prepare.aggregate_state_level`
+DEMOGRAPHIC_SHARES = [
+    ('male_pct', 'male'), ('white_pct', 'white'), ('black_pct', 'black'),
+    ('hispanic_pct', 'hispanic'), ('low_educ_pct', 'low_education'),
+    ('unemployed_pct', 'unemployed'), ('poverty_pct', 'low_income'),
+    ('medicaid_elig_pct', 'medicaidelig'), ('age_18_24_pct', 'age_18_24'),
+    ('age_25_34_pct', 'age_25_34'), ('age_35_44_pct', 'age_35_44'),
+    ('age_45_54_pct', 'age_45_54'), ('age_55_64_pct', 'age_55_64')
+]
+
+
+def _flag(condition):
+    """0/1 integer for a condition, with NULL comparisons counted as 0 like pandas."""
+    return f"COALESCE(({condition}), FALSE)::INTEGER"
+
+
+def _case_map(column, mapping):
+    """CASE expression mapping the values of `column` through a dict (unmapped -> NULL)."""
+    whens = ' '.join(f"WHEN {key} THEN {value}" for key, value in mapping.items())
+    return f"CASE {column} {whens} END"
+
+
+def _quote(path):
+    return "'" + path.replace("'", "''") + "'"
+
+
+def write_extracts(data_dir, parquet_dir, years=YEARS, chunksize=500_000, profile=None):
+    """
+    Convert the raw .dta inputs to Parquet extracts.
+
+    Each survey year is read in `chunksize` row blocks into
+    brfss_{year}.parquet with only the variables used by the pipeline,
+    sorted by `_state` with one row group per state; the row ranges are
+    recorded in state_index.json (see `load_states`). The policy tables are
+    copied whole. Raw chunks are added to `profile` (an `IngestProfile`) if
+    one is given.
+    """
+    import pyarrow as pa
+
+    os.makedirs(parquet_dir, exist_ok=True)
+    index = {}
+    for year in years:
+        print(f"Extracting BRFSS data for {year}...")
+        path = os.path.join(parquet_dir, f"brfss_{year}.parquet")
+        with tracing.span('extract.brfss', year=year) as s:
+            chunks = []
+            with pd.read_stata(os.path.join(data_dir, f"data{year}.dta"), chunksize=chunksize) as reader:
+                for chunk in reader:
+                    if 'year' not in chunk.columns:
+                        chunk['year'] = year
+                    if profile is not None:
+                        profile.update(year, chunk)
+                    chunks.append(chunk[[var for var in KEEP_VARS if var in chunk.columns]])
+            df = pd.concat(chunks, ignore_index=True)
+            s.rows_out = len(df)
+
+        with tracing.span('extract.sort_states', rows_in=len(df), year=year):
+            # Stable, so rows keep their file order within a state; missing _state last
+            df = df.sort_values('_state', kind='stable', na_position='last', ignore_index=True)
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            index[year] = _write_state_row_groups(table, df['_state'].to_numpy(dtype=float), path)
+
+    _write_state_index(parquet_dir, index)
+
+    for stem in POLICY_TABLES.values():
+        table = pd.read_stata(os.path.join(data_dir, f"{stem}.dta"))
+        table.to_parquet(os.path.join(parquet_dir, f"{stem}.parquet"), index=False)
+    print(f"Parquet extracts written to {parquet_dir}")
+
+
+def _write_state_row_groups(table, states, path):
+    """
+    Write `table` (sorted by state) with one row group per state; returns
+    {state: [row group, first row, end row]} for the rows with a state.
+    """
+    import pyarrow.parquet as pq
+
+    starts = np.flatnonzero(np.concatenate([[True], states[1:] != states[:-1]]))
+    bounds = np.append(starts, len(states))
+    entries = {}
+    with pq.ParquetWriter(path, table.schema) as writer:
+        for group, (start, stop) in enumerate(zip(bounds[:-1], bounds[1:])):
+            # Row groups larger than the default size would be split and shift the numbering
+            writer.write_table(table.slice(start, stop - start), row_group_size=stop - start)
+            if not np.isnan(states[start]):
+                entries[int(states[start])] = [group, int(start), int(stop)]
+    return entries
+
+
+def _write_state_index(parquet_dir, index):
+    path = os.path.join(parquet_dir, STATE_INDEX)
+    with open(path, 'w') as f:
+        json.dump({str(year): {str(state): entry for state, entry in entries.items()}
+                   for year, entries in index.items()}, f)
+
+
+def read_state_index(parquet_dir):
+    """
+    The per-state row index of the extracts: {year: {_state: (row group,
+    first row, end row)}}.
+    """
+    path = os.path.join(parquet_dir, STATE_INDEX)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No state index at {path}; rerun `extract` to write state-sorted extracts")
+    with open(path) as f:
+        index = json.load(f)
+    return {int(year): {int(state): tuple(entry) for state, entry in entries.items()}
+            for year, entries in index.items()}
+
+
+def load_states(parquet_dir, states, years=YEARS, columns=None, profile=None):
+    """
+    Survey rows of the given `_state` codes from the extracts, stacked over
+    `years`, like `ingest.load_brfss_years` but reading only those states'
+    row groups. Each year's rows are added to `profile` (an `IngestProfile`)
+    before stacking, so variables absent from a year's extract are reported.
+    Raises ValueError for a state with no rows in any of `years`.
+    """
+    import pyarrow.parquet as pq
+
+    index = read_state_index(parquet_dir)
+    states = sorted({int(state) for state in states})
+    unknown = [state for state in states if not any(state in index.get(year, {}) for year in years)]
+    if unknown:
+        raise ValueError(f"No rows for _state {unknown} in the extracts in {parquet_dir}")
+    dfs = []
+    for year in years:
+        entries = index.get(year, {})
+        groups = [entries[state][0] for state in states if state in entries]
+        with tracing.span('extract.read_states', year=year, states=len(states)) as s:
+            parquet = pq.ParquetFile(os.path.join(parquet_dir, f"brfss_{year}.parquet"))
+            df = parquet.read_row_groups(groups, columns=columns).to_pandas()
+            s.rows_out = len(df)
+        if profile is not None:
+            with tracing.span('ingest.profile', rows_in=len(df)):
+                profile.update(year, df)
+        dfs.append(df)
+    with tracing.span('extract.concat', rows_in=sum(len(df) for df in dfs)) as s:
+        combined_data = pd.concat(dfs, ignore_index=True)
+        s.rows_out = len(combined_data)
+    print(f"Loaded {len(combined_data):,} rows for {len(states)} state(s) from {parquet_dir}")
+    return combined_data
+
+
+def connect(parquet_dir, database=':memory:', threads=None, memory_limit=None, temp_directory=None):
+    """
+    Open a DuckDB connection with the pipeline views defined over `parquet_dir`.
+
+    `threads`, `memory_limit` (e.g. '4GB') and `temp_directory` are passed to
+    DuckDB; with a memory limit, large joins and aggregations spill to disk.
+    """
+    import duckdb
+
+    config = {}
+    if threads:
+        config['threads'] = threads
+    if memory_limit:
+        config['memory_limit'] = memory_limit
+    if temp_directory:
+        config['temp_directory'] = temp_directory
+    con = duckdb.connect(database, config=config)
+
+    brfss_glob = os.path.join(parquet_dir, 'brfss_*.parquet')
+    con.execute(f"CREATE OR REPLACE VIEW brfss AS "
+                f"SELECT * FROM read_parquet({_quote(brfss_glob)}, union_by_name = true)")
+    for view, stem in POLICY_TABLES.items():
+        path = os.path.join(parquet_dir, f"{stem}.parquet")
+        con.execute(f"CREATE OR REPLACE VIEW {view} AS SELECT * FROM read_parquet({_quote(path)})")
+
+    for view, query in build_views().items():
+        con.execute(f"CREATE OR REPLACE VIEW {view} AS {query}")
+    return con
+
+
+def build_views():
+    """SQL for the derived views, in dependency order."""
+    views = {}
+
+    # Same joins and filter order as ingest.merge_policy_data, with the same
+    # dense state-year key (statekeys.encode; -1 outside the panel)
+    state_index = {int(fips): i for i, fips in enumerate(statekeys.STATE_FIPS)}
+    state_year = f"""COALESCE(CASE
+            WHEN year BETWEEN {statekeys.FIRST_YEAR} AND {statekeys.FIRST_YEAR + statekeys.N_YEARS - 1}
+            THEN {_case_map('_state', state_index)} * {statekeys.N_YEARS} + (year - {statekeys.FIRST_YEAR})
+        END, -1)::INTEGER"""
+    views['merged'] = f"""
+        SELECT * FROM (
+            SELECT *
+            FROM (SELECT *, {state_year} AS state_year FROM brfss JOIN fips USING (_state))
+            LEFT JOIN medicaid_expansion USING (_state)
+            LEFT JOIN cessation USING (state_name, year)
+        )
+        JOIN sia_bar USING (state_name, year)
+        JOIN sia_worksites USING (state_name, year)
+        JOIN sia_restaurants USING (state_name, year)
+        JOIN cig_tax USING (state_name, year)
+        WHERE _state <= 56
+    """
+
+    # ingest.derive_eligibility and ingest.apply_sample_filters
+    totaladult = """CASE
+            WHEN year BETWEEN 2011 AND 2013 THEN numadult
+            WHEN year BETWEEN 2014 AND 2020 THEN COALESCE(numadult, hhadult)
+        END"""
+    views['eligible'] = f"""
+        WITH adults AS (
+            SELECT *, {totaladult} AS totaladult FROM merged
+        ), fpl AS (
+            SELECT *,
+                {_case_map('year', FPL_BASE)} AS fpl_base,
+                {_case_map('year', FPL_ADDITIONAL)} AS fpl_additional,
+                {_case_map('income2', INCOME_UPPER)} AS income_upper
+            FROM adults
+        ), pct AS (
+            SELECT *,
+                fpl_base + fpl_additional * (totaladult - 1) AS fpl_threshold,
+                round_even(income_upper / (fpl_base + fpl_additional * (totaladult - 1)) * 100, 0) AS fpl_percent
+            FROM fpl
+        )
+        SELECT *, {_flag('fpl_percent <= 100')} AS Medicaidelig
+        FROM pct
+        WHERE fpl_percent <= 100 AND children = 88 AND sex IN (1, 2)
+    """
+
+    # prepare.clean_individual_data, create_individual_variables and create_treatment_categories
+    renamed = {'medicaidelig': 'Medicaidelig AS medicaidelig',
+               'smokday2': 'COALESCE(smokday2, 3) AS smokday2'}
+    kept = ', '.join(renamed.get(var, var) for var in variables_to_keep)
+    age_groups = {
+        'age_18_24': '_ageg5yr = 1',
+        'age_25_34': '_ageg5yr IN (2, 3)',
+        'age_35_44': '_ageg5yr IN (4, 5)',
+        'age_45_54': '_ageg5yr IN (6, 7)',
+        'age_55_64': '_ageg5yr IN (8, 9)'
+    }
+    covered = ',\n                '.join(_flag(f"{var} IN ('Yes', 'Varies')") + f" AS {var}_covered"
+                                       for var in treatment_vars)
+    views['individual'] = f"""
+        WITH cleaned AS (
+            SELECT {kept}
+            FROM eligible
+            WHERE year <= 2020
+              AND smoke100 < 7
+              AND COALESCE(smokday2, 3) < 7
+              AND ((lastsmk2 != 77 AND lastsmk2 != 99) OR lastsmk2 IS NULL)
+        ), status AS (
+            SELECT *,
+                {_flag('smoke100 = 1 AND smokday2 IN (1, 2)')} AS current_smoker,
+                {_flag('smoke100 = 1 AND smokday2 = 3')} AS former_smoker,
+                {_flag('smoke100 = 2')} AS never_smoker
+            FROM cleaned
+        ), quits AS (
+            SELECT *,
+                {_flag('stopsmk2 = 1 AND current_smoker = 1')} AS quit_attempt,
+                {_flag('lastsmk2 <= 4 AND former_smoker = 1')} AS recent_quitter
+            FROM status
+        ), controls AS (
+            SELECT *,
+                recent_quitter AS past_year_quit_attempt,
+                {_flag('educa < 4')} AS low_education,
+                {_flag('employ > 2 AND employ < 9')} AS unemployed,
+                {_flag('fpl_percent <= 100')} AS low_income,
+                {_flag('sex = 1')} AS male,
+                {_flag('race2 = 1')} AS white,
+                {_flag('race2 = 2')} AS black,
+                {_flag('race2 = 8')} AS hispanic,
+                {', '.join(f"{_flag(cond)} AS {name}" for name, cond in age_groups.items())},
+                {covered}
+            FROM quits
+        )
+        SELECT *,
+            {_flag('nicotine_patch_covered + nicotine_gum_covered + nicotine_lozenge_covered + nicotine_nasal_spray_covered + nicotine_inhaler_covered > 0')} AS any_nrt,
+            {_flag('bupropion_covered + varenicline_covered > 0')} AS any_medication,
+            {_flag('individual_counseling_covered + group_counseling_covered > 0')} AS any_counseling
+        FROM controls
+    """
+
+    # prepare.aggregate_state_level and prepare.assign_treatment_groups
+    shares = ',\n                '.join(f"sum({col} * _llcpwt) / sum(_llcpwt) AS {name}"
+                                       for name, col in DEMOGRAPHIC_SHARES)
+    views['state_level'] = f"""
+        WITH collapsed AS (
+            SELECT _state, year, state_name, state_year,
+                sum(current_smoker * _llcpwt) AS current_smoker_count,
+                sum(_llcpwt) AS total_count,
+                sum(current_smoker * _llcpwt) / sum(_llcpwt) AS current_smoker_prev,
+                sum(past_year_quit_attempt * _llcpwt) / sum(_llcpwt) AS past_year_quit_attempt_prev,
+                sum(past_year_quit_attempt * _llcpwt) AS past_year_quit_attempt_count,
+                {shares},
+                max(any_nrt) AS any_nrt,
+                max(any_medication) AS any_medication,
+                max(any_counseling) AS any_counseling,
+                sum(_llcpwt) AS weighted_pop,
+                count(*)::DOUBLE AS sample_size
+            FROM individual
+            WHERE state_year >= 0
+            GROUP BY _state, year, state_name, state_year
+        ), grouped AS (
+            SELECT *,
+                CASE
+                    WHEN any_nrt = 1 AND any_medication = 1 AND any_counseling = 1 THEN 4
+                    WHEN any_nrt = 0 AND any_medication = 0 AND any_counseling = 1 THEN 3
+                    WHEN any_nrt = 1 AND any_medication = 1 AND any_counseling = 0 THEN 2
+                    WHEN any_nrt = 1 AND any_medication = 0 AND any_counseling = 0 THEN 1
+                    ELSE 0
+                END AS treatment_group
+            FROM collapsed
+        )
+        SELECT *,
+            (treatment_group = 2)::INTEGER AS nrt_med,
+            (treatment_group = 4)::INTEGER AS all_three
+        FROM grouped
+        WHERE treatment_group IN (2, 4)
+        ORDER BY _state, year
+    """
+    return views
+
+
+def run_prepare(parquet_dir, output_dir=".", write_individual=True, compression=None, **connect_args):
+    """
+    Produce the `prepare` outputs with DuckDB.
+
+    Writes state_level_descriptive_data.csv (and optionally the
+    individual-level CSV, written by DuckDB directly and gzip/zstd
+    compressed with `compression`) and returns the state-level frame.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    con = connect(parquet_dir, **connect_args)
+    if write_individual:
+        base_path = os.path.join(output_dir, "individual_level_with_category_indicators")
+        path = export.output_path(base_path, 'csv', compression)
+        options = "HEADER, DELIMITER ','" + (f", COMPRESSION '{compression}'" if compression else "")
+        with tracing.span('export.individual_csv'):
+            con.execute(f"COPY individual TO {_quote(path)} ({options})")
+    with tracing.span('collapse.state_year') as s:
+        state_df = con.sql("SELECT * FROM state_level").df()
+        s.rows_out = len(state_df)
+    state_df.to_csv(os.path.join(output_dir, "state_level_descriptive_data.csv"), index=False)
+    con.close()
+    return state_df
+
+
+def run_pandas(data_dir):
+    """Run the pandas pipeline in memory and return its state-level frame."""
+    from . import ingest, prepare
+
+    df = ingest.load_brfss_years(data_dir)
+    df = ingest.merge_policy_data(df, data_dir)
+    df = ingest.derive_eligibility(df)
+    df = ingest.apply_sample_filters(df)
+    df = df.rename(columns={'Medicaidelig': 'medicaidelig'})
+    df = df[df['year'] <= 2020]
+    df = prepare.clean_individual_data(df)
+    df = prepare.create_individual_variables(df)
+    df = prepare.create_treatment_categories(df)
+    return prepare.assign_treatment_groups(prepare.aggregate_state_level(df))
+
+
+def compare_state_level(sql_df, pandas_df, rtol=1e-9):
+    """
+    Raise AssertionError unless the two state-level frames match.
+
+    Columns, row keys and integer-valued columns must match exactly; weighted
+    sums and shares must agree to `rtol`, since the engines sum in different
+    orders.
+    """
+    sql_df = sql_df.reset_index(drop=True)
+    pandas_df = pandas_df.reset_index(drop=True)
+    assert list(sql_df.columns) == list(pandas_df.columns), \
+        f"column mismatch:\n  sql:    {list(sql_df.columns)}\n  pandas: {list(pandas_df.columns)}"
+    assert len(sql_df) == len(pandas_df), f"row count mismatch: {len(sql_df)} vs {len(pandas_df)}"
+    for col in pandas_df.columns:
+        left, right = sql_df[col], pandas_df[col]
+        if col == 'state_name':
+            assert (left.astype(str) == right.astype(str)).all(), f"{col} differs"
+        else:
+            np.testing.assert_allclose(left.to_numpy(dtype=float), right.to_numpy(dtype=float),
+                                       rtol=rtol, atol=0, err_msg=col)
+
+
+def verify(data_dir, parquet_dir, rtol=1e-9, **connect_args):
+    """Check that the DuckDB and pandas backends give the same state-level data."""
+    with tracing.span('verify.pandas'):
+        pandas_df = run_pandas(data_dir)
+    with tracing.span('verify.sql'):
+        con = connect(parquet_dir, **connect_args)
+        sql_df = con.sql("SELECT * FROM state_level").df()
+        con.close()
+    compare_state_level(sql_df, pandas_df, rtol)
+    print(f"DuckDB and pandas backends agree on {len(sql_df)} state-years "
+          f"({len(sql_df.columns)} columns, rtol={rtol}).")
+    return sql_df
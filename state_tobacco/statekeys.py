@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+
+# One dense integer key per state-year, shared by every stage:
+#
+#     state_year = state_index * N_YEARS + (year - FIRST_YEAR)
+#
+# where state_index is the position of the FIPS code (_state) in STATE_FIPS,
+# the 50 states and DC. Ingest assigns it after the FIPS merge and it is
+# carried in the individual- and state-level outputs, so joins become array
+# lookups (`join`) and collapses become sorts and reductions over small
+# integers (see `bitpack.key_order`), with no string keys to mismatch.
+# Rows outside the panel (territories, years outside YEARS, missing _state or
+# year) get -1 and never match.
+
+COLUMN = 'state_year'
+YEARS = range(2011, 2021)
+FIRST_YEAR = YEARS[0]
+N_YEARS = len(YEARS)
+
+# FIPS codes of the 50 states and DC
+STATE_FIPS = np.array([1, 2, 4, 5, 6, 8, 9, 10, 11, 12, 13, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24,
+                       25, 26, 27, 28, 29, 30, 31, 32, 33, 34, 35, 36, 37, 38, 39, 40, 41, 42, 44,
+                       45, 46, 47, 48, 49, 50, 51, 53, 54, 55, 56])
+N_STATES = len(STATE_FIPS)
+N_KEYS = N_STATES * N_YEARS
+
+# FIPS code -> state index, -1 for codes that are not a state
+_STATE_INDEX = np.full(STATE_FIPS.max() + 1, -1, dtype=np.int64)
+_STATE_INDEX[STATE_FIPS] = np.arange(N_STATES)
+
+
+def encode(state, year):
+    """State-year keys for arrays of FIPS codes and years (-1 outside the panel)."""
+    state = np.asarray(state, dtype=float)
+    year = np.asarray(year, dtype=float)
+    valid = ((state >= 0) & (state < len(_STATE_INDEX)) & (state == np.floor(state))
+             & (year >= FIRST_YEAR) & (year < FIRST_YEAR + N_YEARS) & (year == np.floor(year)))
+    index = _STATE_INDEX[np.where(valid, state, 0).astype(np.int64)]
+    keys = index * N_YEARS + (np.where(valid, year, FIRST_YEAR).astype(np.int64) - FIRST_YEAR)
+    return np.where(valid & (index >= 0), keys, -1).astype(np.int32)
+
+
+def decode(keys):
+    """(FIPS codes, years) of state-year keys."""
+    keys = np.asarray(keys, dtype=np.int64)
+    return STATE_FIPS[keys // N_YEARS], keys % N_YEARS + FIRST_YEAR
+
+
+def add_key(df, state='_state', year='year'):
+    """Add the `state_year` column to `df` from its FIPS code and year columns."""
+    df[COLUMN] = encode(df[state].to_numpy(dtype=float, na_value=np.nan),
+                        df[year].to_numpy(dtype=float, na_value=np.nan))
+    return df
+
+
+def keys_by_name(table, fips):
+    """
+    State-year keys of a table keyed by `state_name` and `year`, using the
+    FIPS mapping `fips` (`_state`, `state_name`) to translate the names.
+    """
+    if fips['state_name'].duplicated().any():
+        raise ValueError("FIPS mapping has duplicate state names")
+    codes = pd.Series(fips['_state'].to_numpy(dtype=float), index=fips['state_name'])
+    state = codes.reindex(table['state_name']).to_numpy()
+    return encode(state, table['year'].to_numpy(dtype=float, na_value=np.nan))
+
+
+def join(df, table, keys, how='inner', drop=()):
+    """
+    Join the rows of `table` (one per state-year key `keys`) onto `df` by its
+    `state_year` column, like `df.merge(table, how=how)` on the original key
+    columns (`drop`, which are not repeated). `how` is 'inner' or 'left'.
+    """
+    keys = np.asarray(keys, dtype=np.int64)
+    valid = keys >= 0
+    if len(np.unique(keys[valid])) < valid.sum():
+        raise ValueError("Table has more than one row for some state-years")
+    # Row of `table` for each key; the extra last slot makes key -1 map to no row
+    slot = np.full(N_KEYS + 1, -1, dtype=np.int64)
+    slot[keys[valid]] = np.flatnonzero(valid)
+    rows = slot[df[COLUMN].to_numpy(dtype=np.int64)]
+
+    right = table.drop(columns=[col for col in list(drop) + [COLUMN] if col in table.columns])
+    right = right.reset_index(drop=True)
+    if how == 'inner':
+        matched = rows >= 0
+        df, rows = df[matched], rows[matched]
+        right = right.iloc[rows]
+    elif how == 'left':
+        # Unmatched rows take a missing label, i.e. all-NA values as in a left merge
+        right = right.reindex(rows)
+    else:
+        raise ValueError(f"Unsupported join type: {how}")
+    right.index = df.index
+    return pd.concat([df, right], axis=1).reset_index(drop=True)
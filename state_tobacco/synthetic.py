@@ -0,0 +1,193 @@
+import pandas as pd
+import numpy as np
+import os
+
+# Generates synthetic BRFSS inputs with the same layout as the raw files read by
+# `ingest.py`: one data{year}.dta per survey year plus the state-level
+# policy tables merged in `merge_brfss_data`. Used for benchmarking only; the
+# values are drawn from plausible code distributions, not from real data.
+
+# FIPS codes and names for the 50 states, DC and two territories
+# (the territories exercise the `_state <= 56` filter)
+STATE_NAMES = {
+    1: 'Alabama', 2: 'Alaska', 4: 'Arizona', 5: 'Arkansas', 6: 'California',
+    8: 'Colorado', 9: 'Connecticut', 10: 'Delaware', 11: 'District of Columbia',
+    12: 'Florida', 13: 'Georgia', 15: 'Hawaii', 16: 'Idaho', 17: 'Illinois',
+    18: 'Indiana', 19: 'Iowa', 20: 'Kansas', 21: 'Kentucky', 22: 'Louisiana',
+    23: 'Maine', 24: 'Maryland', 25: 'Massachusetts', 26: 'Michigan',
+    27: 'Minnesota', 28: 'Mississippi', 29: 'Missouri', 30: 'Montana',
+    31: 'Nebraska', 32: 'Nevada', 33: 'New Hampshire', 34: 'New Jersey',
+    35: 'New Mexico', 36: 'New York', 37: 'North Carolina', 38: 'North Dakota',
+    39: 'Ohio', 40: 'Oklahoma', 41: 'Oregon', 42: 'Pennsylvania',
+    44: 'Rhode Island', 45: 'South Carolina', 46: 'South Dakota',
+    47: 'Tennessee', 48: 'Texas', 49: 'Utah', 50: 'Vermont', 51: 'Virginia',
+    53: 'Washington', 54: 'West Virginia', 55: 'Wisconsin', 56: 'Wyoming',
+    66: 'Guam', 72: 'Puerto Rico'
+}
+
+TREATMENT_VARS = [
+    'nicotine_patch', 'nicotine_gum', 'nicotine_lozenge', 'nicotine_nasal_spray',
+    'nicotine_inhaler', 'bupropion', 'varenicline', 'individual_counseling',
+    'group_counseling'
+]
+
+# Code distributions: (codes, probabilities)
+SMOKE100 = ([1, 2, 7, 9], [0.42, 0.56, 0.01, 0.01])
+SMOKDAY2 = ([1, 2, 3, 7, 9], [0.30, 0.10, 0.59, 0.005, 0.005])
+STOPSMK2 = ([1, 2, 7, 9], [0.55, 0.44, 0.005, 0.005])
+LASTSMK2 = ([1, 2, 3, 4, 5, 6, 7, 8, 77, 99],
+            [0.03, 0.03, 0.03, 0.04, 0.08, 0.12, 0.17, 0.48, 0.01, 0.01])
+INCOME2 = ([1, 2, 3, 4, 5, 6, 7, 8, 77, 99],
+           [0.06, 0.06, 0.08, 0.10, 0.11, 0.15, 0.14, 0.16, 0.05, 0.09])
+SEX = ([1, 2, 9], [0.45, 0.549, 0.001])
+EDUCA = ([1, 2, 3, 4, 5, 6, 9], [0.01, 0.03, 0.06, 0.28, 0.27, 0.345, 0.005])
+RACE2 = ([1, 2, 3, 4, 5, 6, 7, 8, 9], [0.74, 0.08, 0.01, 0.02, 0.005, 0.015, 0.01, 0.10, 0.01])
+MARITAL = ([1, 2, 3, 4, 5, 6, 9], [0.50, 0.14, 0.13, 0.02, 0.16, 0.04, 0.01])
+AGEG5YR = (list(range(1, 15)),
+           [0.06, 0.06, 0.07, 0.07, 0.07, 0.08, 0.09, 0.10, 0.10, 0.10, 0.08, 0.06, 0.05, 0.01])
+EMPLOY = ([1, 2, 3, 4, 5, 6, 7, 8, 9], [0.42, 0.09, 0.03, 0.03, 0.05, 0.04, 0.27, 0.06, 0.01])
+NUMADULT = ([1, 2, 3, 4, 5], [0.45, 0.38, 0.10, 0.05, 0.02])
+COVERAGE = (['Yes', 'No', 'Varies'], [0.55, 0.35, 0.10])
+SMOKEFREE = (['Banned', 'Designated Areas', 'No Provision'], [0.6, 0.2, 0.2])
+
+# PSU ids are year * PSU_STRIDE + row number (exact in float64)
+PSU_STRIDE = 10**9
+
+
+def draw(rng, distribution, size):
+    """Draw `size` codes from a (codes, probabilities) distribution."""
+    codes, probs = distribution
+    probs = np.asarray(probs, dtype=float)
+    return rng.choice(np.asarray(codes), size=size, p=probs / probs.sum())
+
+
+def state_weights(rng):
+    """Relative sample share of each state, skewed like BRFSS state samples."""
+    states = np.array(list(STATE_NAMES))
+    shares = rng.gamma(shape=2.0, scale=1.0, size=len(states))
+    return states, shares / shares.sum()
+
+
+def generate_year(year, n_rows, seed=0):
+    """Generate one synthetic BRFSS year with `n_rows` respondents."""
+    if n_rows >= PSU_STRIDE:
+        raise ValueError(f"At most {PSU_STRIDE - 1:,} rows per year, got {n_rows:,}")
+    rng = np.random.default_rng([seed, year])
+    states, shares = state_weights(np.random.default_rng(seed))
+
+    state = np.sort(rng.choice(states, size=n_rows, p=shares))
+    df = pd.DataFrame({'_state': state.astype(np.int16)})
+
+    smoke100 = draw(rng, SMOKE100, n_rows)
+    ever_smoked = smoke100 == 1
+    smokday2 = np.where(ever_smoked, draw(rng, SMOKDAY2, n_rows), np.nan)
+    current = ever_smoked & np.isin(smokday2, [1, 2])
+    former = ever_smoked & (smokday2 == 3)
+
+    df['smoke100'] = smoke100.astype(float)
+    df['smokday2'] = smokday2
+    df['stopsmk2'] = np.where(current, draw(rng, STOPSMK2, n_rows), np.nan)
+    df['lastsmk2'] = np.where(former, draw(rng, LASTSMK2, n_rows), np.nan)
+
+    income2 = draw(rng, INCOME2, n_rows)
+    df['income2'] = income2.astype(float)
+    incomg = np.select([income2 <= 2, income2 <= 4, income2 == 5, income2 == 6, income2 <= 8],
+                       [1, 2, 3, 4, 5], default=9)
+    df['_incomg'] = incomg.astype(float)
+
+    sex = draw(rng, SEX, n_rows)
+    age = draw(rng, AGEG5YR, n_rows)
+    df['sex'] = sex.astype(float)
+    df['educa'] = draw(rng, EDUCA, n_rows).astype(float)
+    df['race2'] = draw(rng, RACE2, n_rows).astype(float)
+    df['marital'] = draw(rng, MARITAL, n_rows).astype(float)
+    df['_ageg5yr'] = age.astype(float)
+    df['employ'] = draw(rng, EMPLOY, n_rows).astype(float)
+
+    # Design variables: strata nested in state, PSUs nested in strata
+    n_strata = 20
+    stratum = rng.integers(1, n_strata + 1, size=n_rows)
+    df['_ststr'] = (state.astype(np.int64) * 1000 + stratum).astype(float)
+    # Unique across years as long as a year has fewer than PSU_STRIDE rows
+    df['_psu'] = (year * PSU_STRIDE + np.arange(1, n_rows + 1)).astype(float)
+    df['_llcpwt'] = rng.lognormal(mean=6.0, sigma=1.0, size=n_rows)
+    df['_wt2'] = df['_llcpwt'] * rng.uniform(0.8, 1.2, size=n_rows)
+
+    children = np.where(rng.random(n_rows) < 0.65, 88, rng.integers(1, 6, size=n_rows))
+    children[rng.random(n_rows) < 0.01] = 99
+    df['children'] = children.astype(float)
+    df['pregnant'] = np.where((sex == 2) & (age <= 5),
+                              draw(rng, ([1, 2, 7, 9], [0.04, 0.94, 0.01, 0.01]), n_rows),
+                              np.nan)
+
+    # From 2014 numadult is only asked on the landline sample; cell respondents get hhadult
+    numadult = draw(rng, NUMADULT, n_rows).astype(float)
+    if year >= 2014:
+        cell = rng.random(n_rows) < 0.4
+        df['numadult'] = np.where(cell, np.nan, numadult)
+        df['hhadult'] = np.where(cell, numadult, np.nan)
+    else:
+        df['numadult'] = numadult
+
+    df['year'] = np.int16(year)
+    return df
+
+
+def generate_policy_tables(years, seed=0):
+    """Generate the state-level tables merged in `merge_brfss_data`."""
+    rng = np.random.default_rng([seed, 0])
+    fips = pd.DataFrame({'_state': np.array(list(STATE_NAMES), dtype=np.int16),
+                         'state_name': list(STATE_NAMES.values())})
+
+    expansion = fips[['_state']].copy()
+    expansion['medicaid_expansion'] = (rng.random(len(fips)) < 0.7).astype(np.int8)
+    expansion['expansion_year'] = np.where(expansion['medicaid_expansion'] == 1,
+                                           rng.choice([2014, 2015, 2016, 2019, 2020], len(fips)),
+                                           0).astype(np.int16)
+
+    panel = fips[['state_name']].merge(pd.DataFrame({'year': np.array(list(years), dtype=np.int16)}),
+                                       how='cross')
+
+    # Coverage starts from a random mix and is only ever expanded over time
+    cessation = panel.copy()
+    n_states, n_years = len(fips), len(years)
+    for var in TREATMENT_VARS:
+        start = draw(rng, COVERAGE, n_states)
+        adopt = rng.integers(0, n_years + 3, size=n_states)
+        values = np.repeat(start, n_years).reshape(n_states, n_years)
+        later = np.arange(n_years)[None, :] >= adopt[:, None]
+        values[later & (values == 'No')] = 'Yes'
+        cessation[var] = values.ravel()
+
+    tables = {'fips_gnis_mapping': fips,
+              'medicaid_expansion': expansion,
+              'Cessation_Treatments_Coverage': cessation}
+    for name, column in [('Smokefree Indoor Air Bar', 'sia_bar'),
+                         ('Smokefree Indoor Private Worksites', 'sia_worksites'),
+                         ('Smokefree Indoor Air Restaurants', 'sia_restaurants')]:
+        table = panel.copy()
+        table[column] = draw(rng, SMOKEFREE, len(panel))
+        tables[name] = table
+
+    cig_tax = panel.copy()
+    base = np.repeat(rng.uniform(0.17, 3.0, size=n_states), n_years)
+    cig_tax['cig_tax_per_pack'] = np.round(base + 0.05 * np.tile(np.arange(n_years), n_states), 2)
+    tables['CigTax_PerPack'] = cig_tax
+    return tables
+
+
+def write_synthetic_inputs(output_dir, total_rows, years=range(2011, 2021), seed=0):
+    """Write data{year}.dta files totalling `total_rows` rows plus the policy tables."""
+    years = list(years)
+    os.makedirs(output_dir, exist_ok=True)
+
+    rows_per_year = np.full(len(years), total_rows // len(years))
+    rows_per_year[:total_rows % len(years)] += 1
+    for year, n_rows in zip(years, rows_per_year):
+        print(f"Writing synthetic BRFSS data for {year} ({n_rows:,} rows)...")
+        generate_year(year, int(n_rows), seed).to_stata(
+            os.path.join(output_dir, f"data{year}.dta"), write_index=False)
+
+    for name, table in generate_policy_tables(years, seed).items():
+        table.to_stata(os.path.join(output_dir, f"{name}.dta"), write_index=False)
+    print(f"Synthetic inputs written to {output_dir}")
@@ -0,0 +1,273 @@
+import os
+import numpy as np
+import matplotlib.pyplot as plt
+import matplotlib.patches as mpatches
+from matplotlib.collections import PathCollection, PolyCollection
+from matplotlib.textpath import TextPath
+from matplotlib.transforms import Affine2D
+from matplotlib.colors import Normalize, to_rgba
+from . import preview, tracing
+from .maps import COLORS, load_data, treatment_colormaps
+
+# Tile-grid cartograms: every state (all 50 plus DC, Alaska and Hawaii included)
+# is one equal-size square or hexagon at a fixed grid position, so small states
+# are as visible as large ones and no shapefile is read. Colors use the same
+# encoding as maps.py: the treatment group picks the colormap, the value its
+# intensity. A map is two collections, the tiles and the state labels as glyph
+# outlines (far cheaper to render than 51 text objects), so a panel per year
+# for every metric takes seconds; the per-map renderer reuses a single figure
+# and only updates the colors between saves.
+
+# (FIPS code, postal code, row, column) of each tile; row 0 is the top
+TILE_LAYOUT = [
+    (2, 'AK', 0, 0), (23, 'ME', 0, 10),
+    (55, 'WI', 1, 5), (50, 'VT', 1, 9), (33, 'NH', 1, 10),
+    (53, 'WA', 2, 0), (16, 'ID', 2, 1), (30, 'MT', 2, 2), (38, 'ND', 2, 3), (27, 'MN', 2, 4),
+    (17, 'IL', 2, 5), (26, 'MI', 2, 6), (36, 'NY', 2, 8), (25, 'MA', 2, 9),
+    (41, 'OR', 3, 0), (32, 'NV', 3, 1), (56, 'WY', 3, 2), (46, 'SD', 3, 3), (19, 'IA', 3, 4),
+    (18, 'IN', 3, 5), (39, 'OH', 3, 6), (42, 'PA', 3, 7), (34, 'NJ', 3, 8), (9, 'CT', 3, 9), (44, 'RI', 3, 10),
+    (6, 'CA', 4, 0), (49, 'UT', 4, 1), (8, 'CO', 4, 2), (31, 'NE', 4, 3), (29, 'MO', 4, 4),
+    (21, 'KY', 4, 5), (54, 'WV', 4, 6), (51, 'VA', 4, 7), (24, 'MD', 4, 8), (10, 'DE', 4, 9),
+    (4, 'AZ', 5, 1), (35, 'NM', 5, 2), (20, 'KS', 5, 3), (5, 'AR', 5, 4), (47, 'TN', 5, 5),
+    (37, 'NC', 5, 6), (45, 'SC', 5, 7), (11, 'DC', 5, 8),
+    (40, 'OK', 6, 3), (22, 'LA', 6, 4), (28, 'MS', 6, 5), (1, 'AL', 6, 6), (13, 'GA', 6, 7),
+    (15, 'HI', 7, 0), (48, 'TX', 7, 3), (12, 'FL', 7, 8)
+]
+
+# Mapped metrics and their legend labels; shares are shown as percentages
+METRICS = {
+    'current_smoker_prev': 'Smoking Prevalence',
+    'past_year_quit_attempt_prev': 'Quit Success Rate',
+    'male_pct': 'Male',
+    'white_pct': 'White',
+    'black_pct': 'Black',
+    'hispanic_pct': 'Hispanic',
+    'low_educ_pct': 'Low Education',
+    'unemployed_pct': 'Unemployed',
+    'age_18_24_pct': 'Age 18-24',
+    'age_25_34_pct': 'Age 25-34',
+    'age_35_44_pct': 'Age 35-44',
+    'age_45_54_pct': 'Age 45-54',
+    'age_55_64_pct': 'Age 55-64'
+}
+SHAPES = ('square', 'hex')
+FORMATS = ('png', 'svg', 'pdf')
+# Normalized values above this get white labels
+DARK_TILE = 0.6
+# Label height in tile widths
+LABEL_SIZE = 0.3
+
+
+def tile_geometry(shape='square', gap=0.06):
+    """
+    Vertices (states x corners x 2) and centers (states x 2) of the tiles in
+    TILE_LAYOUT order. Hexagons are pointy-top with odd rows shifted half a
+    tile to the right.
+    """
+    rows = np.array([row for _, _, row, _ in TILE_LAYOUT], dtype=float)
+    cols = np.array([col for _, _, _, col in TILE_LAYOUT], dtype=float)
+    if shape == 'square':
+        centers = np.column_stack([cols, -rows])
+        half = (1 - gap) / 2
+        corners = np.array([[-half, -half], [half, -half], [half, half], [-half, half]])
+    elif shape == 'hex':
+        radius = 1 / np.sqrt(3)
+        centers = np.column_stack([cols + 0.5 * (rows % 2), -rows * 1.5 * radius])
+        angles = np.deg2rad(30 + 60 * np.arange(6))
+        corners = (1 - gap) * radius * np.column_stack([np.cos(angles), np.sin(angles)])
+    else:
+        raise ValueError(f"Unknown tile shape: {shape}")
+    return centers[:, None, :] + corners[None, :, :], centers
+
+
+def metric_frame(df, columns):
+    """Add percentage versions of the `_pct` share columns (`load_data` already scales the `_prev` ones)."""
+    df = df.copy()
+    for column in columns:
+        if column.endswith('_pct'):
+            df[column] = df[column] * 100
+    return df
+
+
+def tile_colors(df, year, column, norm):
+    """RGBA face colors of the tiles for one year: the group's colormap at the value, gray without data."""
+    nrt_med_cmap, all_three_cmap = treatment_colormaps()
+    year_data = df[df['year'] == year].drop_duplicates('_state').set_index('_state')
+    fips = [code for code, _, _, _ in TILE_LAYOUT]
+    values = year_data[column].reindex(fips).to_numpy(dtype=float)
+    groups = year_data['treatment_group'].reindex(fips).to_numpy(dtype=float)
+
+    scaled = np.ma.filled(norm(values), np.nan)
+    colors = np.tile(to_rgba(COLORS['no_data']), (len(fips), 1))
+    for group, cmap in ((2, nrt_med_cmap), (4, all_three_cmap)):
+        rows = (groups == group) & ~np.isnan(values)
+        colors[rows] = cmap(scaled[rows])
+    dark = np.isin(groups, [2, 4]) & (np.nan_to_num(scaled) > DARK_TILE)
+    return colors, dark
+
+
+def label_paths(centers, size=LABEL_SIZE):
+    """Outlines of the postal codes, in data units, centered on the tiles."""
+    paths = []
+    abbrs = [abbr for _, abbr, _, _ in TILE_LAYOUT]
+    for (x, y), abbr in zip(centers, abbrs * (len(centers) // len(abbrs))):
+        path = TextPath((0, 0), abbr, size=size)
+        extents = path.get_extents()
+        paths.append(path.transformed(Affine2D().translate(x - extents.x0 - extents.width / 2,
+                                                           y - extents.y0 - extents.height / 2)))
+    return paths
+
+
+def draw_tiles(ax, shape, offsets=((0, 0),), linewidth=0.5):
+    """
+    Draw empty tile maps with state labels on `ax`, one per (x, y) offset
+    (for small multiples); returns the tile and label collections, with the
+    tiles of each map in TILE_LAYOUT order and the maps in `offsets` order.
+    """
+    vertices, centers = tile_geometry(shape)
+    offsets = np.asarray(offsets, dtype=float)
+    vertices = (vertices[None] + offsets[:, None, None, :]).reshape(-1, *vertices.shape[1:])
+    centers = (centers[None] + offsets[:, None, :]).reshape(-1, 2)
+    tiles = PolyCollection(vertices, facecolors=COLORS['no_data'], edgecolors=COLORS['border'],
+                           linewidths=linewidth)
+    labels = PathCollection(label_paths(centers), facecolors=COLORS['border'], edgecolors='none')
+    ax.add_collection(tiles)
+    ax.add_collection(labels)
+    pad = 0.6
+    ax.set_xlim(vertices[..., 0].min() - pad, vertices[..., 0].max() + pad)
+    ax.set_ylim(vertices[..., 1].min() - pad, vertices[..., 1].max() + pad)
+    ax.set_aspect('equal')
+    ax.set_axis_off()
+    return tiles, labels
+
+
+def update_tiles(tiles, labels, colors, dark):
+    tiles.set_facecolors(colors)
+    labels.set_facecolors(np.where(dark[:, None], to_rgba('white'), to_rgba(COLORS['border'])))
+
+
+def legend_handles(column_label):
+    """The treatment-group patches of the choropleth legend, plus the no-data tile."""
+    return [
+        mpatches.Patch(facecolor=COLORS['nrt_med_low'], label=f'NRT + Medication (Low {column_label})'),
+        mpatches.Patch(facecolor=COLORS['nrt_med_high'], label=f'NRT + Medication (High {column_label})'),
+        mpatches.Patch(facecolor=COLORS['all_three_low'], label=f'NRT + Med + Counseling (Low {column_label})'),
+        mpatches.Patch(facecolor=COLORS['all_three_high'], label=f'NRT + Med + Counseling (High {column_label})'),
+        mpatches.Patch(facecolor=COLORS['no_data'], edgecolor=COLORS['border'], label='No data / other coverage')
+    ]
+
+
+def _save(fig, path, dpi):
+    preview.mark_figure(fig)
+    # Flat tile colors compress well even at the fastest zlib level
+    kwargs = {'pil_kwargs': {'compress_level': 1}} if path.endswith('.png') else {}
+    with tracing.span('render.savefig', output=os.path.basename(path)):
+        fig.savefig(path, dpi=dpi, **kwargs)
+
+
+@tracing.traced('render.tile_small_multiples')
+def create_small_multiples(df, columns, output_dir, shape='square', ncols=5, fmt='png', dpi=150):
+    """
+    For each column, one figure with a tile map per year on a shared color
+    scale. All panels are drawn in a single axes as offset copies of the
+    grid, and the figure is reused across columns.
+    """
+    years = sorted(df['year'].dropna().unique().astype(int))
+    vertices, _ = tile_geometry(shape)
+    width = vertices[..., 0].max() - vertices[..., 0].min() + 1
+    height = vertices[..., 1].max() - vertices[..., 1].min() + 1.2
+    offsets = [((i % ncols) * width, -(i // ncols) * height) for i in range(len(years))]
+    nrows = -(-len(years) // ncols)
+
+    fig, ax = plt.subplots(1, 1, figsize=(3.2 * ncols, 2.6 * nrows + 0.9))
+    tiles, labels = draw_tiles(ax, shape, offsets, linewidth=0.3)
+    top = vertices[..., 1].max()
+    for (x, y), year in zip(offsets, years):
+        ax.text(x + (vertices[..., 0].min() + vertices[..., 0].max()) / 2, y + top + 0.35, str(year),
+                ha='center', va='bottom', fontsize=11)
+    ax.set_ylim(top=top + 1.2)
+    title = fig.suptitle('', fontsize=15)
+    note = fig.text(0.99, 0.01, '', ha='right', fontsize=8, style='italic')
+    fig.subplots_adjust(left=0.01, right=0.99, top=1 - 0.6 / fig.get_figheight(),
+                        bottom=0.75 / fig.get_figheight())
+
+    paths = []
+    for column in columns:
+        column_label = METRICS.get(column, column)
+        norm = Normalize(vmin=df[column].min(), vmax=df[column].max())
+        panels = [tile_colors(df, year, column, norm) for year in years]
+        update_tiles(tiles, labels, np.concatenate([colors for colors, _ in panels]),
+                     np.concatenate([dark for _, dark in panels]))
+        title.set_text(f'{column_label} by State, {years[0]}-{years[-1]}')
+        note.set_text(f'Value range: {norm.vmin:.1f}% to {norm.vmax:.1f}%')
+        legend = fig.legend(handles=legend_handles(column_label), loc='lower center', ncol=3, fontsize=8,
+                            frameon=False)
+        path = os.path.join(output_dir, f'tile_{column}_small_multiples.{fmt}')
+        _save(fig, path, dpi)
+        paths.append(path)
+        legend.remove()
+    plt.close(fig)
+    return paths
+
+
+@tracing.traced('render.tile_maps')
+def create_tile_maps(df, columns, output_dir, shape='square', fmt='png', dpi=150):
+    """
+    One tile map per year and column, drawn on a single reused figure: only
+    the tile colors, label colors, title and legend change between files.
+    """
+    years = sorted(df['year'].dropna().unique().astype(int))
+    fig, ax = plt.subplots(1, 1, figsize=(10, 8))
+    tiles, labels = draw_tiles(ax, shape)
+    title = ax.set_title('', fontsize=16)
+    note = fig.text(0.5, 0.01, '', ha='center', fontsize=9, style='italic')
+    fig.subplots_adjust(left=0.02, right=0.98, top=0.93, bottom=0.17)
+
+    paths = []
+    for column in columns:
+        column_label = METRICS.get(column, column)
+        norm = Normalize(vmin=df[column].min(), vmax=df[column].max())
+        legend = fig.legend(handles=legend_handles(column_label), loc='lower center', bbox_to_anchor=(0.5, 0.055),
+                            ncol=2, fontsize=9, frameon=False)
+        note.set_text(f'Data: State-level Medicaid tobacco cessation coverage analysis\n'
+                      f'Value range: {norm.vmin:.1f}% to {norm.vmax:.1f}%')
+        for year in years:
+            update_tiles(tiles, labels, *tile_colors(df, year, column, norm))
+            title.set_text(f'{column_label} by State ({year})')
+            path = os.path.join(output_dir, f'tile_{column}_{year}.{fmt}')
+            _save(fig, path, dpi)
+            paths.append(path)
+        legend.remove()
+    plt.close(fig)
+    return paths
+
+
+def main(input_path="state_level_descriptive_data.csv", output_dir="Visualizations", columns=None,
+         shape='square', fmt='png', each=False, dpi=150):
+    """
+    Write a small-multiples tile map (one panel per year) for each metric,
+    and with `each` also one tile map per year and metric.
+    """
+    if shape not in SHAPES:
+        raise ValueError(f"Unknown tile shape: {shape}")
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown figure format: {fmt}")
+    os.makedirs(output_dir, exist_ok=True)
+
+    print("Loading tobacco data...")
+    with tracing.span('ingest.state_csv') as s:
+        df = load_data(input_path)
+        s.rows_out = 0 if df is None else len(df)
+    if df is None:
+        print("Failed to load data. Exiting.")
+        return 1
+
+    columns = [column for column in (columns or METRICS) if column in df.columns]
+    df = metric_frame(df, columns)
+    print(f"Drawing {shape} tile maps of {len(columns)} metrics over {df['year'].nunique()} years...")
+
+    written = create_small_multiples(df, columns, output_dir, shape=shape, fmt=fmt, dpi=dpi)
+    if each:
+        written.extend(create_tile_maps(df, columns, output_dir, shape=shape, fmt=fmt, dpi=dpi))
+
+    print(f"{len(written)} tile maps saved to {output_dir}")
@@ -0,0 +1,233 @@
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    # POSIX only; spans then omit peak_rss_delta_kb
+    resource = None
+
+# Nested timing/memory spans for the pipeline scripts, written as a Chrome
+# trace (chrome://tracing, Perfetto, speedscope).
+#
+#     with tracing.span('merge.fips', rows_in=len(df)) as s:
+#         df = df.merge(...)
+#         s.rows_out = len(df)
+#
+# Tracing is off by default and `span` then returns a shared no-op object.
+# Enable it with `tracing.enable()` or by setting STATE_TOBACCO_TRACE to the
+# output path (the trace is written when the process exits, unless it has
+# already been written explicitly, e.g. by --trace). Set
+# STATE_TOBACCO_TRACE_MEMORY=1 to also record tracemalloc peaks, which slows
+# allocation-heavy code noticeably.
+#
+# Each span becomes one complete ('X') event: name, category (the name up to
+# the first '.'), start and duration in microseconds, process and thread ids,
+# and args with cpu_ms, peak_rss_delta_kb (growth of the process high-water
+# RSS, where the `resource` module exists), traced_peak_delta_kb (memory
+# tracing only), rows_in/rows_out when set, the span's keyword arguments and
+# the exception name if the block raised.
+
+_enabled = False
+_trace_memory = False
+# Whether `enable` started tracemalloc (and `disable` should stop it)
+_started_tracemalloc = False
+# STATE_TOBACCO_TRACE path still to be written at exit
+_exit_path = None
+_events = []
+_origin = time.perf_counter()
+_local = threading.local()
+_lock = threading.Lock()
+
+
+def _peak_rss_kb():
+    """Process high-water RSS in KB (ru_maxrss is bytes on macOS), or None without `resource`."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def _stack():
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    return _local.stack
+
+
+class _NullSpan:
+    """Stand-in returned by `span` when tracing is disabled."""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """One timed region; records an event when the `with` block exits."""
+
+    def __init__(self, name, rows_in=None, args=None):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.args = args or {}
+        self.max_traced = 0
+
+    def __enter__(self):
+        stack = _stack()
+        if _trace_memory and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            # Keep the parent's peak before resetting it for this span
+            if stack:
+                stack[-1].max_traced = max(stack[-1].max_traced, peak)
+            tracemalloc.reset_peak()
+            self.traced_start = current
+            self.max_traced = current
+        stack.append(self)
+        self.rss_start = _peak_rss_kb()
+        self.cpu_start = time.process_time()
+        self.wall_start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        wall_end = time.perf_counter()
+        cpu_end = time.process_time()
+        stack = _stack()
+        stack.pop()
+
+        args = dict(self.args)
+        args['cpu_ms'] = round((cpu_end - self.cpu_start) * 1e3, 3)
+        if self.rss_start is not None:
+            args['peak_rss_delta_kb'] = _peak_rss_kb() - self.rss_start
+        if _trace_memory and tracemalloc.is_tracing():
+            peak = max(self.max_traced, tracemalloc.get_traced_memory()[1])
+            args['traced_peak_delta_kb'] = (peak - self.traced_start) // 1024
+            if stack:
+                stack[-1].max_traced = max(stack[-1].max_traced, peak)
+        if self.rows_in is not None:
+            args['rows_in'] = int(self.rows_in)
+        if self.rows_out is not None:
+            args['rows_out'] = int(self.rows_out)
+        if exc[0] is not None:
+            args['error'] = exc[0].__name__
+
+        event = {
+            'name': self.name,
+            'cat': self.name.split('.', 1)[0],
+            'ph': 'X',
+            'ts': round((self.wall_start - _origin) * 1e6, 3),
+            'dur': round((wall_end - self.wall_start) * 1e6, 3),
+            'pid': os.getpid(),
+            'tid': threading.get_ident(),
+            'args': args
+        }
+        with _lock:
+            _events.append(event)
+        return False
+
+
+def span(name, rows_in=None, **args):
+    """Open a span named `name`; extra keyword arguments are stored on the event."""
+    if not _enabled:
+        return _NULL_SPAN
+    return Span(name, rows_in, args)
+
+
+def traced(name=None):
+    """Decorator wrapping every call of a function in a span."""
+    def decorator(func):
+        span_name = name or func.__name__
+
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with Span(span_name):
+                return func(*args, **kwargs)
+        wrapper.__name__ = func.__name__
+        wrapper.__doc__ = func.__doc__
+        wrapper.__wrapped__ = func
+        return wrapper
+    return decorator
+
+
+def enable(memory=False):
+    """Start recording spans; `memory=True` also tracks tracemalloc peaks."""
+    global _enabled, _trace_memory, _started_tracemalloc
+    _enabled = True
+    _trace_memory = memory
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _started_tracemalloc = True
+
+
+def disable():
+    """Stop recording spans. Already recorded events are kept."""
+    global _enabled, _trace_memory, _started_tracemalloc
+    _enabled = False
+    # tracemalloc started by someone else keeps running
+    if _started_tracemalloc and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _started_tracemalloc = False
+    _trace_memory = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    """Discard recorded events."""
+    with _lock:
+        _events.clear()
+
+
+def events():
+    """Copy of the events recorded so far."""
+    with _lock:
+        return list(_events)
+
+
+def write_trace(path):
+    """
+    Write the recorded events as a Chrome trace JSON file. This replaces the
+    write at exit requested by STATE_TOBACCO_TRACE, so a trace is written once.
+    """
+    global _exit_path
+    if _exit_path is not None:
+        atexit.unregister(_write_exit_trace)
+        _exit_path = None
+    trace = {
+        'traceEvents': events(),
+        'displayTimeUnit': 'ms',
+        'otherData': {'argv': sys.argv}
+    }
+    with open(path, 'w') as f:
+        json.dump(trace, f)
+    print(f"Trace written to {path}")
+
+
+def _write_exit_trace():
+    global _exit_path
+    path, _exit_path = _exit_path, None
+    if path is not None:
+        write_trace(path)
+
+
+_env_path = os.environ.get('STATE_TOBACCO_TRACE')
+if _env_path:
+    enable(memory=os.environ.get('STATE_TOBACCO_TRACE_MEMORY') == '1')
+    _exit_path = os.path.abspath(_env_path)
+    atexit.register(_write_exit_trace)
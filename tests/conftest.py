@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The package is run from the repository root (python -m state_tobacco)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Figures are rendered without a display
+os.environ.setdefault('MPLBACKEND', 'Agg')
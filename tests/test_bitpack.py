@@ -0,0 +1,72 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from state_tobacco import bitpack
+
+COLUMNS = ['current_smoker', 'any_nrt', 'male']
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(0)
+    n = 3001
+    df = pd.DataFrame({col: (rng.random(n) < p).astype(np.int8) for col, p in zip(COLUMNS, [0.2, 0.5, 0.9])})
+    df['state_year'] = rng.integers(-1, 40, n)
+    df['_llcpwt'] = rng.lognormal(5, 1.5, n)
+    return df
+
+
+def test_key_order(data):
+    codes = data['state_year'].to_numpy()
+    order, bounds, keys = bitpack.key_order(codes)
+    assert np.array_equal(keys, np.unique(codes[codes >= 0]))
+    for key, start, stop in zip(keys, bounds[:-1], bounds[1:]):
+        rows = order[start:stop]
+        assert np.array_equal(rows, np.flatnonzero(codes == key))
+    # The key count only pads the bincount; absent keys are still left out
+    dense = bitpack.key_order(codes, n_keys=100)
+    assert all(np.array_equal(a, b) for a, b in zip(dense, (order, bounds, keys)))
+
+
+def test_pack_and_unpack(data):
+    packed = bitpack.PackedIndicators.from_frame(data, COLUMNS)
+    for col in COLUMNS:
+        assert np.array_equal(packed.column(col), data[col].to_numpy() == 1)
+    with pytest.raises(ValueError):
+        bitpack.PackedIndicators.from_frame(data.assign(male=2), COLUMNS)
+
+
+def test_counts_match_unpacked(data):
+    order, bounds, keys = bitpack.key_order(data['state_year'])
+    packed = bitpack.PackedIndicators.from_frame(data, COLUMNS, order=order)
+    ordered = data.iloc[order]
+    expected = ordered.groupby('state_year')[COLUMNS].sum().to_numpy().T
+    assert np.array_equal(packed.counts(bounds), expected)
+    assert np.array_equal(packed.counts(bounds, names=['male']), expected[[2]])
+
+
+@pytest.mark.parametrize('block_rows', [1, 64, 1000, 1 << 16])
+def test_weighted_sums_match_unpacked(data, block_rows):
+    order, bounds, keys = bitpack.key_order(data['state_year'])
+    packed = bitpack.PackedIndicators.from_frame(data, COLUMNS, order=order)
+    weights = data['_llcpwt'].to_numpy()[order]
+    result = packed.weighted_sums(weights, bounds, block_rows=block_rows)
+    for i, col in enumerate(COLUMNS):
+        bits = data[col].to_numpy()[order] == 1
+        expected = [math.fsum(weights[a:b][bits[a:b]].tolist()) for a, b in zip(bounds[:-1], bounds[1:])]
+        assert np.array_equal(result[i], expected)
+
+
+def test_weighted_sums_nan_weight(data):
+    order, bounds, keys = bitpack.key_order(data['state_year'])
+    packed = bitpack.PackedIndicators.from_frame(data, COLUMNS, order=order)
+    weights = data['_llcpwt'].to_numpy()[order].copy()
+    row = np.flatnonzero(packed.column('current_smoker'))[0]
+    weights[row] = np.nan
+    result = packed.weighted_sums(weights, bounds, block_rows=1000)
+    group = np.searchsorted(bounds, row, side='right') - 1
+    assert math.isnan(result[0, group])
+    assert np.isfinite(np.delete(result[0], group)).all()
@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+
+from state_tobacco import coverage
+
+
+def test_encode_combos_bit_order():
+    df = pd.DataFrame({'any_nrt': [0, 1, 0, 1, 1], 'any_medication': [0, 0, 1, 1, 1],
+                       'any_counseling': [0, 0, 0, 0, 1]})
+    codes = coverage.encode_combos(df, coverage.CATEGORY_COLUMNS)
+    assert codes.tolist() == [0, 1, 2, 3, 7]
+    assert [coverage.combo_label(c) for c in codes] == ['No coverage', 'NRT only', 'Medication only',
+                                                         'NRT + Medication', 'All categories']
+
+
+def test_encode_combos_products():
+    df = pd.DataFrame(0, index=range(2), columns=coverage.PRODUCT_COLUMNS)
+    df.loc[1, ['nicotine_patch_covered', 'group_counseling_covered']] = 1
+    codes = coverage.encode_combos(df, coverage.PRODUCT_COLUMNS)
+    assert codes.tolist() == [0, 1 + 256]
+    assert coverage.combo_label(codes[1], coverage.PRODUCT_COLUMNS) == 'Patch + Grp. Counseling'
+
+
+def test_collapse_state_year():
+    df = pd.DataFrame({'_state': [1, 1, 6, 6, 66], 'year': [2012, 2012, 2012, 2013, 2012],
+                       'any_nrt': [0, 1, 0, 0, 1], 'any_medication': [0, 0, 1, 0, 1],
+                       'any_counseling': [0, 0, 1, 0, 1]})
+    state_year = coverage.collapse_state_year(df)
+    assert state_year[['_state', 'year']].values.tolist() == [[1, 2012], [6, 2012], [6, 2013]]
+    assert state_year['combo_code'].tolist() == [1, 6, 0]
+
+
+def test_transition_counts_match_loop():
+    rng = np.random.default_rng(0)
+    rows = [(s, y) for s in [1, 2, 4, 5] for y in range(2011, 2016) if (s, y) != (2, 2013)]
+    state_year = pd.DataFrame(rows, columns=['_state', 'year']).sample(frac=1, random_state=0)
+    state_year['combo_code'] = rng.integers(0, 8, len(state_year))
+
+    counts, year_pairs = coverage.transition_counts(state_year, 8)
+    assert year_pairs == [(y, y + 1) for y in range(2011, 2015)]
+
+    code = {(s, y): c for s, y, c in state_year[['_state', 'year', 'combo_code']].itertuples(index=False)}
+    expected = np.zeros((4, 8, 8), dtype=np.int64)
+    for (s, y), c in code.items():
+        if (s, y + 1) in code:
+            expected[y - 2011, c, code[s, y + 1]] += 1
+    assert np.array_equal(counts, expected)
+    # State 2 has no 2013, so it makes no 2012-2013 or 2013-2014 move
+    assert counts[1].sum() == 3 and counts[2].sum() == 3
+
+    frame = coverage.transitions_to_frame(counts, year_pairs)
+    assert frame['n_states'].sum() == counts.sum()
+
+
+def test_transitions_with_one_year_or_none():
+    state_year = pd.DataFrame({'_state': [1, 6], 'year': [2015, 2015], 'combo_code': [1, 7]})
+    for frame in (state_year, state_year.iloc[:0]):
+        counts, year_pairs = coverage.transition_counts(frame, 8)
+        assert counts.shape == (0, 8, 8) and year_pairs == []
+        assert coverage.transitions_to_frame(counts, year_pairs).empty
+
+
+def test_main_with_one_year(tmp_path):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({'_state': [1, 1, 6, 36], 'year': 2015})
+    for col in coverage.CATEGORY_COLUMNS + coverage.PRODUCT_COLUMNS:
+        df[col] = rng.integers(0, 2, len(df))
+    csv_path = tmp_path / 'individual.csv'
+    df.to_csv(csv_path, index=False)
+
+    coverage.main(str(csv_path), str(tmp_path / 'figures'), str(tmp_path))
+    assert (tmp_path / 'figures' / 'treatment_coverage_combinations_by_year.png').exists()
+    assert not (tmp_path / 'figures' / 'treatment_coverage_transitions.png').exists()
+    assert pd.read_csv(tmp_path / 'treatment_coverage_transitions.csv').empty
+    assert pd.read_csv(tmp_path / 'treatment_product_transitions.csv').empty
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from state_tobacco import export
+
+# Format 114 header: 4 format bytes, nvar (2), nobs (4), data label (81), then
+# the 18-byte time stamp
+STAMP = slice(91, 109)
+
+
+def frame(n=1000, seed=0):
+    rng = np.random.default_rng(seed)
+    names = np.array(['Alabama', 'District of Columbia', 'Ohio', '', None], dtype=object)
+    return pd.DataFrame({
+        'current_smoker': rng.integers(0, 2, n).astype(np.int8),
+        'year': rng.integers(2011, 2021, n).astype(np.int16),
+        'state_year': rng.integers(-1, 510, n).astype(np.int32),
+        '_llcpwt': np.where(rng.random(n) < 0.05, np.nan, rng.lognormal(5, 1, n)),
+        'state_name': names[rng.integers(0, len(names), n)],
+    })
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def masked(data):
+    return data[:STAMP.start] + data[STAMP.stop:]
+
+
+def test_block_writer_supported():
+    assert export.block_writer_supported()
+
+
+@pytest.mark.parametrize('block_rows', [1, 7, 1000, 5000])
+def test_block_writer_matches_to_stata(tmp_path, block_rows):
+    df = frame()
+    stamp = pd.Timestamp(2021, 6, 1, 12, 30).to_pydatetime()
+    export.BlockStataWriter(tmp_path / 'block.dta', df, write_index=False, time_stamp=stamp,
+                            block_rows=block_rows).write_file()
+    df.to_stata(tmp_path / 'stock.dta', write_index=False, time_stamp=stamp)
+    assert read(tmp_path / 'block.dta') == read(tmp_path / 'stock.dta')
+
+
+def test_write_stata_matches_to_stata(tmp_path):
+    df = frame(n=250)
+    size = export.write_stata(df, tmp_path / 'block.dta', block_rows=64)
+    df.to_stata(tmp_path / 'stock.dta', write_index=False)
+    assert size == len(read(tmp_path / 'block.dta'))
+    assert masked(read(tmp_path / 'block.dta')) == masked(read(tmp_path / 'stock.dta'))
+
+
+def test_write_stata_falls_back_to_to_stata(tmp_path, monkeypatch):
+    monkeypatch.setattr(export, 'block_writer_supported', lambda: False)
+    monkeypatch.setattr(export, 'BlockStataWriter', None)
+    df = frame(n=50)
+    export.write_stata(df, tmp_path / 'fallback.dta')
+    df.to_stata(tmp_path / 'stock.dta', write_index=False)
+    assert masked(read(tmp_path / 'fallback.dta')) == masked(read(tmp_path / 'stock.dta'))
@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from state_tobacco import preview
+
+
+@pytest.fixture(autouse=True)
+def preview_off():
+    yield
+    preview.disable()
+
+
+def test_output_path():
+    assert preview.output_path('out/data.csv') == 'out/data.csv'
+    preview.enable(0.1)
+    assert preview.output_path('out/data.csv') == 'out/data_preview.csv'
+    assert preview.output_path('out/data.csv.gz') == 'out/data_preview.csv.gz'
+    assert preview.output_path('data.csv.zst') == 'data_preview.csv.zst'
+    assert preview.output_path('out/data.dta') == 'out/data_preview.dta'
+    assert preview.figure_dir('figs').endswith('preview')
+
+
+def test_enable_rejects_bad_fraction():
+    with pytest.raises(ValueError):
+        preview.enable(0)
+    with pytest.raises(ValueError):
+        preview.enable(1.5)
+
+
+def design(seed=0):
+    """Two years x 4 strata with 1, 2, 5 and 20 PSUs of 3 rows each."""
+    rng = np.random.default_rng(seed)
+    rows = [(year, stratum, psu) for year in (2011, 2012)
+            for stratum, n_psus in enumerate([1, 2, 5, 20]) for psu in range(n_psus) for _ in range(3)]
+    df = pd.DataFrame(rows, columns=['year', '_ststr', '_psu'])
+    df['_llcpwt'] = rng.lognormal(5, 1, len(df))
+    return df
+
+
+@pytest.mark.parametrize('fraction', [0.1, 0.5])
+def test_subsample_keeps_whole_psus_and_scales_weights(fraction):
+    df = design()
+    sample = preview.subsample(df, fraction=fraction, seed=3)
+
+    # Whole PSUs: every drawn PSU keeps all three rows
+    assert (sample.groupby(['year', '_ststr', '_psu']).size() == 3).all()
+    n_units = df.groupby(['year', '_ststr'])['_psu'].nunique()
+    n_drawn = sample.groupby(['year', '_ststr'])['_psu'].nunique()
+    assert n_drawn.index.equals(n_units.index)
+    expected_drawn = np.clip(np.rint(fraction * n_units), np.minimum(2, n_units), n_units)
+    assert np.array_equal(n_drawn.to_numpy(), expected_drawn.to_numpy())
+
+    # Weights scaled by PSUs in stratum / PSUs drawn
+    original = df.loc[sample.index, '_llcpwt']
+    factor = (n_units / n_drawn).reindex(pd.MultiIndex.from_frame(sample[['year', '_ststr']])).to_numpy()
+    assert np.allclose(sample['_llcpwt'], original * factor, rtol=0, atol=1e-9)
+    assert np.array_equal(sample['preview_stratum_psus'],
+                          n_drawn.reindex(pd.MultiIndex.from_frame(sample[['year', '_ststr']])).to_numpy())
+    assert sample['preview_fraction'].iloc[0] == len(sample) / len(df)
+
+
+def test_subsample_unit_weights_keep_stratum_totals():
+    df = design()
+    df['_llcpwt'] = 1.0
+    sample = preview.subsample(df, fraction=0.3, seed=1)
+    totals = sample.groupby(['year', '_ststr'])['_llcpwt'].sum()
+    assert np.allclose(totals, df.groupby(['year', '_ststr'])['_llcpwt'].sum())
+
+
+def test_subsample_is_deterministic():
+    df = design()
+    first = preview.subsample(df, fraction=0.3, seed=7)
+    assert first.index.equals(preview.subsample(df, fraction=0.3, seed=7).index)
+    assert preview.subsample(df, fraction=1.0, seed=7)['_llcpwt'].equals(df['_llcpwt'])
@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from state_tobacco import ingest, prepare, preview, quality, synthetic
+
+COLUMNS = ['_state', 'year', 'income2', 'numadult', 'hhadult', 'smoke100', 'smokday2', 'lastsmk2',
+           'sex', 'children']
+OTHER = quality.STATE_SLOTS - 1
+
+
+def chunk():
+    """One row per outcome; income2 1 is below the poverty line for one adult, 5 is not."""
+    return pd.DataFrame({
+        '_state':   [1, 1, 1, 6, 6, 66, np.nan, 6, 6, 1],
+        'year':     2012,
+        'income2':  [1, 5, 1, 1, 1, 1, 1, 1, 1, 1],
+        'numadult': 1.0,
+        'children': [88, 88, 1, 88, 88, 88, 88, 88, 120.5, 88],
+        'sex':      [1, 1, 1, 4, 2, 1, 1, 2, 1, 1],
+        'smoke100': [1, 9, 1, 1, np.nan, 1, 1, 1, 1, 1],
+        'smokday2': [1, 1, 1, 1, 1, 1, 1, np.nan, 1, 7],
+        'lastsmk2': [np.nan, np.nan, np.nan, np.nan, np.nan, np.nan, np.nan, 77, np.nan, np.nan],
+    })
+
+
+def test_drops_in_pipeline_order():
+    profile = quality.IngestProfile(COLUMNS)
+    frame = chunk()
+    profile.update(2012, frame.iloc[:4])
+    profile.update(2012, frame.iloc[4:])
+
+    assert profile.missing_columns == {2012: ['hhadult']}
+    assert profile.rows[2012][[1, 6, 66, OTHER]].tolist() == [4, 4, 1, 1]
+    # Row 1 fails both eligibility and smoke100 and counts once, under eligibility
+    summary = profile.summary()[2012]
+    assert summary['dropped_by_filter'] == {
+        'state_fips': 2, 'medicaid_eligible': 1, 'no_children': 2, 'sex_valid': 1,
+        'smoke100_valid': 1, 'smokday2_valid': 1, 'lastsmk2_valid': 1
+    }
+    assert summary['kept'] == 1
+
+    drops = profile.drops().set_index('_state')
+    assert drops.loc[1, 'kept'] == 1 and drops.loc[6, 'kept'] == 0
+    assert drops.loc[6, ['no_children_dropped', 'sex_valid_dropped', 'smoke100_valid_dropped',
+                         'lastsmk2_valid_dropped']].tolist() == [1, 1, 1, 1]
+    assert drops['rows'].sum() == len(frame)
+
+
+def test_missingness_and_codes():
+    profile = quality.IngestProfile(COLUMNS)
+    profile.update(2012, chunk())
+    missing = profile.missingness().set_index(['_state', 'variable'])['n_missing']
+    # An absent column counts every row as missing
+    assert missing[1, 'hhadult'] == 4
+    assert missing[6, 'smoke100'] == 1 and missing[6, 'lastsmk2'] == 3
+
+    codes = profile.code_histograms().set_index(['variable', 'code'])
+    assert codes.loc[('children', 88.0), 'count'] == 8
+    # 120.5 is outside the histogram bins and is reported as an undocumented code
+    assert codes.loc[('children', 120.5), 'count'] == 1
+    assert not codes.loc[('children', 120.5), 'expected']
+    assert profile.summary()[2012]['unexpected_codes']['sex'] == {'4.0': 1}
+
+
+@pytest.mark.parametrize('year', [2012, 2016])
+def test_medicaid_eligible_matches_ingest(year):
+    df = synthetic.generate_year(year, 5000, seed=year)
+    # hhadult is only asked from 2014; the stacked years have it as a missing column
+    expected = ingest.derive_eligibility(df.assign(hhadult=df.get('hhadult', np.nan)))['Medicaidelig'].to_numpy() == 1
+    assert np.array_equal(quality.medicaid_eligible(df), expected)
+
+
+def test_kept_rows_match_pipeline_filters():
+    profile = quality.IngestProfile(ingest.KEEP_VARS)
+    frames = []
+    for year in (2012, 2016):
+        df = synthetic.generate_year(year, 5000, seed=year)
+        profile.update(year, df)
+        frames.append(df)
+    df = pd.concat(frames, ignore_index=True)
+
+    # The pipeline's filters, without the policy-table joins
+    df = df[df['_state'] <= 56]
+    df = ingest.apply_sample_filters(ingest.derive_eligibility(df.copy()))
+    df = prepare.clean_individual_data(df, keep=list(df.columns))
+
+    drops = profile.drops()
+    kept = drops[drops['kept'] > 0].set_index(['year', '_state'])['kept'].sort_index()
+    expected = df.groupby(['year', '_state']).size().sort_index()
+    assert kept.index.equals(expected.index.set_levels(expected.index.levels[1].astype(float), level=1))
+    assert np.array_equal(kept.to_numpy(), expected.to_numpy())
+
+
+def test_write_uses_preview_names(tmp_path):
+    profile = quality.IngestProfile(COLUMNS)
+    profile.update(2012, chunk())
+    profile.write(tmp_path)
+    preview.enable(0.1)
+    try:
+        profile.write(tmp_path)
+    finally:
+        preview.disable()
+    names = sorted(p.name for p in tmp_path.iterdir())
+    assert names == sorted(f'data_quality_{name}{suffix}.{ext}'
+                           for name, ext in [('drops', 'csv'), ('missing', 'csv'), ('codes', 'csv'),
+                                             ('missing_columns', 'csv'), ('summary', 'json')]
+                           for suffix in ('', '_preview'))
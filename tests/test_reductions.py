@@ -0,0 +1,80 @@
+import math
+
+import numpy as np
+import pytest
+
+from state_tobacco import reductions
+
+
+def values(n=20_000, seed=0):
+    rng = np.random.default_rng(seed)
+    # Survey-weight-like magnitudes with cancellation between signs
+    return rng.lognormal(3, 2, n) * rng.choice([-1.0, 1.0], n)
+
+
+def fsum_by_group(x, groups, n_groups):
+    return np.array([math.fsum(x[groups == g].tolist()) for g in range(n_groups)])
+
+
+def test_grouped_sum_is_correctly_rounded():
+    x = values()
+    groups = np.random.default_rng(1).integers(0, 7, len(x))
+    assert np.array_equal(reductions.grouped_sum(x, groups, 7), fsum_by_group(x, groups, 7))
+
+
+def test_grouped_sum_extreme_magnitudes():
+    x = np.array([1e300, 1.0, -1e300, 1e-300, 2.0 ** -1074, 3.5])
+    groups = np.zeros(len(x), dtype=np.int64)
+    assert reductions.grouped_sum(x, groups, 1)[0] == math.fsum(x.tolist())
+
+
+@pytest.mark.parametrize('parts', [2, 3, 17])
+def test_exact_sum_independent_of_partitioning(parts):
+    x = values()
+    groups = np.random.default_rng(2).integers(0, 5, len(x))
+    whole = reductions.grouped_sum(x, groups, 5)
+
+    rng = np.random.default_rng(parts)
+    order = rng.permutation(len(x))
+    cuts = np.sort(rng.choice(np.arange(1, len(x)), parts - 1, replace=False))
+    total = reductions.ExactSum(5)
+    for chunk in reversed(np.split(order, cuts)):
+        total.merge(reductions.ExactSum(5).add(x[chunk], groups[chunk]))
+    assert np.array_equal(total.result(), whole)
+
+
+def test_exact_sum_empty_groups_and_non_finite():
+    groups = np.array([0, 0, 2, 2])
+    result = reductions.grouped_sum([1.0, np.nan, 2.0, 3.0], groups, 4)
+    assert math.isnan(result[0])
+    assert result[1] == 0.0 and result[3] == 0.0
+    assert result[2] == 5.0
+    assert reductions.grouped_sum([np.inf, 1.0], [0, 0], 1)[0] == np.inf
+
+
+@pytest.mark.parametrize('block_rows', [1, 64, 1000, 1 << 16])
+def test_segment_sum_matches_fsum(block_rows):
+    x = values(5000)
+    bounds = np.array([0, 0, 13, 2000, 2001, 4999, 5000])
+    expected = [math.fsum(x[a:b].tolist()) for a, b in zip(bounds[:-1], bounds[1:])]
+    assert np.array_equal(reductions.segment_sum(x, bounds, block_rows=block_rows), expected)
+
+
+def test_segment_sum_rows_and_non_finite():
+    x = np.stack([values(300, seed=3), values(300, seed=4)])
+    x[1, 150] = np.nan
+    bounds = np.array([0, 100, 300])
+    result = reductions.segment_sum(x, bounds, block_rows=64)
+    assert result.shape == (2, 2)
+    assert np.array_equal(result[0], [math.fsum(x[0, :100].tolist()), math.fsum(x[0, 100:].tolist())])
+    assert result[1, 0] == math.fsum(x[1, :100].tolist())
+    assert math.isnan(result[1, 1])
+
+
+def test_split_and_combine_fixed_round_trip():
+    x = values(1000)
+    e_low, n_limbs = reductions.fixed_layout(x)
+    limbs = reductions.split_fixed(x, e_low, n_limbs)
+    assert np.all(np.abs(limbs) < 2 ** reductions.LIMB_BITS)
+    assert np.all(limbs == np.floor(limbs))
+    assert np.array_equal(reductions.combine_fixed(limbs[:, :, None], e_low)[:, 0], x)
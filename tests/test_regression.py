@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from state_tobacco import regression
+
+REGRESSORS = ['any_nrt', 'male', 'age_18_24', 'male_copy', 'none']
+
+
+@pytest.fixture
+def panel_csv(tmp_path):
+    """Individual rows in 12 states x 4 years with state-year coverage and a known logit."""
+    rng = np.random.default_rng(0)
+    n = 6000
+    state = rng.choice([1, 2, 4, 5, 6, 8, 9, 10, 11, 12, 13, 15], n)
+    year = rng.integers(2014, 2018, n)
+    any_nrt = ((state * 7 + year) % 3 == 0).astype(float)
+    male = rng.integers(0, 2, n).astype(float)
+    young = (rng.random(n) < 0.2).astype(float)
+    eta = -0.5 + 0.4 * any_nrt + 0.3 * male - 0.6 * young + 0.05 * (state % 5) - 0.1 * (year - 2014)
+    df = pd.DataFrame({
+        '_state': state, 'year': year, '_llcpwt': rng.lognormal(4, 0.7, n),
+        'current_smoker': (rng.random(n) < 1 / (1 + np.exp(-eta))).astype(int),
+        'any_nrt': any_nrt, 'male': male, 'age_18_24': young,
+        # Collinear with male, and constant: both must be omitted
+        'male_copy': male, 'none': 0.0
+    })
+    # Dropped by the cache: a missing regressor and a zero weight
+    df.loc[0, 'male'] = np.nan
+    df.loc[1, '_llcpwt'] = 0.0
+    path = tmp_path / 'individual.csv'
+    df.to_csv(path, index=False)
+    return str(path), df.iloc[2:].reset_index(drop=True)
+
+
+def dense_fit(df, regressors, outcome='current_smoker'):
+    """Reference: dense dummies, Newton iterations and the state-clustered sandwich."""
+    states, years = np.unique(df['_state']), np.unique(df['year'])
+    X = np.column_stack([np.ones(len(df)), df[regressors].to_numpy()]
+                        + [(df['_state'] == s).to_numpy(float) for s in states[1:]]
+                        + [(df['year'] == t).to_numpy(float) for t in years[1:]])
+    y, w = df[outcome].to_numpy(float), df['_llcpwt'].to_numpy()
+    beta = np.zeros(X.shape[1])
+    for _ in range(50):
+        mu = 1 / (1 + np.exp(-X @ beta))
+        step = np.linalg.solve(X.T @ (X * (w * mu * (1 - mu))[:, None]), X.T @ (w * (y - mu)))
+        beta += step
+        if np.abs(step).max() < 1e-12:
+            break
+    mu = 1 / (1 + np.exp(-X @ beta))
+    bread = np.linalg.inv(X.T @ (X * (w * mu * (1 - mu))[:, None]))
+    scores = np.array([X[df['_state'] == s].T @ (w * (y - mu))[df['_state'] == s] for s in states])
+    cov = bread @ (scores.T @ scores * len(states) / (len(states) - 1)) @ bread
+    k = 1 + len(regressors)
+    return beta[:k], np.sqrt(np.diag(cov))[:k]
+
+
+def test_fit_matches_dense_reference(panel_csv):
+    path, df = panel_csv
+    with regression.DesignCache(path, outcomes=['current_smoker'], regressors=REGRESSORS, chunksize=700) as cache:
+        assert cache.rows_read == len(df) + 2 and cache.rows == len(df)
+        assert len(cache.files) > 1
+        results, fit = regression.fit_logit(cache, 'current_smoker', workers=2)
+
+    assert fit['converged'] and fit['n_states'] == 12 and fit['n_years'] == 4
+    assert fit['omitted'] == ['male_copy', 'none']
+    assert results.loc[results['term'].isin(['male_copy', 'none']), 'coef'].isna().all()
+
+    coef, se = dense_fit(df, ['any_nrt', 'male', 'age_18_24'])
+    kept = results[results['term'].isin(['intercept', 'any_nrt', 'male', 'age_18_24'])]
+    np.testing.assert_allclose(kept['coef'], coef, rtol=1e-7, atol=1e-9)
+    np.testing.assert_allclose(kept['std_err'], se, rtol=1e-6)
+
+
+def test_fit_does_not_depend_on_chunking(panel_csv):
+    path, _ = panel_csv
+    fits = []
+    for chunksize in (500, 6000):
+        with regression.DesignCache(path, outcomes=['current_smoker'], regressors=REGRESSORS,
+                                    chunksize=chunksize) as cache:
+            fits.append(regression.fit_logit(cache, 'current_smoker')[0])
+    np.testing.assert_allclose(fits[0]['coef'], fits[1]['coef'], rtol=1e-9)
+    np.testing.assert_allclose(fits[0]['std_err'], fits[1]['std_err'], rtol=1e-9, equal_nan=True)
+
+
+def test_independent_columns():
+    rng = np.random.default_rng(1)
+    a, b, c = rng.normal(size=(3, 50))
+    X = np.column_stack([a, b, a + 2 * b, np.zeros(50), c, c])
+    assert regression._independent_columns(X.T @ X).tolist() == [0, 1, 4]
@@ -0,0 +1,96 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from state_tobacco import service
+from state_tobacco.service import QueryError, _parse_ints
+
+YEARS = list(range(2011, 2016))
+
+
+def test_parse_ints():
+    assert _parse_ints(None, 'years', YEARS) is None
+    assert _parse_ints('2015,2011', 'years', YEARS) == (2011, 2015)
+    assert _parse_ints('2012-2014,2011', 'years', YEARS) == (2011, 2012, 2013, 2014)
+    # Ranges are intersected with the allowed values, however wide
+    assert _parse_ints('1-30000000000', 'years', YEARS) == tuple(YEARS)
+    assert _parse_ints('2014-2099', 'years', YEARS) == (2014, 2015)
+
+
+@pytest.mark.parametrize('text', ['abc', '2011-', '1-2-3', '2011,x', '1990-2000'])
+def test_parse_ints_errors(text):
+    with pytest.raises(QueryError):
+        _parse_ints(text, 'years', YEARS)
+
+
+@pytest.fixture
+def queries():
+    rows = [(s, y) for s in [1, 6, 36] for y in YEARS]
+    df = pd.DataFrame(rows, columns=['_state', 'year'])
+    df['state_name'] = df['_state'].map({1: 'Alabama', 6: 'California', 36: 'New York'})
+    df['treatment_group'] = np.where(df['_state'] == 1, 2, 4)
+    df['weighted_pop'] = df['_state'] * 1000.0
+    df['current_smoker_prev'] = df['_state'] / 100 + (df['year'] - 2011) / 1000
+    df.loc[(df['_state'] == 36) & (df['year'] == 2013), 'current_smoker_prev'] = np.nan
+    return service.QueryService(service.StatePanel(df))
+
+
+def get(queries, target):
+    status, ctype, body = queries.handle(target)
+    return status, json.loads(body) if ctype == 'application/json' else body.decode()
+
+
+def test_meta(queries):
+    status, body = get(queries, '/meta')
+    assert status == 200
+    assert body['metrics'] == ['weighted_pop', 'current_smoker_prev']
+    assert [s['state_name'] for s in body['states']] == ['Alabama', 'California', 'New York']
+    assert body['years'] == YEARS
+    assert set(body['treatment_groups']) == {'2', '4'}
+
+
+def test_query(queries):
+    status, body = get(queries, '/query?metric=current_smoker_prev&states=36,6&years=2012-2013')
+    assert status == 200
+    rows = [(r['_state'], r['year'], r['treatment_group'], r['value']) for r in body['rows']]
+    assert rows == [(6, 2012, 4, 0.061), (6, 2013, 4, 0.062), (36, 2012, 4, 0.361)]
+
+
+def test_trend_weighted(queries):
+    status, body = get(queries, '/trend?metric=current_smoker_prev&weight=pop')
+    assert status == 200
+    means = body['groups']['4']['means']
+    # 2011: California (0.06, weight 6000) and New York (0.36, weight 36000)
+    assert means[0] == pytest.approx((0.06 * 6 + 0.36 * 36) / 42)
+    # 2013: New York is missing
+    assert means[2] == pytest.approx(0.062)
+    assert body['groups']['2']['means'][0] == pytest.approx(0.01)
+
+
+def test_equivalent_queries_share_cache_entry(queries):
+    first = queries.handle('/query?metric=current_smoker_prev&states=1,6')
+    second = queries.handle('/query?states=6,1&metric=current_smoker_prev')
+    assert first == second
+    assert queries.stats()['cache_hits'] == 1
+
+
+@pytest.mark.parametrize('target', ['/query', '/query?metric=nope', '/query?metric=weighted_pop&states=2',
+                                    '/query?metric=weighted_pop&years=1990-2000',
+                                    '/query?metric=weighted_pop&weight=x', '/trend?metric=a&metric=b'])
+def test_bad_queries(queries, target):
+    status, body = get(queries, target)
+    assert status == 400 and 'error' in body
+
+
+def test_unknown_path(queries):
+    status, body = get(queries, '/nope')
+    assert status == 404
+    assert queries.stats()['errors'] == 1
+
+
+def test_chart(queries):
+    status, ctype, body = queries.handle('/chart?metric=current_smoker_prev')
+    assert status == 200 and ctype == 'image/svg+xml'
+    assert body.decode().startswith('<svg')
@@ -0,0 +1,56 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from state_tobacco import shared
+
+
+def sample_frame(n=1000, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'state_year': rng.integers(-1, 510, n),
+        '_llcpwt': rng.lognormal(5, 1, n),
+        'current_smoker': pd.array(rng.choice([0, 1, None], n), dtype='Int64'),
+        'state_name': rng.choice(['Alabama', 'Ohio', 'Utah'], n),
+    })
+
+
+def _worker_columns(_):
+    """In a pool worker: its process id and copies of the attached columns."""
+    time.sleep(0.1)  # long enough for both workers to take tasks
+    return os.getpid(), {column: np.array(values) for column, values in shared.columns().items()}
+
+
+def test_attach_frame_round_trip():
+    df = sample_frame()
+    with shared.SharedFrame(df) as frame:
+        attached = shared.attach_frame(frame.spec)
+        assert np.array_equal(attached['state_year'], df['state_year'])
+        assert np.array_equal(attached['_llcpwt'], df['_llcpwt'])
+        assert np.array_equal(attached['current_smoker'], df['current_smoker'].to_numpy(dtype=float, na_value=np.nan),
+                              equal_nan=True)
+        assert attached['state_name'].astype(str).tolist() == df['state_name'].tolist()
+        assert not attached['_llcpwt'].to_numpy().flags.writeable
+        directory = frame.directory
+    assert not os.path.exists(directory)
+
+
+def test_columns_outside_pool():
+    with pytest.raises(RuntimeError):
+        shared.columns()
+
+
+def test_workers_see_the_same_columns():
+    df = sample_frame()
+    with shared.SharedFrame(df) as frame:
+        with frame.pool(2) as pool:
+            results = list(pool.map(_worker_columns, range(8)))
+        expected = shared.attach(frame.spec)
+        assert len({pid for pid, _ in results} - {os.getpid()}) == 2
+        for _, columns in results:
+            assert columns.keys() == expected.keys()
+            for column, values in columns.items():
+                assert np.array_equal(values, expected[column], equal_nan=values.dtype.kind == 'f')
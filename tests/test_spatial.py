@@ -0,0 +1,132 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import sparse
+
+from state_tobacco import spatial
+
+# 3 x 3 rook lattice; state k + 1 sits at row k // 3, column k % 3
+FIPS = np.arange(1, 10)
+
+
+def lattice():
+    rows, cols = [], []
+    for k in range(9):
+        r, c = divmod(k, 3)
+        for dr, dc in [(0, 1), (1, 0)]:
+            if r + dr < 3 and c + dc < 3:
+                rows += [k, (r + dr) * 3 + c + dc]
+                cols += [(r + dr) * 3 + c + dc, k]
+    return FIPS, sparse.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(9, 9))
+
+
+def panel(seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame([(s, y) for y in (2015, 2016) for s in FIPS], columns=['_state', 'year'])
+    gradient = np.tile(np.arange(9) // 3 + np.arange(9) % 3, 2)
+    df['current_smoker_prev'] = gradient + rng.normal(0, 0.5, len(df))
+    df['any_nrt'] = np.tile([1.0, 0.0], 9)
+    return df
+
+
+def dense_morans_i(values, adjacency):
+    """Closed-form global Moran's I with row-standardized weights."""
+    w = adjacency / adjacency.sum(axis=1, keepdims=True)
+    z = values - values.mean()
+    return len(z) / w.sum() * (z @ w @ z) / (z @ z)
+
+
+def test_global_and_local_match_closed_form():
+    adjacency = lattice()
+    df = panel()
+    global_df, local_df = spatial.morans_i(df, adjacency, ['current_smoker_prev', 'any_nrt'], permutations=99)
+    dense = adjacency[1].toarray()
+    for row in global_df.itertuples():
+        values = df.loc[df['year'] == row.year, row.variable].to_numpy()
+        assert row.morans_i == pytest.approx(dense_morans_i(values, dense), rel=1e-12)
+        assert row.expected_i == pytest.approx(-1 / 8)
+        # Local statistics sum to the global one times (n - 1) / n (all states have neighbors)
+        local = local_df[(local_df['variable'] == row.variable) & (local_df['year'] == row.year)]
+        assert local['local_i'].sum() == pytest.approx(row.morans_i * 8, rel=1e-12)
+
+    smoking = global_df[global_df['variable'] == 'current_smoker_prev']
+    assert (smoking['morans_i'] > 0).all()
+    # The alternating pattern is a checkerboard on the rook lattice
+    assert global_df.loc[global_df['variable'] == 'any_nrt', 'morans_i'].tolist() == pytest.approx([-1, -1])
+
+
+def test_missing_state_drops_out():
+    adjacency = lattice()
+    df = panel()
+    df = df[~((df['_state'] == 5) & (df['year'] == 2016))]
+    global_df, local_df = spatial.morans_i(df, adjacency, ['current_smoker_prev'], permutations=99)
+    keep = FIPS != 5
+    values = df.loc[df['year'] == 2016, 'current_smoker_prev'].to_numpy()
+    expected = dense_morans_i(values, adjacency[1].toarray()[np.ix_(keep, keep)])
+    result = global_df.set_index('year').loc[2016]
+    assert result['morans_i'] == pytest.approx(expected, rel=1e-12)
+    assert result['n_states'] == 8
+    assert 5 not in local_df.loc[local_df['year'] == 2016, '_state'].tolist()
+
+
+def test_constant_series_is_undefined():
+    df = panel().assign(any_nrt=1.0)
+    global_df, _ = spatial.morans_i(df, lattice(), ['any_nrt'], permutations=9)
+    assert global_df['morans_i'].isna().all() and global_df['p_sim'].isna().all()
+
+
+def test_pseudo_p():
+    simulated = np.array([[1.0, 2.0, 3.0, 4.0], [1.0, 2.0, 3.0, 4.0]])
+    assert spatial._pseudo_p(simulated, np.array([3.5, 0.0])).tolist() == [2 / 5, 1 / 5]
+
+
+def test_p_values_deterministic_for_seed():
+    adjacency = lattice()
+    df = panel()
+    first = spatial.morans_i(df, adjacency, permutations=199, seed=7)
+    second = spatial.morans_i(df, adjacency, permutations=199, seed=7)
+    other = spatial.morans_i(df, adjacency, permutations=199, seed=8)
+    pd.testing.assert_frame_equal(first[0], second[0])
+    pd.testing.assert_frame_equal(first[1], second[1])
+    assert not np.array_equal(first[1]['p_sim'].to_numpy(), other[1]['p_sim'].to_numpy())
+    assert ((first[1]['p_sim'] > 0) & (first[1]['p_sim'] <= 0.5)).all()
+
+
+@pytest.fixture
+def shapefile(tmp_path):
+    gpd = pytest.importorskip('geopandas')
+    shapely = pytest.importorskip('shapely')
+    # 2 x 2 block of unit squares (FIPS 4, 1 / 6, 2) and an island (FIPS 15)
+    boxes = {1: (1, 1), 2: (1, 0), 4: (0, 1), 6: (0, 0), 15: (5, 5)}
+    frame = gpd.GeoDataFrame({'STATEFP': [f"{fips:02d}" for fips in boxes]},
+                             geometry=[shapely.box(x, y, x + 1, y + 1) for x, y in boxes.values()], crs='EPSG:4326')
+    path = tmp_path / 'states.shp'
+    frame.to_file(path)
+    return str(path)
+
+
+def test_build_adjacency(shapefile):
+    fips, queen = spatial.build_adjacency(shapefile, 'queen')
+    assert fips.tolist() == [1, 2, 4, 6, 15]
+    neighbors = {f: set(fips[queen[i].indices]) for i, f in enumerate(fips)}
+    assert neighbors == {1: {2, 4, 6}, 2: {1, 4, 6}, 4: {1, 2, 6}, 6: {1, 2, 4}, 15: set()}
+
+    _, rook = spatial.build_adjacency(shapefile, 'rook')
+    neighbors = {f: set(fips[rook[i].indices]) for i, f in enumerate(fips)}
+    # Diagonal squares only touch at a corner
+    assert neighbors == {1: {2, 4}, 2: {1, 6}, 4: {1, 6}, 6: {2, 4}, 15: set()}
+    assert (rook != rook.T).nnz == 0
+
+    with pytest.raises(ValueError):
+        spatial.build_adjacency(shapefile, 'bishop')
+
+
+def test_load_adjacency_caches(shapefile):
+    spatial._ADJACENCY.clear()
+    fips, matrix = spatial.load_adjacency(shapefile, 'rook')
+    assert os.path.exists(spatial._cache_path(shapefile, 'rook'))
+    spatial._ADJACENCY.clear()
+    cached_fips, cached = spatial.load_adjacency(shapefile, 'rook')
+    assert np.array_equal(fips, cached_fips) and (matrix != cached).nnz == 0
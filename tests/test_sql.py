@@ -0,0 +1,100 @@
+import pandas as pd
+import pytest
+
+pytest.importorskip('duckdb')
+pytest.importorskip('pyarrow')
+
+from state_tobacco import ingest, sql, synthetic
+
+
+@pytest.fixture(scope='module')
+def inputs(tmp_path_factory):
+    """Synthetic raw .dta inputs and their Parquet extracts."""
+    root = tmp_path_factory.mktemp('sql')
+    data_dir, parquet_dir = root / 'data', root / 'extracts'
+    synthetic.write_synthetic_inputs(str(data_dir), 20_000, seed=1)
+    sql.write_extracts(str(data_dir), str(parquet_dir))
+    return str(data_dir), str(parquet_dir)
+
+
+@pytest.fixture(scope='module')
+def pandas_df(inputs):
+    """State-level frame of the pandas pipeline on the same inputs."""
+    return sql.run_pandas(inputs[0])
+
+
+def test_state_level_matches_pandas(inputs, pandas_df):
+    con = sql.connect(inputs[1])
+    sql_df = con.sql("SELECT * FROM state_level").df()
+    con.close()
+    assert len(pandas_df) > 100
+    sql.compare_state_level(sql_df, pandas_df, rtol=1e-9)
+
+
+def test_verify(inputs):
+    # What `python -m state_tobacco verify` runs, at its default --rtol
+    assert len(sql.verify(*inputs, rtol=1e-9)) > 100
+
+
+def test_run_prepare_writes_outputs(inputs, pandas_df, tmp_path):
+    output_dir = tmp_path / 'new' / 'out'
+    state_df = sql.run_prepare(inputs[1], str(output_dir), compression='gzip')
+    assert (output_dir / 'individual_level_with_category_indicators.csv.gz').exists()
+    assert (output_dir / 'state_level_descriptive_data.csv').exists()
+    assert (state_df['state_year'] >= 0).all()
+    sql.compare_state_level(state_df, pandas_df)
+
+
+def test_compare_state_level_detects_drift(pandas_df):
+    drifted = pandas_df.copy()
+    drifted['weighted_pop'] = drifted['weighted_pop'].to_numpy() * (1 + 1e-6)
+    with pytest.raises(AssertionError):
+        sql.compare_state_level(drifted, pandas_df)
+    with pytest.raises(AssertionError):
+        sql.compare_state_level(pandas_df.iloc[1:], pandas_df)
+
+
+@pytest.fixture(scope='module')
+def raw_df(inputs):
+    """Every raw survey row, as `ingest` reads it."""
+    return ingest.load_brfss_years(inputs[0])
+
+
+def by_state(df):
+    return df.sort_values(['year', '_state'], kind='stable').reset_index(drop=True)
+
+
+def test_state_index_covers_every_row(inputs, raw_df):
+    import pyarrow.parquet as pq
+
+    index = sql.read_state_index(inputs[1])
+    for year, entries in index.items():
+        parquet = pq.ParquetFile(f"{inputs[1]}/brfss_{year}.parquet")
+        counts = raw_df.loc[raw_df['year'] == year, '_state'].value_counts()
+        assert sorted(entries) == sorted(counts.index.astype(int))
+        for state, (group, start, end) in entries.items():
+            states = parquet.read_row_group(group, columns=['_state']).column('_state').to_numpy()
+            assert (states == state).all() and end - start == len(states) == counts[state]
+
+
+def test_load_states_matches_full_frame(inputs, raw_df):
+    part = sql.load_states(inputs[1], [6, 1])
+    expected = raw_df[raw_df['_state'].isin([1, 6])]
+    assert len(part) > 0
+    pd.testing.assert_frame_equal(by_state(part), by_state(expected))
+
+
+def test_load_states_unknown_state_or_missing_index(inputs, tmp_path):
+    with pytest.raises(ValueError, match=r'\[3\]'):
+        sql.load_states(inputs[1], [1, 3])
+    with pytest.raises(FileNotFoundError):
+        sql.load_states(str(tmp_path), [1])
+
+
+def test_ingest_states_writes_suffixed_outputs(inputs, tmp_path):
+    data = ingest.merge_brfss_data(inputs[0], str(tmp_path), states=[6, 1], parquet_dir=inputs[1])
+    names = {p.name for p in tmp_path.iterdir()}
+    assert {'Final_2011_2020_Medicaidelig_states-1-6.csv', 'Final_2011_2020_Medicaidelig_states-1-6.dta',
+            'data_quality_states-1-6_summary.json'} <= names
+    assert not any(name.startswith(('Final_2011_2020_Medicaidelig.', 'data_quality_drops')) for name in names)
+    assert set(data['_state']) <= {1, 6}
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from state_tobacco import statekeys
+
+
+def test_encode_decode_round_trip():
+    state = np.repeat(statekeys.STATE_FIPS, statekeys.N_YEARS)
+    year = np.tile(np.array(statekeys.YEARS), statekeys.N_STATES)
+    keys = statekeys.encode(state, year)
+    assert np.array_equal(keys, np.arange(statekeys.N_KEYS))
+    decoded_state, decoded_year = statekeys.decode(keys)
+    assert np.array_equal(decoded_state, state) and np.array_equal(decoded_year, year)
+
+
+def test_encode_outside_panel():
+    keys = statekeys.encode([1, 3, 66, 1, 1, np.nan, 1.5], [2011, 2011, 2011, 2010, 2021, 2011, 2011])
+    assert keys.tolist() == [0, -1, -1, -1, -1, -1, -1]
+
+
+@pytest.fixture
+def frames():
+    rng = np.random.default_rng(0)
+    n = 500
+    df = pd.DataFrame({'_state': rng.choice([1, 2, 6, 66], n), 'year': rng.integers(2010, 2022, n),
+                       'x': rng.random(n)})
+    statekeys.add_key(df)
+    table = pd.DataFrame([(s, y) for s in [1, 6, 72] for y in range(2011, 2019)], columns=['_state', 'year'])
+    table['policy'] = np.arange(len(table))
+    table['label'] = [f'p{i}' for i in range(len(table))]
+    return df, table
+
+
+@pytest.mark.parametrize('how', ['inner', 'left'])
+def test_join_matches_merge(frames, how):
+    df, table = frames
+    keys = statekeys.encode(table['_state'], table['year'])
+    joined = statekeys.join(df, table, keys, how=how, drop=['_state', 'year'])
+    expected = df.merge(table, on=['_state', 'year'], how=how)
+    pd.testing.assert_frame_equal(joined, expected)
+
+
+def test_join_rejects_duplicate_keys(frames):
+    df, table = frames
+    table = pd.concat([table, table.iloc[:1]])
+    with pytest.raises(ValueError):
+        statekeys.join(df, table, statekeys.encode(table['_state'], table['year']))
+    with pytest.raises(ValueError):
+        statekeys.join(df, table.iloc[:1], [0], how='outer')
+
+
+def test_keys_by_name():
+    fips = pd.DataFrame({'_state': [1, 6], 'state_name': ['Alabama', 'California']})
+    table = pd.DataFrame({'state_name': ['California', 'Alabama', 'Guam'], 'year': [2012, 2020, 2012]})
+    expected = statekeys.encode([6, 1, np.nan], [2012, 2020, 2012])
+    assert np.array_equal(statekeys.keys_by_name(table, fips), expected)
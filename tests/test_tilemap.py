@@ -0,0 +1,20 @@
+import numpy as np
+
+from state_tobacco import statekeys, synthetic, tilemap
+
+
+def test_layout_has_one_tile_per_state():
+    fips, postal, rows, cols = zip(*tilemap.TILE_LAYOUT)
+    assert len(tilemap.TILE_LAYOUT) == statekeys.N_STATES == 51
+    assert sorted(fips) == statekeys.STATE_FIPS.tolist()
+    assert len(set(postal)) == 51
+    assert len(set(zip(rows, cols))) == 51
+    names = {synthetic.STATE_NAMES[code] for code in fips}
+    assert {'Alaska', 'Hawaii', 'District of Columbia'} <= names and 'Guam' not in names
+
+
+def test_tile_geometry():
+    for shape, n_corners in [('square', 4), ('hex', 6)]:
+        polygons, centers = tilemap.tile_geometry(shape)
+        assert polygons.shape == (51, n_corners, 2) and centers.shape == (51, 2)
+        assert len(np.unique(centers.round(6), axis=0)) == 51
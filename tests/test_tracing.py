@@ -0,0 +1,92 @@
+import json
+import os
+import subprocess
+import sys
+import tracemalloc
+
+import pytest
+
+from state_tobacco import tracing
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(autouse=True)
+def clean_tracing():
+    tracing.disable()
+    tracing.reset()
+    yield
+    tracing.disable()
+    tracing.reset()
+
+
+def test_span_records_event():
+    tracing.enable()
+    with tracing.span('merge.fips', rows_in=10, how='inner') as s:
+        with tracing.span('merge.inner'):
+            pass
+        s.rows_out = 7
+    inner, outer = tracing.events()
+    assert inner['name'] == 'merge.inner'
+    assert outer['name'] == 'merge.fips' and outer['cat'] == 'merge' and outer['ph'] == 'X'
+    assert outer['dur'] >= inner['dur'] >= 0
+    assert outer['ts'] <= inner['ts']
+    assert outer['args']['rows_in'] == 10 and outer['args']['rows_out'] == 7
+    assert outer['args']['how'] == 'inner'
+    assert 'cpu_ms' in outer['args']
+
+
+def test_span_records_error():
+    tracing.enable()
+    with pytest.raises(KeyError):
+        with tracing.span('derive'):
+            raise KeyError('x')
+    assert tracing.events()[0]['args']['error'] == 'KeyError'
+
+
+def test_disabled_tracing_is_a_no_op():
+    calls = []
+
+    @tracing.traced('stage')
+    def stage(x):
+        calls.append(x)
+        return x + 1
+
+    assert stage(1) == 2
+    with tracing.span('ignored') as s:
+        s.rows_out = 3
+    assert tracing.events() == []
+    assert stage.__wrapped__(2) == 3 and calls == [1, 2]
+
+    tracing.enable()
+    stage(3)
+    assert [e['name'] for e in tracing.events()] == ['stage']
+
+
+def test_disable_leaves_foreign_tracemalloc_running():
+    tracemalloc.start()
+    try:
+        tracing.enable(memory=True)
+        tracing.disable()
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
+    tracing.enable(memory=True)
+    assert tracemalloc.is_tracing()
+    tracing.disable()
+    assert not tracemalloc.is_tracing()
+
+
+def test_env_trace_written_once(tmp_path):
+    env_path, cli_path = tmp_path / 'env.json', tmp_path / 'cli.json'
+    script = ("from state_tobacco import tracing\n"
+              "with tracing.span('stage'):\n"
+              "    pass\n")
+    env = dict(os.environ, STATE_TOBACCO_TRACE=str(env_path), PYTHONPATH=ROOT)
+    subprocess.run([sys.executable, '-c', script], env=env, check=True)
+    assert [e['name'] for e in json.loads(env_path.read_text())['traceEvents']] == ['stage']
+
+    env_path.unlink()
+    subprocess.run([sys.executable, '-c', script + f"tracing.write_trace({str(cli_path)!r})\n"],
+                   env=env, check=True)
+    assert cli_path.exists() and not env_path.exists()